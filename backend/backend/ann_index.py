@@ -0,0 +1,159 @@
+import numpy as np
+
+# rows assigned to cells per step, so building never holds an N x nlist distance matrix
+ASSIGN_CHUNK = 4096
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest-neighbour index over face encodings.
+
+    A k-means coarse quantizer splits the gallery into `nlist` cells; a query
+    only scans the `nprobe` cells whose centroids are closest. Raising
+    `nprobe` trades latency for recall. Entries are keyed by an arbitrary
+    hashable label (the student `_id`) so inserts and deletes do not disturb
+    the rest of the index. They do not move the centroids either; `changes`
+    counts them since the last build so the owner can decide to retrain.
+    """
+
+    def __init__(self, nlist=0, nprobe=8, train_iters=10, seed=0):
+        self.nlist = int(nlist)
+        self.nprobe = max(1, int(nprobe))
+        self.train_iters = max(1, int(train_iters))
+        self.seed = seed
+        self.centroids = None
+        self.cell_vecs = []
+        self.cell_labels = []
+        self._cell_of = {}
+        self.trained_size = 0
+        self.changes = 0
+
+    def __len__(self):
+        return len(self._cell_of)
+
+    def build(self, vectors, labels, centroids=None, cells=None):
+        """
+        Train the quantizer (unless `centroids` are given) and assign every
+        vector. `cells` from cells_of() on an index with the same centroids
+        skip the assignment (negative entries are assigned as usual).
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        n = vectors.shape[0]
+        if centroids is None:
+            centroids = self.train(vectors)
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        nlist = self.centroids.shape[0]
+        dim = vectors.shape[1]
+        self.cell_vecs = [np.empty((0, dim), dtype=np.float32) for _ in range(nlist)]
+        self.cell_labels = [[] for _ in range(nlist)]
+        self._cell_of = {}
+        self.trained_size = n
+        self.changes = 0
+        if n == 0:
+            return self
+        if cells is None:
+            assign = _assign(vectors, self.centroids)
+        else:
+            assign = np.array(cells, dtype=np.intp)
+            missing = assign < 0
+            if missing.any():
+                assign[missing] = _assign(vectors[missing], self.centroids)
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(nlist + 1))
+        labels = list(labels)
+        for c in range(nlist):
+            rows = order[bounds[c]:bounds[c + 1]]
+            self.cell_vecs[c] = vectors[rows]
+            self.cell_labels[c] = [labels[r] for r in rows]
+            for r in rows:
+                self._cell_of[labels[r]] = c
+        return self
+
+    def train(self, vectors):
+        """Quantizer centroids for `vectors` (k-means, `nlist` cells or 4 * sqrt(N))."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        n = vectors.shape[0]
+        nlist = self.nlist or int(4 * np.sqrt(max(n, 1)))
+        return self._train(vectors, max(1, min(nlist, n)))
+
+    def _train(self, vectors, nlist):
+        rng = np.random.default_rng(self.seed)
+        n = vectors.shape[0]
+        if n == 0:
+            return np.zeros((1, vectors.shape[1]), dtype=np.float32)
+        sample = vectors
+        if n > nlist * 256:
+            sample = vectors[rng.choice(n, nlist * 256, replace=False)]
+        centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+        for _ in range(self.train_iters):
+            assign = _assign(sample, centroids)
+            counts = np.bincount(assign, minlength=nlist)
+            sums = np.stack(
+                [np.bincount(assign, weights=col, minlength=nlist) for col in sample.T], axis=1
+            )
+            nonempty = counts > 0
+            centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+        return centroids
+
+    def _nearest_cells(self, probes, count):
+        d = _sq_distances(probes, self.centroids)
+        count = min(count, self.centroids.shape[0])
+        if count == d.shape[1]:
+            return np.argsort(d, axis=1)
+        part = np.argpartition(d, count - 1, axis=1)[:, :count]
+        return np.take_along_axis(part, np.argsort(np.take_along_axis(d, part, axis=1), axis=1), axis=1)
+
+    def cells_of(self, labels):
+        """Cell of each label (-1 if not indexed), to rebuild the same lists with build(cells=...)."""
+        return np.fromiter((self._cell_of.get(label, -1) for label in labels), dtype=np.int32, count=len(labels))
+
+    def add(self, label, vector):
+        if label in self._cell_of:
+            self.remove(label)
+        vector = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+        c = int(self._nearest_cells(vector, 1)[0, 0])
+        self.cell_vecs[c] = np.vstack([self.cell_vecs[c], vector])
+        self.cell_labels[c].append(label)
+        self._cell_of[label] = c
+        self.changes += 1
+
+    def remove(self, label):
+        c = self._cell_of.pop(label, None)
+        if c is None:
+            return False
+        pos = self.cell_labels[c].index(label)
+        self.cell_vecs[c] = np.delete(self.cell_vecs[c], pos, axis=0)
+        del self.cell_labels[c][pos]
+        self.changes += 1
+        return True
+
+    def search(self, probes, k=10, nprobe=None):
+        """Per probe, up to `k` candidate labels ordered by approximate distance."""
+        probes = np.atleast_2d(np.asarray(probes, dtype=np.float32))
+        cells = self._nearest_cells(probes, nprobe or self.nprobe)
+        results = []
+        for probe, probe_cells in zip(probes, cells):
+            vecs = [self.cell_vecs[c] for c in probe_cells if len(self.cell_labels[c])]
+            if not vecs:
+                results.append([])
+                continue
+            labels = [label for c in probe_cells for label in self.cell_labels[c]]
+            d = _sq_distances(probe[None, :], np.vstack(vecs))[0]
+            top = min(k, d.shape[0])
+            best = np.argpartition(d, top - 1)[:top]
+            best = best[np.argsort(d[best])]
+            results.append([labels[i] for i in best])
+        return results
+
+
+def _assign(vectors, centroids):
+    # nearest centroid of every row, ASSIGN_CHUNK rows at a time
+    return np.concatenate([
+        np.argmin(_sq_distances(vectors[start:start + ASSIGN_CHUNK], centroids), axis=1)
+        for start in range(0, vectors.shape[0], ASSIGN_CHUNK)
+    ] or [np.empty(0, dtype=np.intp)])
+
+
+def _sq_distances(a, b):
+    d2 = np.einsum("ij,ij->i", a, a)[:, None] + np.einsum("ij,ij->i", b, b)[None, :] - 2.0 * (a @ b.T)
+    return np.maximum(d2, 0.0)
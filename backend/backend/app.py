@@ -1,18 +1,47 @@
 from fastapi import FastAPI, UploadFile, File, Form, Request, Query, Body
 from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from pymongo import MongoClient
-import face_recognition
 import numpy as np
 import cv2
 import os
 from datetime import datetime, timedelta
 from typing import List
+from threading import Thread
 from bson import ObjectId
 from dotenv import load_dotenv
 from pymongo import MongoClient
-from config import RTSP_URL, RTSP_SCAN_INTERVAL_MS, RTSP_FRAME_SKIP, ATTENDANCE_START_AFTER, MONGODB_URL, DATABASE_NAME
+from config import RTSP_URL, RTSP_SCAN_INTERVAL_MS, RTSP_FRAME_SKIP, ATTENDANCE_START_AFTER, MONGODB_URL, DATABASE_NAME, GALLERY_POLL_INTERVAL_S
+from config import ENROL_MAX_SAMPLES, FACE_DETECT_SCALE, FACE_DETECT_UPSAMPLE
+from config import FACE_CACHE_MAX_ENTRIES, FACE_CACHE_TTL_S, FACE_CACHE_DIR, FACE_CACHE_DISK_MAX_ENTRIES
+from config import COMPUTE_WORKERS, COMPUTE_MAX_PENDING, COMPUTE_TIMEOUT_S, CAMERA_COMPUTE_WORKERS, CAMERA_COMPUTE_MAX_PENDING
+from config import RTSP_WORKER_MODE, RTSP_HEARTBEAT_STALE_S
+from config import ATTENDANCE_MARKED_REFRESH_S, ATTENDANCE_FLUSH_MS, ATTENDANCE_FLUSH_MAX, ATTENDANCE_QUEUE_MAX
+from config import MEDIA_JOB_WORKERS, MEDIA_JOB_CONCURRENCY, MEDIA_SAMPLE_EVERY_S, MEDIA_SEGMENT_S, MEDIA_TASK_TIMEOUT_S
+
+try:
+    from .face_gallery import FaceGallery, GALLERY_PROJECTION, make_scope
+    from .face_codec import pack_encoding, encoding_to_list
+    from .compute_pool import ComputePool, PoolBusy, PoolTimeout
+    from . import face_pipeline
+    from .media_jobs import MediaJobs, JOBS_COLLECTION
+    from .encoding_cache import EncodingCache, cache_key
+    from .attendance_store import MarkedCache, AttendanceWriter, backfill_hour_buckets, hour_bucket
+    from .indexes import ensure_indexes
+    from .pagination import parse_fields, encode_cursor, after_id_cursor, before_timestamp_cursor, ndjson_lines
+except ImportError:
+    # Fallback when running as a script: python app.py
+    from face_gallery import FaceGallery, GALLERY_PROJECTION, make_scope
+    from face_codec import pack_encoding, encoding_to_list
+    from compute_pool import ComputePool, PoolBusy, PoolTimeout
+    import face_pipeline
+    from media_jobs import MediaJobs, JOBS_COLLECTION
+    from encoding_cache import EncodingCache, cache_key
+    from attendance_store import MarkedCache, AttendanceWriter, backfill_hour_buckets, hour_bucket
+    from indexes import ensure_indexes
+    from pagination import parse_fields, encode_cursor, after_id_cursor, before_timestamp_cursor, ndjson_lines
 
 load_dotenv()  # Load .env file
 
@@ -36,16 +65,66 @@ db = client[DATABASE_NAME]
 students_col = db["students"]
 attendance_col = db["attendance"]
 
+# Shared in-memory gallery of student encodings; rebuilt lazily on changes
+gallery = FaceGallery(students_col)
+
+# Decode/detect/encode run in worker processes so the API stays responsive
+compute_pool = ComputePool(COMPUTE_WORKERS, COMPUTE_MAX_PENDING, timeout_s=COMPUTE_TIMEOUT_S)
+
+# Detection results by upload hash, so retries and re-uploads skip the pool
+face_cache = EncodingCache(
+    FACE_CACHE_MAX_ENTRIES, FACE_CACHE_TTL_S, disk_dir=FACE_CACHE_DIR, disk_max_entries=FACE_CACHE_DISK_MAX_ENTRIES
+)
+
+# Rolls already marked this hour; repeat recognitions skip the database
+# and camera/batch first sightings are written in bulk
+attendance_writer = AttendanceWriter(
+    attendance_col, flush_ms=ATTENDANCE_FLUSH_MS, max_batch=ATTENDANCE_FLUSH_MAX, max_queue=ATTENDANCE_QUEUE_MAX
+)
+marked_cache = MarkedCache(attendance_col, refresh_s=ATTENDANCE_MARKED_REFRESH_S, writer=attendance_writer)
+
+# Long uploads (lecture videos, photo batches) run as background jobs on the same pool
+media_jobs = MediaJobs(
+    db[JOBS_COLLECTION], attendance_col, gallery, compute_pool, marked_cache=marked_cache,
+    workers=MEDIA_JOB_WORKERS, concurrency=MEDIA_JOB_CONCURRENCY, segment_s=MEDIA_SEGMENT_S,
+    task_timeout_s=MEDIA_TASK_TIMEOUT_S,
+)
+
+
+@app.exception_handler(PoolBusy)
+def _pool_busy(request: Request, exc: PoolBusy):
+    return JSONResponse(status_code=429, content={"error": str(exc)}, headers={"Retry-After": "1"})
+
+
+@app.exception_handler(PoolTimeout)
+def _pool_timeout(request: Request, exc: PoolTimeout):
+    return JSONResponse(status_code=503, content={"error": str(exc)})
+
+
+# Helper: detect/encode an upload, reusing the result if the same bytes were seen before
+def detect_and_encode_cached(image_bytes, upsample=1, scale=1.0):
+    key = cache_key(image_bytes, upsample, scale)
+    detected = face_cache.get(key, default=face_cache)
+    if detected is face_cache:
+        detected = compute_pool.run_sync(face_pipeline.detect_and_encode, image_bytes, upsample=upsample, scale=scale)
+        face_cache.put(key, detected)
+    return detected
+
+async def detect_and_encode_cached_async(image_bytes, upsample=1, scale=1.0):
+    # hashing and the disk lookup stay off the event loop
+    key = await run_in_threadpool(cache_key, image_bytes, upsample, scale)
+    detected = await run_in_threadpool(face_cache.get, key, face_cache)
+    if detected is face_cache:
+        detected = await compute_pool.run(face_pipeline.detect_and_encode, image_bytes, upsample=upsample, scale=scale)
+        await run_in_threadpool(face_cache.put, key, detected)
+    return detected
 
 # Helper: Save face encoding
-def get_face_encoding(image_bytes):
-    nparr = np.frombuffer(image_bytes, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-    rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    encodings = face_recognition.face_encodings(rgb_img)
-    if encodings:
-        return encodings[0].tolist()
-    return None
+def get_face_encoding(image_bytes, upsample=1, scale=1.0):
+    detected = detect_and_encode_cached(image_bytes, upsample=upsample, scale=scale)
+    if not detected or not detected[1]:
+        return None
+    return detected[1][0]
 
 @app.get("/")
 def health_check():
@@ -57,6 +136,10 @@ def health_check():
             "status": "healthy",
             "message": "Face Recognition Attendance System API is running",
             "database": "connected",
+            "compute_pool": compute_pool.status(),
+            "face_cache": face_cache.status(),
+            "marked_cache": marked_cache.status(),
+            "attendance_writer": attendance_writer.status(),
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
@@ -84,7 +167,9 @@ def add_student(
     section: str = Form(...),
     batch: str = Form(...),
     phone: str = Form(...),   # ✅ New field for phone with country code
-    photo: UploadFile = File(...)
+    photo: UploadFile = File(...),
+    extra_photos: List[UploadFile] = File(None),  # optional extra enrolment shots
+    clip: UploadFile = File(None)  # optional short video to sample frames from
 ):
     # Check for duplicate roll or name
     if students_col.find_one({"roll": roll}) or students_col.find_one({"name": name}):
@@ -103,6 +188,17 @@ def add_student(
     if encoding is None:
         return JSONResponse(status_code=400, content={"error": "No face detected in the photo."})
 
+    # Collect extra samples; drop any that are clearly not the same person
+    samples = [encoding]
+    for extra in extra_photos or []:
+        extra_encoding = get_face_encoding(extra.file.read())
+        if extra_encoding is not None:
+            samples.append(extra_encoding)
+    if clip is not None:
+        samples.extend(compute_pool.run_sync(face_pipeline.clip_encodings, clip.file.read(), ENROL_MAX_SAMPLES))
+    samples = [s for s in samples if np.linalg.norm(s - encoding) <= 0.6][:ENROL_MAX_SAMPLES]
+    centroid = np.mean(samples, axis=0)
+
     # Store image as base64 string
     import base64
     image_b64 = base64.b64encode(image_bytes).decode('utf-8')
@@ -115,57 +211,60 @@ def add_student(
         "section": section,
         "batch": batch,
         "phone": phone,   # ✅ Save phone
-        "face_encoding": encoding,
-        "photo_b64": image_b64
+        "face_encoding": pack_encoding(centroid),  # centroid of all samples
+        "photo_b64": image_b64,
+        "updated_at": datetime.now()
     }
+    if len(samples) > 1:
+        student["face_samples"] = [pack_encoding(s) for s in samples]
 
     students_col.insert_one(student)
-    return {"message": "Student added successfully."}
+    gallery.upsert(student)
+    return {"message": "Student added successfully.", "samples": len(samples)}
 
 
 
 @app.get("/students")
 def list_students():
-    students = list(students_col.find({}, {"face_encoding": 0}))
+    students = list(students_col.find({}, {"face_encoding": 0, "face_samples": 0}))
     for s in students:
         s["_id"] = str(s["_id"])
     return students
 
 @app.post("/mark_attendance")
-def mark_attendance(photo: UploadFile = File(...)):
+def mark_attendance(
+    photo: UploadFile = File(...),
+    department: str = Form(None),
+    section: str = Form(None),
+    batch: str = Form(None),
+    specialization: str = Form(None),
+    scope_fallback: bool = Form(False),
+    detect_scale: float = Form(FACE_DETECT_SCALE, gt=0, le=1),
+    upsample: int = Form(FACE_DETECT_UPSAMPLE, ge=0, le=2)
+):
     image_bytes = photo.file.read()
-    encoding = get_face_encoding(image_bytes)
+    encoding = get_face_encoding(image_bytes, upsample=upsample, scale=detect_scale)
     if encoding is None:
         return JSONResponse(status_code=400, content={"error": "No face detected in the photo."})
-    students = list(students_col.find())
-    encoding_np = np.array(encoding)
+    scope = make_scope(department=department, section=section, batch=batch, specialization=specialization)
+    match = gallery.match([encoding], scope=scope, fallback=scope_fallback)[0]
     now = datetime.now()
-    hour_start = now.replace(minute=0, second=0, microsecond=0)
-    hour_end = hour_start + timedelta(hours=1)
-    for student in students:
-        known_encoding = np.array(student["face_encoding"])
-        matches = face_recognition.compare_faces([known_encoding], encoding_np, tolerance=0.25)
-        if matches[0]:
-            # Check for existing attendance in this hour
-            exists = attendance_col.find_one({
-                "roll": student["roll"],
-                "timestamp": {"$gte": hour_start, "$lt": hour_end}
-            })
-            if not exists:
-                attendance_col.insert_one({
-                    "roll": student["roll"],
-                    "name": student["name"],
-                    "timestamp": now
-                })
-                return {"message": f"Attendance marked for {student['name']} ({student['roll']})"}
-            else:
-                return {"message": f"Attendance already marked for {student['name']} ({student['roll']}) this hour."}
+    if match["roll"] is not None:
+        # One record per roll per hour; the upsert reports whether it was new
+        if marked_cache.mark(match["roll"], match["name"], now):
+            return {"message": f"Attendance marked for {match['name']} ({match['roll']})"}
+        else:
+            return {"message": f"Attendance already marked for {match['name']} ({match['roll']}) this hour."}
     return JSONResponse(status_code=404, content={"error": "Face not recognized."})
 
 @app.post("/mark_attendance_batch")
 async def mark_attendance_batch(request: Request):
     """
     Mark attendance for multiple faces (batch mode).
+
+    Optional "scope" ({"department", "section", "batch", "specialization"})
+    limits the search to that partition; "scope_fallback" retries misses
+    against the whole gallery.
     """
     try:
         data = await request.json()
@@ -176,40 +275,30 @@ async def mark_attendance_batch(request: Request):
     if not isinstance(encodings, list) or not encodings:
         return JSONResponse(status_code=400, content={"error": "No encodings provided."})
 
-    students = list(students_col.find())
+    # Matching and Mongo writes block; keep them off the event loop
+    return await run_in_threadpool(_mark_attendance_batch, encodings, data)
+
+def _mark_attendance_batch(encodings, data):
     recognized = []
     now = datetime.now()
-    hour_start = now.replace(minute=0, second=0, microsecond=0)
-    hour_end = hour_start + timedelta(hours=1)
 
     # EXTREMELY strict tolerance - only exact matches
     tolerance = 0.25  # Even stricter - only very high confidence matches
     confidence_threshold = 0.75  # Higher confidence required (75%+)
 
-    for encoding in encodings:
-        encoding_np = np.array(encoding)
-        best_match = None
-        best_distance = float('inf')
-        best_confidence = 0
-        
-        # Find the best match among all students
-        for student in students:
-            known_encoding = np.array(student["face_encoding"])
-            try:
-                # Calculate face distance and confidence
-                distance = face_recognition.face_distance([known_encoding], encoding_np)[0]
-                confidence = (1 - distance) * 100  # Convert to percentage
-                
-                # Only consider if both distance and confidence meet strict criteria
-                if distance < best_distance and distance <= tolerance and confidence >= confidence_threshold:
-                    best_distance = distance
-                    best_confidence = confidence
-                    best_match = student
-            except Exception as e:
-                # Skip invalid encodings
-                continue
-        
-        if best_match:
+    try:
+        scope = make_scope(data.get("scope") if isinstance(data.get("scope"), dict) else None)
+        matches = gallery.assign(
+            encodings, tolerance=tolerance, confidence_threshold=confidence_threshold,
+            scope=scope, fallback=bool(data.get("scope_fallback"))
+        )
+    except ValueError:
+        return JSONResponse(status_code=400, content={"error": "Invalid encodings."})
+
+    for best_match in matches:
+        if best_match["roll"] is not None:
+            best_distance = best_match["distance"]
+            best_confidence = best_match["confidence"]
             print(f"✅ Face MATCHED: {best_match['name']} ({best_match['roll']}) - Distance: {best_distance:.3f}, Confidence: {best_confidence:.1f}%")
             # Always add to recognized list (even if already marked in DB)
             if best_match["roll"] not in [r["roll"] for r in recognized]:
@@ -219,166 +308,240 @@ async def mark_attendance_batch(request: Request):
                     "confidence": best_confidence
                 })
 
-            # Only insert if not already in DB
-            exists = attendance_col.find_one({
-                "roll": best_match["roll"],
-                "timestamp": {"$gte": hour_start, "$lt": hour_end}
-            })
-            if not exists:
-                attendance_col.insert_one({
-                    "roll": best_match["roll"],
-                    "name": best_match["name"],
-                    "timestamp": now,
-                    "confidence": best_confidence
-                })
+            # Only inserted if not already in DB
+            marked_cache.queue(best_match["roll"], best_match["name"], now, confidence=best_confidence)
         else:
-            print(f"❌ Face REJECTED: No registered student match (best distance: {best_distance:.3f}, tolerance: {tolerance}, confidence threshold: {confidence_threshold}%)")
+            print(f"❌ Face REJECTED: No registered student match (best distance: {best_match['distance']:.3f}, tolerance: {tolerance}, confidence threshold: {confidence_threshold}%)")
 
     if recognized:
         return {"recognized": recognized}
     return JSONResponse(status_code=404, content={"error": "No recognized faces."})
 
 @app.post("/process_media_attendance")
-async def process_media_attendance(image: UploadFile, custom_time: str = Query(None)):
+async def process_media_attendance(
+    image: UploadFile,
+    custom_time: str = Query(None),
+    department: str = Query(None),
+    section: str = Query(None),
+    batch: str = Query(None),
+    specialization: str = Query(None),
+    scope_fallback: bool = Query(False),
+    detect_scale: float = Query(FACE_DETECT_SCALE, gt=0, le=1),
+    upsample: int = Query(FACE_DETECT_UPSAMPLE, ge=0, le=2)
+):
     try:
         print(f"Processing media attendance with custom_time: {custom_time}")
         # Read and process the uploaded image
         contents = await image.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if img is None:
+        # Decode, detect and encode in the compute pool, off the event loop
+        detected = await detect_and_encode_cached_async(contents, upsample=upsample, scale=detect_scale)
+        if detected is None:
             print("Invalid image file provided")
             return JSONResponse(status_code=400, content={"error": "Invalid image file"})
-        
-        # Convert BGR to RGB
-        rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        
-        # Detect faces in the image
-        # Try with a small upsample for better detection on smaller faces
-        face_locations = face_recognition.face_locations(rgb_img, number_of_times_to_upsample=1)
-        face_encodings = face_recognition.face_encodings(rgb_img, face_locations)
+        face_locations, face_encodings = detected
         
         print(f"Detected {len(face_encodings)} faces in the image")
         
         if not face_encodings:
             return JSONResponse(status_code=200, content={"recognized": [], "message": "No faces detected in the image"})
-        
-        # Get all students from database
-        students = list(students_col.find())
-        if not students:
-            print("No students registered in database")
-            return JSONResponse(status_code=200, content={"recognized": [], "message": "No students registered"})
-        
-        # Parse custom time if provided
-        if custom_time:
-            try:
-                custom_datetime = datetime.fromisoformat(custom_time.replace('T', ' '))
-                now = custom_datetime
-                print(f"Using custom time: {now}")
-            except ValueError:
-                print(f"Invalid custom time format: {custom_time}")
-                return JSONResponse(status_code=400, content={"error": "Invalid custom time format"})
-        else:
-            now = datetime.now()
-            print(f"Using current time: {now}")
-        
-        # Calculate hour boundaries for attendance
-        hour_start = now.replace(minute=0, second=0, microsecond=0)
-        hour_end = hour_start + timedelta(hours=1)
-        
-        print(f"Checking attendance for hour: {hour_start} to {hour_end}")
-        
-        recognized = []
-        
-        # Compare each detected face with registered students
-        for i, encoding in enumerate(face_encodings):
-            encoding_np = np.array(encoding)
-
-            # EXTREMELY strict tolerance - only exact matches
-            tolerance = 0.25  # Even stricter - only very high confidence matches
-            confidence_threshold = 0.75  # Higher confidence required (75%+)
-            best_match = None
-            best_distance = float('inf')
-            best_confidence = 0
-            
-            print(f"Processing face {i}...")
-
-            for student in students:
-                known_encoding = np.array(student["face_encoding"])
-                try:
-                    distance = face_recognition.face_distance([known_encoding], encoding_np)[0]
-                    confidence = (1 - distance) * 100  # Convert to percentage
-                    print(f"  Distance to {student['name']} ({student['roll']}): {distance:.3f} (confidence: {confidence:.1f}%)")
-                except Exception as e:
-                    print(f"  Error calculating distance to {student['name']}: {e}")
-                    continue
-                
-                # Only consider if both distance and confidence meet strict criteria
-                if distance < best_distance and distance <= tolerance and confidence >= confidence_threshold:
-                    best_distance = distance
-                    best_confidence = confidence
-                    best_match = student
-
-            if best_match is not None:
-                print(f"✅ Face {i} MATCHED: {best_match['name']} ({best_match['roll']}) - Distance: {best_distance:.3f}, Confidence: {best_confidence:.1f}%")
-                
-                # Double-check: Only mark attendance if confidence is very high
-                if best_confidence >= 75.0:  # Extra strict check
-                    exists = attendance_col.find_one({
-                        "roll": best_match["roll"],
-                        "timestamp": {"$gte": hour_start, "$lt": hour_end}
-                    })
 
-                    if not exists:
-                        attendance_record = {
-                            "roll": best_match["roll"],
-                            "name": best_match["name"],
-                            "timestamp": now,
-                            "confidence": best_confidence,
-                            "face_detected": True  # Mark that this was from actual face detection
-                        }
-                        result = attendance_col.insert_one(attendance_record)
-                        print(f"✅ Attendance marked for {best_match['name']} with ID: {result.inserted_id}")
-                    else:
-                        print(f"⚠️ Attendance already exists for {best_match['name']} this hour")
-
-                    # Add to recognized list (reporting)
-                    recognized.append({
-                        "roll": best_match["roll"],
-                        "name": best_match["name"],
-                        "confidence": best_confidence
-                    })
-                else:
-                    print(f"❌ Face {i} REJECTED: Confidence too low ({best_confidence:.1f}% < 75%)")
-            else:
-                print(f"❌ Face {i} REJECTED: No registered student match (best distance: {best_distance:.3f}, tolerance: {tolerance}, confidence threshold: {confidence_threshold}%)")
-        
-        print(f"Media processing complete. Recognized: {len(recognized)} students")
-        return JSONResponse(status_code=200, content={
-            "recognized": recognized,
-            "total_faces_detected": len(face_encodings),
-            "attendance_marked": len(recognized)
-        })
-        
+        scope = make_scope(department=department, section=section, batch=batch, specialization=specialization)
+        return await run_in_threadpool(_record_media_attendance, face_encodings, custom_time, scope, scope_fallback)
+
+    except (PoolBusy, PoolTimeout):
+        raise
     except Exception as e:
         print(f"Error in media attendance processing: {e}")
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+def _record_media_attendance(face_encodings, custom_time, scope, scope_fallback):
+    # Make sure the in-memory gallery is current
+    gallery.ensure_loaded()
+    if not len(gallery):
+        print("No students registered in database")
+        return JSONResponse(status_code=200, content={"recognized": [], "message": "No students registered"})
+    
+    # Parse custom time if provided
+    if custom_time:
+        try:
+            custom_datetime = datetime.fromisoformat(custom_time.replace('T', ' '))
+            now = custom_datetime
+            print(f"Using custom time: {now}")
+        except ValueError:
+            print(f"Invalid custom time format: {custom_time}")
+            return JSONResponse(status_code=400, content={"error": "Invalid custom time format"})
+    else:
+        now = datetime.now()
+        print(f"Using current time: {now}")
+    
+    # Calculate hour boundaries for attendance
+    hour_start = now.replace(minute=0, second=0, microsecond=0)
+    hour_end = hour_start + timedelta(hours=1)
+    
+    print(f"Checking attendance for hour: {hour_start} to {hour_end}")
+    
+    recognized = []
+    
+    # EXTREMELY strict tolerance - only exact matches
+    tolerance = 0.25  # Even stricter - only very high confidence matches
+    confidence_threshold = 0.75  # Higher confidence required (75%+)
+
+    # Assign detected faces to distinct students in one pass
+    matches = gallery.assign(
+        face_encodings, tolerance=tolerance, confidence_threshold=confidence_threshold,
+        scope=scope, fallback=scope_fallback
+    )
+    for i, match in enumerate(matches):
+        print(f"Processing face {i}... nearest distance: {match['distance']:.3f}")
+        best_match = match if match["roll"] is not None else None
+        best_distance = match["distance"]
+        best_confidence = match.get("confidence", 0)
+
+        if best_match is not None:
+            print(f"✅ Face {i} MATCHED: {best_match['name']} ({best_match['roll']}) - Distance: {best_distance:.3f}, Confidence: {best_confidence:.1f}%")
+            
+            # Double-check: Only mark attendance if confidence is very high
+            if best_confidence >= 75.0:  # Extra strict check
+                marked = marked_cache.mark(
+                    best_match["roll"], best_match["name"], now,
+                    confidence=best_confidence,
+                    face_detected=True  # Mark that this was from actual face detection
+                )
+                if marked:
+                    print(f"✅ Attendance marked for {best_match['name']}")
+                else:
+                    print(f"⚠️ Attendance already exists for {best_match['name']} this hour")
+
+                # Add to recognized list (reporting)
+                recognized.append({
+                    "roll": best_match["roll"],
+                    "name": best_match["name"],
+                    "confidence": best_confidence
+                })
+            else:
+                print(f"❌ Face {i} REJECTED: Confidence too low ({best_confidence:.1f}% < 75%)")
+        else:
+            print(f"❌ Face {i} REJECTED: No registered student match (best distance: {best_distance:.3f}, tolerance: {tolerance}, confidence threshold: {confidence_threshold}%)")
+    
+    print(f"Media processing complete. Recognized: {len(recognized)} students")
+    return JSONResponse(status_code=200, content={
+        "recognized": recognized,
+        "total_faces_detected": len(face_encodings),
+        "attendance_marked": len(recognized)
+    })
+
+@app.post("/media_attendance/jobs")
+def create_media_attendance_job(
+    files: List[UploadFile] = File(...),
+    custom_time: str = Query(None),
+    department: str = Query(None),
+    section: str = Query(None),
+    batch: str = Query(None),
+    specialization: str = Query(None),
+    scope_fallback: bool = Query(False),
+    sample_every_s: float = Query(MEDIA_SAMPLE_EVERY_S, gt=0, le=60),
+    detect_scale: float = Query(FACE_DETECT_SCALE, gt=0, le=1),
+    upsample: int = Query(FACE_DETECT_UPSAMPLE, ge=0, le=2)
+):
+    """Queue a video, several photos or a zip of photos; poll GET /media_attendance/jobs/{job_id}."""
+    # For a video, custom_time is when the recording started
+    if custom_time:
+        try:
+            base_time = datetime.fromisoformat(custom_time.replace('T', ' '))
+        except ValueError:
+            return JSONResponse(status_code=400, content={"error": "Invalid custom time format"})
+    else:
+        base_time = datetime.now()
+
+    scope = make_scope(department=department, section=section, batch=batch, specialization=specialization)
+    try:
+        job_id = media_jobs.create(
+            files, base_time, scope=scope, scope_fallback=scope_fallback, sample_every_s=sample_every_s,
+            detect_scale=detect_scale, upsample=upsample,
+        )
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    return JSONResponse(status_code=202, content={"job_id": job_id, "status": "queued"})
+
+@app.get("/media_attendance/jobs/{job_id}")
+def get_media_attendance_job(job_id: str):
+    job = media_jobs.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found"})
+    return job
+
+def _attendance_out(record):
+    record["_id"] = str(record["_id"])
+    for key, value in record.items():
+        if isinstance(value, datetime):
+            record[key] = value.strftime("%Y-%m-%d %H:%M:%S")
+    return record
+
+def _listing(docs, limit, output, convert, cursor_of):
+    """All matches as one array, one page with next_cursor (limit), or an NDJSON stream."""
+    if output == "ndjson":
+        if limit:
+            docs = docs.limit(limit)
+        return StreamingResponse(ndjson_lines(docs, convert), media_type="application/x-ndjson")
+    if limit is None:
+        return [convert(d) for d in docs]
+    page = list(docs.limit(limit + 1))
+    next_cursor = cursor_of(page[limit - 1]) if len(page) > limit else None
+    return {"items": [convert(d) for d in page[:limit]], "next_cursor": next_cursor}
+
 @app.get("/attendance")
-def get_attendance():
-    records = list(attendance_col.find())
-    for r in records:
-        r["_id"] = str(r["_id"])
-        r["timestamp"] = r["timestamp"].strftime("%Y-%m-%d %H:%M:%S")
-    return records
+def get_attendance(
+    limit: int = Query(None, ge=1, le=1000),
+    cursor: str = Query(None),
+    start: str = Query(None, description="From this date/time, ISO (inclusive)"),
+    end: str = Query(None, description="Until this date/time, ISO (exclusive)"),
+    roll: str = Query(None),
+    department: str = Query(None),
+    section: str = Query(None),
+    batch: str = Query(None),
+    specialization: str = Query(None),
+    fields: str = Query(None, description="Comma-separated fields to return, e.g. roll,name,timestamp"),
+    output: str = Query("json", alias="format", description="json or ndjson")
+):
+    """
+    Attendance records, newest first. Without `limit` every match comes back
+    as one array; with it, a page and a `next_cursor` to pass back.
+    format=ndjson streams the matches line by line from the database cursor.
+    """
+    if output not in ("json", "ndjson"):
+        return JSONResponse(status_code=400, content={"error": "format must be json or ndjson"})
+    query = {}
+    try:
+        if start or end:
+            query["timestamp"] = {}
+            if start:
+                query["timestamp"]["$gte"] = datetime.fromisoformat(start)
+            if end:
+                query["timestamp"]["$lt"] = datetime.fromisoformat(end)
+        if cursor:
+            query.update(before_timestamp_cursor(cursor))
+        projection = parse_fields(fields, always=("_id", "timestamp"))
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    scope = make_scope(department=department, section=section, batch=batch, specialization=specialization)
+    if scope:
+        # records hold no cohort fields; filter by the cohort's rolls
+        rolls = students_col.distinct("roll", scope)
+        query["roll"] = {"$in": [r for r in rolls if roll is None or r == roll]}
+    elif roll:
+        query["roll"] = roll
+
+    docs = attendance_col.find(query, projection).sort([("timestamp", -1), ("_id", -1)])
+    return _listing(docs, limit, output, _attendance_out, lambda r: encode_cursor(r["timestamp"], r["_id"]))
 
 @app.get("/rtsp/check_now")
-def rtsp_check_now():
-    if not RTSP_URL:
+def rtsp_check_now(camera_id: str = Query(None)):
+    camera = _camera_settings_for(camera_id)
+    if not camera.get("rtsp_url"):
         return JSONResponse(status_code=400, content={"error": "RTSP_URL not configured"})
     try:
-        cap = cv2.VideoCapture(RTSP_URL)
+        cap = cv2.VideoCapture(camera["rtsp_url"])
         if not cap.isOpened():
             return JSONResponse(status_code=500, content={"error": "Failed to open RTSP stream"})
         ok, frame = cap.read()
@@ -386,42 +549,27 @@ def rtsp_check_now():
         if not ok or frame is None:
             return JSONResponse(status_code=500, content={"error": "Failed to read frame from RTSP stream"})
 
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        face_locations = face_recognition.face_locations(rgb, number_of_times_to_upsample=1)
-        face_encodings = face_recognition.face_encodings(rgb, face_locations)
+        face_locations, face_encodings = compute_pool.run_sync(
+            face_pipeline.detect_and_encode_bgr, frame, upsample=camera["detect_upsample"],
+            scale=camera["detect_scale"], rois=camera["rois"]
+        )
 
         if not face_encodings:
             return {"faces_detected": 0, "recognized": []}
 
-        # Load students and compare
-        students = list(students_col.find())
-        tolerance = 0.25
-        confidence_threshold = 0.75
+        # Compare against the in-memory gallery
         recognized = []
-
-        for enc in face_encodings:
-            best = None
-            best_distance = float('inf')
-            best_conf = 0
-            for s in students:
-                try:
-                    known = np.array(s["face_encoding"])
-                    distance = face_recognition.face_distance([known], enc)[0]
-                    conf = (1 - distance) * 100
-                except Exception:
-                    continue
-                if distance < best_distance and distance <= tolerance and conf >= confidence_threshold:
-                    best_distance = distance
-                    best_conf = conf
-                    best = s
-            if best:
+        for best in gallery.assign(face_encodings, scope=make_scope(camera["scope"]), fallback=camera["scope_fallback"]):
+            if best["roll"] is not None:
                 recognized.append({
                     "roll": best["roll"],
                     "name": best["name"],
-                    "confidence": best_conf
+                    "confidence": best["confidence"]
                 })
 
         return {"faces_detected": len(face_encodings), "recognized": recognized}
+    except (PoolBusy, PoolTimeout):
+        raise
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
@@ -473,12 +621,45 @@ def attendance_by_hour(
     return {"present": present, "absent": absent}
 
 
+def _student_out(s):
+    s["_id"] = str(s["_id"])
+    if "face_encoding" in s:
+        s["face_encoding"] = encoding_to_list(s["face_encoding"])
+    if "face_samples" in s:
+        s["face_samples"] = [encoding_to_list(v) for v in s["face_samples"]]
+    for key, value in s.items():
+        if isinstance(value, datetime):
+            s[key] = value.isoformat()
+    return s
+
 @app.get("/students_full")
-def get_students_full():
-    students = list(students_col.find())
-    for s in students:
-        s["_id"] = str(s["_id"])
-    return students
+def get_students_full(
+    limit: int = Query(None, ge=1, le=1000),
+    cursor: str = Query(None),
+    department: str = Query(None),
+    section: str = Query(None),
+    batch: str = Query(None),
+    specialization: str = Query(None),
+    fields: str = Query(None, description="Comma-separated fields, e.g. roll,name,section (default: everything)"),
+    output: str = Query("json", alias="format", description="json or ndjson")
+):
+    """
+    Students in enrolment order, same paging and streaming as /attendance.
+    Ask for only the fields you need: encodings and photos dominate the size.
+    """
+    if output not in ("json", "ndjson"):
+        return JSONResponse(status_code=400, content={"error": "format must be json or ndjson"})
+    query = dict(make_scope(department=department, section=section, batch=batch,
+                            specialization=specialization) or {})
+    try:
+        if cursor:
+            query.update(after_id_cursor(cursor))
+        projection = parse_fields(fields)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    docs = students_col.find(query, projection).sort("_id", 1)
+    return _listing(docs, limit, output, _student_out, lambda s: encode_cursor(s["_id"]))
 
 @app.put("/students/{student_id}")
 def update_student(student_id: str, data: dict = Body(...)):
@@ -494,9 +675,11 @@ def update_student(student_id: str, data: dict = Body(...)):
         if not re.match(r"^\+\d{10,15}$", update_fields["phone"]):
             return JSONResponse(status_code=400, content={"error": "Invalid phone number format. Use +919876543210 style."})
     
+    update_fields["updated_at"] = datetime.now()
     result = students_col.update_one({"_id": ObjectId(student_id)}, {"$set": update_fields})
     if result.matched_count == 0:
         return JSONResponse(status_code=404, content={"error": "Student not found."})
+    gallery.upsert(students_col.find_one({"_id": ObjectId(student_id)}, GALLERY_PROJECTION))
     return {"message": "Student updated."}
 
 @app.delete("/students/{student_id}")
@@ -504,6 +687,7 @@ def delete_student(student_id: str):
     result = students_col.delete_one({"_id": ObjectId(student_id)})
     if result.deleted_count == 0:
         return JSONResponse(status_code=404, content={"error": "Student not found."})
+    gallery.remove(ObjectId(student_id))
     return {"message": "Student deleted."}
 
 @app.delete("/attendance/clear_hour")
@@ -523,11 +707,16 @@ def clear_attendance_hour(
 
     end_time = start_time + timedelta(hours=1)
     
+    # Queued camera/batch markings would otherwise land after the delete and bring records back
+    attendance_writer.flush()
+
     # Delete all attendance records for this hour
     result = attendance_col.delete_many({
         "timestamp": {"$gte": start_time, "$lt": end_time}
     })
-    
+    # cleared students can be marked again straight away
+    marked_cache.invalidate(start_time)
+
     return {
         "message": f"Cleared {result.deleted_count} attendance records for {day} {hour}",
         "deleted_count": result.deleted_count
@@ -619,70 +808,228 @@ def get_staff_emails():
 
 # ==== RTSP worker wiring ====
 try:
-    from .rtsp_worker import RtspAttendanceWorker
+    from .camera_manager import CameraManager, camera_settings, default_camera_settings
+    from .camera_control import RemoteCameraManager, CONTROL_COLLECTION
+    from .scan_scheduler import validate_schedule
 except ImportError:
     # Fallback when running as a script: python app.py
-    from rtsp_worker import RtspAttendanceWorker
+    from camera_manager import CameraManager, camera_settings, default_camera_settings
+    from camera_control import RemoteCameraManager, CONTROL_COLLECTION
+    from scan_scheduler import validate_schedule
+
+# The RTSP_URL camera from config is registered under this id
+DEFAULT_CAMERA_ID = "default"
+
+cameras_col = db["cameras"]
+# Cameras get their own capped pool so they cannot starve (or be starved by) API uploads
+camera_compute_pool = ComputePool(CAMERA_COMPUTE_WORKERS, CAMERA_COMPUTE_MAX_PENDING, timeout_s=COMPUTE_TIMEOUT_S)
+if RTSP_WORKER_MODE == "process":
+    # workers run as `python -m backend.rtsp_worker`; the API only sends commands and reads heartbeats
+    camera_manager = RemoteCameraManager(cameras_col, db[CONTROL_COLLECTION], stale_after_s=RTSP_HEARTBEAT_STALE_S)
+else:
+    camera_manager = CameraManager(
+        cameras_col, db, gallery, compute_pool=camera_compute_pool, defaults=default_camera_settings(),
+        gallery_poll_s=GALLERY_POLL_INTERVAL_S, marked_cache=marked_cache,
+    )
+
+
+def _camera_settings_for(camera_id=None):
+    """Effective settings (config defaults + registry entry) for the one-shot RTSP endpoints."""
+    camera_id = camera_id or DEFAULT_CAMERA_ID
+    settings = dict(default_camera_settings(), rtsp_url=RTSP_URL if camera_id == DEFAULT_CAMERA_ID else None)
+    camera = cameras_col.find_one({"_id": camera_id})
+    if camera:
+        settings.update({k: v for k, v in camera.items() if v is not None})
+    return settings
+
+
+def _camera_out(camera):
+    camera = dict(camera)
+    camera["camera_id"] = camera.pop("_id")
+    if isinstance(camera.get("start_after"), datetime):
+        camera["start_after"] = camera["start_after"].isoformat()
+    camera["running"] = camera_manager.is_running(camera["camera_id"])
+    return camera
 
-# Configuration loaded from config.py
-_start_after_dt = None
-if ATTENDANCE_START_AFTER:
+
+@app.on_event("startup")
+def _ensure_indexes():
+    # also enforces one attendance record per roll per hour for concurrent writers
     try:
-        _start_after_dt = datetime.fromisoformat(ATTENDANCE_START_AFTER)
-    except Exception:
-        _start_after_dt = None
-_rtsp_worker = None
+        ensure_indexes(db)
+    except Exception as e:
+        print(f"Could not create indexes: {e}")
+    try:
+        # records from before hour_bucket existed would not dedupe against this hour's upserts;
+        # older hours are left to migrate_attendance_buckets.py
+        backfill_hour_buckets(attendance_col, since=hour_bucket(datetime.now()))
+    except Exception as e:
+        print(f"Could not backfill attendance hour buckets: {e}")
+    attendance_writer.start()
+
+@app.on_event("startup")
+def _warm_gallery():
+    # Start matching from the shared snapshot right away
+    gallery.load_snapshot()
+    Thread(target=_resync_gallery, daemon=True).start()
+
+def _resync_gallery():
+    # scan Mongo (and republish) only when the snapshot has fallen behind it
+    if not gallery.snapshot_is_current():
+        gallery.load()
+
+@app.on_event("startup")
+def _fail_interrupted_media_jobs():
+    media_jobs.fail_interrupted()
 
 @app.on_event("startup")
 def _maybe_start_rtsp():
-    global _rtsp_worker
     if RTSP_URL:
-        _rtsp_worker = RtspAttendanceWorker(
-            RTSP_URL, db, interval_ms=RTSP_SCAN_INTERVAL_MS, frame_skip=RTSP_FRAME_SKIP, start_after=_start_after_dt
+        # the single configured camera lives on as the "default" registry entry
+        cameras_col.update_one(
+            {"_id": DEFAULT_CAMERA_ID},
+            {"$set": {"rtsp_url": RTSP_URL},
+             "$setOnInsert": {"name": "Default camera", "enabled": True, "created_at": datetime.now()}},
+            upsert=True,
         )
-        _rtsp_worker.start()
+    camera_manager.start_enabled()
 
 @app.on_event("shutdown")
 def _stop_rtsp():
-    if _rtsp_worker:
-        _rtsp_worker.stop()
+    camera_manager.stop_all()
+    camera_compute_pool.shutdown()
+    media_jobs.shutdown()
+    compute_pool.shutdown()
+    # cameras are stopped above, so nothing queues after the final flush
+    attendance_writer.stop()
+
+@app.post("/cameras")
+def add_camera(data: dict = Body(...)):
+    camera_id = str(data.pop("camera_id", None) or ObjectId())
+    try:
+        settings = camera_settings(data)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    if not settings.get("rtsp_url"):
+        return JSONResponse(status_code=400, content={"error": "rtsp_url is required"})
+    if cameras_col.find_one({"_id": camera_id}, {"_id": 1}):
+        return JSONResponse(status_code=400, content={"error": "Camera ID already exists."})
+    settings.setdefault("enabled", True)
+    cameras_col.insert_one({"_id": camera_id, **settings, "created_at": datetime.now()})
+    if settings["enabled"]:
+        camera_manager.start(camera_id)
+    return {"message": "Camera added", "camera_id": camera_id}
+
+@app.get("/cameras")
+def list_cameras():
+    return [_camera_out(c) for c in cameras_col.find({})]
+
+@app.get("/cameras/status")
+def cameras_status():
+    """Aggregate status of every registered camera"""
+    return camera_manager.status_all()
+
+@app.get("/cameras/{camera_id}")
+def get_camera(camera_id: str):
+    camera = cameras_col.find_one({"_id": camera_id})
+    if not camera:
+        return JSONResponse(status_code=404, content={"error": "Camera not found"})
+    return _camera_out(camera)
+
+@app.put("/cameras/{camera_id}")
+def update_camera(camera_id: str, data: dict = Body(...)):
+    data.pop("camera_id", None)
+    try:
+        settings = camera_settings(data)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    if "rtsp_url" in settings and not settings["rtsp_url"]:
+        return JSONResponse(status_code=400, content={"error": "rtsp_url cannot be empty"})
+    result = cameras_col.update_one({"_id": camera_id}, {"$set": {**settings, "updated_at": datetime.now()}})
+    if result.matched_count == 0:
+        return JSONResponse(status_code=404, content={"error": "Camera not found"})
+    # running workers pick up new settings by restarting
+    camera_manager.restart(camera_id)
+    return {"message": "Camera updated"}
+
+@app.delete("/cameras/{camera_id}")
+def delete_camera(camera_id: str):
+    camera_manager.stop(camera_id)
+    result = cameras_col.delete_one({"_id": camera_id})
+    if result.deleted_count == 0:
+        return JSONResponse(status_code=404, content={"error": "Camera not found"})
+    return {"message": "Camera deleted"}
+
+@app.post("/rtsp/{camera_id}/start")
+def rtsp_camera_start(camera_id: str):
+    try:
+        started = camera_manager.start(camera_id)
+    except KeyError:
+        return JSONResponse(status_code=404, content={"error": "Camera not found"})
+    if not started:
+        return {"message": "RTSP worker already running"}
+    return {"message": "RTSP worker started"}
+
+@app.post("/rtsp/{camera_id}/stop")
+def rtsp_camera_stop(camera_id: str):
+    if not camera_manager.stop(camera_id):
+        return {"message": "RTSP worker not running"}
+    return {"message": "RTSP worker stopped"}
+
+@app.get("/rtsp/{camera_id}/status")
+def rtsp_camera_status(camera_id: str):
+    return camera_manager.status(camera_id)
+
+@app.get("/rtsp/{camera_id}/schedule")
+def rtsp_camera_schedule(camera_id: str):
+    camera = cameras_col.find_one({"_id": camera_id}, {"schedule": 1})
+    if not camera:
+        return JSONResponse(status_code=404, content={"error": "Camera not found"})
+    return {
+        "camera_id": camera_id,
+        "bounds": dict(default_camera_settings()["schedule"], **(camera.get("schedule") or {})),
+        "current": camera_manager.status(camera_id).get("scheduler"),
+    }
 
+@app.put("/rtsp/{camera_id}/schedule")
+def update_rtsp_camera_schedule(camera_id: str, data: dict = Body(...)):
+    """Change the adaptive scheduler bounds live (no worker restart)"""
+    try:
+        bounds = validate_schedule(data)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    result = cameras_col.update_one(
+        {"_id": camera_id}, {"$set": {**{f"schedule.{k}": v for k, v in bounds.items()}, "updated_at": datetime.now()}}
+    )
+    if result.matched_count == 0:
+        return JSONResponse(status_code=404, content={"error": "Camera not found"})
+    current = camera_manager.set_schedule(camera_id, bounds)
+    return {"message": "Schedule updated", "current": current}
+
+# The original single-camera endpoints act on the default camera
 @app.post("/rtsp/start")
 def rtsp_start():
-    global _rtsp_worker
-    if _rtsp_worker and _rtsp_worker.status().get("running"):
-        return {"message": "RTSP worker already running"}
     if not RTSP_URL:
         return JSONResponse(status_code=400, content={"error": "RTSP_URL not configured"})
-    _rtsp_worker = RtspAttendanceWorker(
-        RTSP_URL, db, interval_ms=RTSP_SCAN_INTERVAL_MS, frame_skip=RTSP_FRAME_SKIP, start_after=_start_after_dt
-    )
-    started = _rtsp_worker.start()
-    if not started:
-        return JSONResponse(status_code=500, content={"error": "Failed to start worker"})
-    return {"message": "RTSP worker started"}
+    return rtsp_camera_start(DEFAULT_CAMERA_ID)
 
 @app.post("/rtsp/stop")
 def rtsp_stop():
-    if not _rtsp_worker:
-        return {"message": "RTSP worker not running"}
-    _rtsp_worker.stop()
-    return {"message": "RTSP worker stopped"}
+    return rtsp_camera_stop(DEFAULT_CAMERA_ID)
 
 @app.get("/rtsp/status")
 def rtsp_status():
-    if not _rtsp_worker:
-        return {"running": False}
-    return _rtsp_worker.status()
+    return camera_manager.status(DEFAULT_CAMERA_ID)
 
 @app.post("/rtsp/mark_attendance_now")
-def rtsp_mark_attendance_now():
+def rtsp_mark_attendance_now(camera_id: str = Query(None)):
     """Manually trigger attendance marking from RTSP stream right now"""
-    if not RTSP_URL:
+    camera = _camera_settings_for(camera_id)
+    if not camera.get("rtsp_url"):
         return JSONResponse(status_code=400, content={"error": "RTSP_URL not configured"})
     
     try:
-        cap = cv2.VideoCapture(RTSP_URL)
+        cap = cv2.VideoCapture(camera["rtsp_url"])
         if not cap.isOpened():
             return JSONResponse(status_code=500, content={"error": "Failed to open RTSP stream"})
         
@@ -694,44 +1041,33 @@ def rtsp_mark_attendance_now():
             return JSONResponse(status_code=500, content={"error": "Failed to read frame from RTSP stream"})
 
         # Process the frame for face recognition
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        face_locations = face_recognition.face_locations(rgb, number_of_times_to_upsample=1)
-        face_encodings = face_recognition.face_encodings(rgb, face_locations)
+        face_locations, face_encodings = compute_pool.run_sync(
+            face_pipeline.detect_and_encode_bgr, frame, upsample=camera["detect_upsample"],
+            scale=camera["detect_scale"], rois=camera["rois"]
+        )
 
         if not face_encodings:
             return {"faces_detected": 0, "recognized": [], "message": "No faces detected in current frame"}
 
-        # Get all students and compare
-        students = list(students_col.find())
-        if not students:
+        # Compare against the in-memory gallery
+        gallery.ensure_loaded()
+        if not len(gallery):
             return {"faces_detected": len(face_encodings), "recognized": [], "message": "No students registered"}
 
         now = datetime.now()
-        hour_start = now.replace(minute=0, second=0, microsecond=0)
-        hour_end = hour_start + timedelta(hours=1)
-        
+
         tolerance = 0.25
         confidence_threshold = 0.75
         recognized = []
         attendance_marked = []
 
-        for encoding in face_encodings:
-            best_match = None
-            best_distance = float('inf')
-            best_confidence = 0
-            
-            for student in students:
-                try:
-                    known_encoding = np.array(student["face_encoding"])
-                    distance = face_recognition.face_distance([known_encoding], encoding)[0]
-                    confidence = (1 - distance) * 100
-                except Exception:
-                    continue
-                
-                if distance < best_distance and distance <= tolerance and confidence >= confidence_threshold:
-                    best_distance = distance
-                    best_confidence = confidence
-                    best_match = student
+        matches = gallery.assign(
+            face_encodings, tolerance=tolerance, confidence_threshold=confidence_threshold,
+            scope=make_scope(camera["scope"]), fallback=camera["scope_fallback"]
+        )
+        for match in matches:
+            best_match = match if match["roll"] is not None else None
+            best_confidence = match.get("confidence", 0)
 
             if best_match:
                 recognized.append({
@@ -740,20 +1076,9 @@ def rtsp_mark_attendance_now():
                     "confidence": best_confidence
                 })
 
-                # Check if attendance already marked this hour
-                exists = attendance_col.find_one({
-                    "roll": best_match["roll"],
-                    "timestamp": {"$gte": hour_start, "$lt": hour_end}
-                })
-                
-                if not exists:
-                    attendance_col.insert_one({
-                        "roll": best_match["roll"],
-                        "name": best_match["name"],
-                        "timestamp": now,
-                        "confidence": best_confidence,
-                        "source": "rtsp_manual"
-                    })
+                # Only new if attendance wasn't already marked this hour
+                if marked_cache.mark(best_match["roll"], best_match["name"], now,
+                                     confidence=best_confidence, source="rtsp_manual"):
                     attendance_marked.append({
                         "roll": best_match["roll"],
                         "name": best_match["name"],
@@ -767,10 +1092,15 @@ def rtsp_mark_attendance_now():
             "message": f"Processed {len(face_encodings)} faces, recognized {len(recognized)} students, marked attendance for {len(attendance_marked)} new students"
         }
         
+    except (PoolBusy, PoolTimeout):
+        raise
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 # FastAPI startup block
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
+    # Hand over to `python -m uvicorn app:app`. Compute pool workers are spawned and
+    # re-import the __main__ script; as __main__ this module would rebuild the whole
+    # app (Mongo client, gallery, pools, cameras) in every one of them.
+    import sys
+    os.execv(sys.executable, [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", "8000"])
\ No newline at end of file
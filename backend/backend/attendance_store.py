@@ -0,0 +1,345 @@
+"""
+Attendance writes: one record per roll per hour.
+
+Each record carries an explicit `hour_bucket` (the start of its hour) and a
+unique index on (roll, hour_bucket) makes the database enforce the "once per
+hour" rule. Marking is a single upsert instead of find_one + insert_one, so
+two cameras or endpoints seeing the same student at once cannot both insert.
+
+High-rate paths (cameras, batch marking) go through MarkedCache, which
+skips rolls already marked this hour, and an AttendanceWriter, which
+batches the remaining upserts into unordered bulk writes.
+"""
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from threading import Condition, Event, Lock, Thread
+
+from pymongo import ASCENDING, IndexModel, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+BUCKET_INDEX = "roll_hour_bucket_unique"
+# partial: rows written before hour_bucket existed are left alone
+BUCKET_INDEX_MODEL = IndexModel(
+    [("roll", ASCENDING), ("hour_bucket", ASCENDING)],
+    name=BUCKET_INDEX, unique=True, partialFilterExpression={"hour_bucket": {"$exists": True}},
+)
+
+
+def hour_bucket(timestamp):
+    """Start of the hour a timestamp falls in."""
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def ensure_bucket_index(attendance_col):
+    attendance_col.create_indexes([BUCKET_INDEX_MODEL])
+
+
+def backfill_hour_buckets(attendance_col, since=None, batch_size=500, dry_run=False):
+    """
+    Add `hour_bucket` to records written before it existed (only those at or
+    after `since`, if given), so the unique index covers them. Oldest first:
+    when a roll already has a record in that hour the extra rows are left
+    without a bucket. Returns (updated, duplicates). Needs the bucket index.
+    """
+    query = {"hour_bucket": {"$exists": False}, "timestamp": {"$type": "date"}}
+    if since is not None:
+        query["timestamp"] = {"$gte": since}
+    updated, duplicates = 0, 0
+    ops = []
+    for doc in attendance_col.find(query, {"timestamp": 1}).sort("timestamp", 1):
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"hour_bucket": hour_bucket(doc["timestamp"])}}))
+        if len(ops) >= batch_size:
+            done, dups = _apply_backfill(attendance_col, ops, dry_run)
+            updated, duplicates, ops = updated + done, duplicates + dups, []
+    if ops:
+        done, dups = _apply_backfill(attendance_col, ops, dry_run)
+        updated, duplicates = updated + done, duplicates + dups
+    return updated, duplicates
+
+
+def _apply_backfill(attendance_col, ops, dry_run):
+    if dry_run:
+        return len(ops), 0
+    try:
+        result = attendance_col.bulk_write(ops, ordered=False)
+        return result.modified_count, 0
+    except BulkWriteError as e:
+        duplicates = sum(1 for err in e.details.get("writeErrors", []) if err.get("code") == 11000)
+        return e.details.get("nModified", 0), duplicates
+
+
+def _upsert_args(roll, name, timestamp, fields):
+    # (filter, update) for the once-per-hour upsert
+    record = {"name": name, "timestamp": timestamp, **fields}
+    return {"roll": roll, "hour_bucket": hour_bucket(timestamp)}, {"$setOnInsert": record}
+
+
+def mark_attendance(attendance_col, roll, name, timestamp, **fields):
+    """
+    Record attendance for `roll` in the hour of `timestamp` unless it already
+    exists. Extra fields (confidence, source, camera_id, ...) are only written
+    with a new record. Returns True if this call created the record.
+    """
+    try:
+        result = attendance_col.update_one(*_upsert_args(roll, name, timestamp, fields), upsert=True)
+    except DuplicateKeyError:
+        # a concurrent upsert for the same roll and hour won
+        return False
+    return result.upserted_id is not None
+
+
+class MarkedCache:
+    """
+    Rolls already marked in the current hour, per process. A camera that
+    re-recognises the same seated class every few seconds then costs no
+    database calls; only the first sighting of a roll in an hour writes.
+
+    The set is seeded from Mongo when the hour starts and dropped at the next
+    rollover. /attendance/clear_hour invalidates it in this process; other
+    processes (out-of-process camera workers) re-seed every `refresh_s`
+    seconds so they notice cleared hours too (0 = only at rollover).
+    Timestamps outside the current hour (custom_time uploads) bypass it.
+    """
+
+    def __init__(self, attendance_col, refresh_s=60.0, writer=None):
+        self.attendance_col = attendance_col
+        self.refresh_s = max(0.0, float(refresh_s))
+        # queue() hands first sightings to this AttendanceWriter instead of writing inline
+        self.writer = writer
+        if writer is not None:
+            writer.on_failed = self._forget
+        self._lock = Lock()
+        self._bucket = None
+        self._rolls = set()
+        self._seeded_at = 0.0
+
+        self.hits = 0
+        self.writes = 0
+        self.seeds = 0
+
+    def _current_bucket(self):
+        # caller holds the lock
+        bucket = hour_bucket(datetime.now())
+        stale = self.refresh_s and time.monotonic() - self._seeded_at >= self.refresh_s
+        if bucket != self._bucket or stale:
+            cursor = self.attendance_col.find(
+                {"timestamp": {"$gte": bucket, "$lt": bucket + timedelta(hours=1)}}, {"roll": 1, "_id": 0}
+            )
+            self._rolls = {doc["roll"] for doc in cursor}
+            self._bucket = bucket
+            self._seeded_at = time.monotonic()
+            self.seeds += 1
+        return bucket
+
+    def is_marked(self, roll, timestamp):
+        """True if `roll` is known to be marked in the hour of `timestamp` (current hour only)."""
+        with self._lock:
+            return hour_bucket(timestamp) == self._current_bucket() and roll in self._rolls
+
+    def mark(self, roll, name, timestamp, **fields):
+        """Same as mark_attendance(), skipping the database for rolls already marked this hour."""
+        bucket = hour_bucket(timestamp)
+        with self._lock:
+            current = bucket == self._current_bucket()
+            if current and roll in self._rolls:
+                self.hits += 1
+                return False
+        created = mark_attendance(self.attendance_col, roll, name, timestamp, **fields)
+        self.writes += 1
+        if current:
+            with self._lock:
+                if self._bucket == bucket:
+                    self._rolls.add(roll)
+        return created
+
+    def queue(self, roll, name, timestamp, **fields):
+        """
+        Like mark(), but the write goes through the buffered writer and the
+        caller does not wait for it. Returns True if a write was queued.
+        """
+        if self.writer is None:
+            return self.mark(roll, name, timestamp, **fields)
+        bucket = hour_bucket(timestamp)
+        with self._lock:
+            current = bucket == self._current_bucket()
+            if current and roll in self._rolls:
+                self.hits += 1
+                return False
+            if current:
+                # claimed before queueing so a second camera does not queue it too
+                self._rolls.add(roll)
+        if not self.writer.add(roll, name, timestamp, fields):
+            # queue full (Mongo is slow or down) or writer stopped: release the
+            # claim, or mark() would take it for a finished write, and write directly
+            if current:
+                self._forget(roll, timestamp)
+            return self.mark(roll, name, timestamp, **fields)
+        self.writes += 1
+        return True
+
+    def _forget(self, roll, timestamp):
+        # a queued write failed; let the next sighting try again
+        with self._lock:
+            if self._bucket == hour_bucket(timestamp):
+                self._rolls.discard(roll)
+
+    def invalidate(self, timestamp=None):
+        """Forget the cached hour (all of it, or only if `timestamp` falls in it)."""
+        with self._lock:
+            if timestamp is None or hour_bucket(timestamp) == self._bucket:
+                self._bucket = None
+                self._rolls = set()
+
+    def status(self):
+        return {
+            "hour": self._bucket.isoformat() if self._bucket else None,
+            "marked_rolls": len(self._rolls),
+            "hits": self.hits,
+            "writes": self.writes,
+            "seeds": self.seeds,
+        }
+
+
+class AttendanceWriter:
+    """
+    Collects attendance upserts on a queue and writes them with one unordered
+    bulk_write every `flush_ms` or as soon as `max_batch` are waiting, so a
+    burst of recognitions across cameras costs a few round trips and the
+    recognition threads never wait for write acknowledgements.
+
+    Each queued event is the same (roll, hour_bucket) $setOnInsert upsert as
+    mark_attendance(), so dedup is unchanged. stop() drains the queue.
+    """
+
+    def __init__(self, attendance_col, flush_ms=250, max_batch=200, max_queue=10000):
+        self.attendance_col = attendance_col
+        self.flush_s = max(0.01, flush_ms / 1000.0)
+        self.max_batch = max(1, int(max_batch))
+        self.max_queue = max(self.max_batch, int(max_queue))
+        self.on_failed = None  # called with (roll, timestamp) for each event that could not be written
+        self.stop_event = Event()
+        self.thread = None
+        self._cond = Condition()
+        self._queue = deque()
+        # held from taking a batch off the queue until it is written
+        self._write_lock = Lock()
+
+        self.queued = 0
+        self.written = 0
+        self.inserted = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_batch = 0
+        self.last_write_ms = None
+        self.avg_write_ms = None
+        self.last_error = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=10.0):
+        """Flush whatever is queued and stop the flush thread."""
+        self.stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self.thread:
+            self.thread.join(timeout=timeout)
+        # not started (or it died): write the rest from here
+        if self._queue and not (self.thread and self.thread.is_alive()):
+            self._flush()
+
+    def add(self, roll, name, timestamp, fields=None):
+        """Queue one marking; False if the queue is full or the writer is stopped."""
+        with self._cond:
+            if self.stop_event.is_set() or len(self._queue) >= self.max_queue:
+                return False
+            self._queue.append((roll, name, timestamp, dict(fields or {})))
+            self.queued += 1
+            if len(self._queue) >= self.max_batch:
+                self._cond.notify_all()
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # add() wakes us early once a full batch is waiting
+                if len(self._queue) < self.max_batch and not self.stop_event.is_set():
+                    self._cond.wait(self.flush_s)
+                if not self._queue and self.stop_event.is_set():
+                    return
+            self._flush()
+
+    def flush(self):
+        """Write everything queued so far, including a batch the flush thread is writing right now."""
+        self._flush()
+
+    def _flush(self):
+        while True:
+            with self._write_lock:
+                with self._cond:
+                    batch = [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+                if not batch:
+                    return
+                self._write(batch)
+            if len(batch) < self.max_batch:
+                return
+
+    def _write(self, batch):
+        events = {}
+        for roll, name, timestamp, fields in batch:
+            # same roll twice in one hour within a batch: the first one wins, as in the database
+            events.setdefault((roll, hour_bucket(timestamp)), (roll, name, timestamp, fields))
+        events = list(events.values())
+        ops = [UpdateOne(*_upsert_args(roll, name, timestamp, fields), upsert=True)
+               for roll, name, timestamp, fields in events]
+        started = time.perf_counter()
+        failed = []
+        try:
+            result = self.attendance_col.bulk_write(ops, ordered=False)
+            self.inserted += result.upserted_count
+            self.last_error = None
+        except BulkWriteError as e:
+            self.inserted += e.details.get("nUpserted", 0)
+            for error in e.details.get("writeErrors", []):
+                # 11000: a concurrent writer already inserted this roll and hour
+                if error.get("code") != 11000:
+                    failed.append(events[error["index"]])
+                    self.last_error = error.get("errmsg")
+        except Exception as e:
+            failed = events
+            self.last_error = str(e)
+            print(f"Attendance bulk write failed ({len(events)} records): {e}")
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        self.last_write_ms = elapsed_ms
+        if self.avg_write_ms is None:
+            self.avg_write_ms = elapsed_ms
+        else:
+            self.avg_write_ms += 0.2 * (elapsed_ms - self.avg_write_ms)
+        self.batches += 1
+        self.last_batch = len(events)
+        self.written += len(events) - len(failed)
+        self.failed += len(failed)
+        if self.on_failed is not None:
+            for roll, _, timestamp, _ in failed:
+                self.on_failed(roll, timestamp)
+
+    def status(self):
+        def ms(value):
+            return round(value, 1) if value is not None else None
+        return {
+            "queue_depth": len(self._queue),
+            "queued": self.queued,
+            "written": self.written,
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "batches": self.batches,
+            "last_batch": self.last_batch,
+            "last_write_ms": ms(self.last_write_ms),
+            "avg_write_ms": ms(self.avg_write_ms),
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,218 @@
+"""
+Mongo-backed control plane between the API and out-of-process RTSP workers.
+
+One `camera_control` document per camera carries the command side
+("desired": running/stopped, "restart_at" when settings changed) written by
+the API, and the heartbeat side ("heartbeat_at", "status", "pid", "host")
+written by the worker process every few seconds.
+"""
+import os
+import socket
+from datetime import datetime, timedelta
+from threading import Event
+
+try:
+    from .camera_manager import CameraManager, default_camera_settings
+    from .compute_pool import ComputePool
+    from .face_gallery import FaceGallery
+    from .attendance_store import AttendanceWriter, MarkedCache
+    from .config import CAMERA_COMPUTE_WORKERS, CAMERA_COMPUTE_MAX_PENDING, COMPUTE_TIMEOUT_S, GALLERY_POLL_INTERVAL_S
+    from .config import ATTENDANCE_MARKED_REFRESH_S, ATTENDANCE_FLUSH_MS, ATTENDANCE_FLUSH_MAX, ATTENDANCE_QUEUE_MAX
+except ImportError:
+    # Fallback when running as a script
+    from camera_manager import CameraManager, default_camera_settings
+    from compute_pool import ComputePool
+    from face_gallery import FaceGallery
+    from attendance_store import AttendanceWriter, MarkedCache
+    from config import CAMERA_COMPUTE_WORKERS, CAMERA_COMPUTE_MAX_PENDING, COMPUTE_TIMEOUT_S, GALLERY_POLL_INTERVAL_S
+    from config import ATTENDANCE_MARKED_REFRESH_S, ATTENDANCE_FLUSH_MS, ATTENDANCE_FLUSH_MAX, ATTENDANCE_QUEUE_MAX
+
+CONTROL_COLLECTION = "camera_control"
+
+
+class RemoteCameraManager:
+    """
+    Same interface as CameraManager, but only records commands and reads
+    heartbeats; the workers themselves run in `python -m backend.rtsp_worker`
+    processes. Safe to use from any number of API processes.
+    """
+
+    def __init__(self, cameras_col, control_col, stale_after_s=15.0):
+        self.cameras_col = cameras_col
+        self.control_col = control_col
+        self.stale_after = timedelta(seconds=stale_after_s)
+
+    def _command(self, camera_id, **fields):
+        self.control_col.update_one(
+            {"_id": camera_id}, {"$set": {**fields, "command_at": datetime.now()}}, upsert=True
+        )
+
+    def _online(self, control):
+        beat = (control or {}).get("heartbeat_at")
+        return beat is not None and datetime.now() - beat < self.stale_after
+
+    def start(self, camera_id):
+        if self.cameras_col.find_one({"_id": camera_id}, {"_id": 1}) is None:
+            raise KeyError(camera_id)
+        if self.is_running(camera_id):
+            return False
+        self._command(camera_id, desired="running")
+        return True
+
+    def stop(self, camera_id):
+        was_running = self.is_running(camera_id)
+        self._command(camera_id, desired="stopped")
+        return was_running
+
+    def restart(self, camera_id):
+        """
+        Apply edited settings: a running worker restarts, a camera the
+        operator stopped stays stopped, and a disabled camera is stopped.
+        """
+        camera = self.cameras_col.find_one({"_id": camera_id}, {"enabled": 1})
+        if not (camera and camera.get("enabled", True)):
+            self._command(camera_id, desired="stopped", restart_at=datetime.now())
+            return False
+        self._command(camera_id, restart_at=datetime.now())
+        control = self.control_col.find_one({"_id": camera_id}, {"desired": 1})
+        return (control or {}).get("desired") != "stopped"
+
+    def set_schedule(self, camera_id, bounds):
+        # worker processes pick the stored bounds up on their next poll
+        return None
+
+    def start_enabled(self):
+        # worker processes start their enabled cameras themselves
+        return []
+
+    def stop_all(self):
+        # worker processes outlive the API on purpose
+        pass
+
+    def is_running(self, camera_id):
+        control = self.control_col.find_one({"_id": camera_id}, {"heartbeat_at": 1, "status.running": 1})
+        return self._online(control) and bool(control.get("status", {}).get("running"))
+
+    def _status_of(self, camera_id, control):
+        control = control or {}
+        online = self._online(control)
+        beat = control.get("heartbeat_at")
+        status = dict(control.get("status") or {}) if online else {}
+        status.setdefault("running", False)
+        return {
+            **status,
+            "camera_id": camera_id,
+            "worker_online": online,
+            "worker_pid": control.get("pid"),
+            "worker_host": control.get("host"),
+            "desired": control.get("desired"),
+            "heartbeat_age_s": round((datetime.now() - beat).total_seconds(), 1) if beat else None,
+        }
+
+    def status(self, camera_id):
+        return self._status_of(camera_id, self.control_col.find_one({"_id": camera_id}))
+
+    def status_all(self):
+        controls = {c["_id"]: c for c in self.control_col.find({})}
+        cameras = []
+        for camera in self.cameras_col.find({}, {"name": 1, "enabled": 1}):
+            status = self._status_of(camera["_id"], controls.get(camera["_id"]))
+            summary = {"camera_id": camera["_id"], "name": camera.get("name"), "enabled": camera.get("enabled", True)}
+            for key in ("running", "worker_online", "heartbeat_age_s", "last_frame_ts", "frame_age_ms",
+                        "frames_dropped", "frames_busy", "active_tracks", "last_error"):
+                summary[key] = status.get(key)
+            cameras.append(summary)
+        return {"cameras": cameras, "running": sum(1 for c in cameras if c["running"]), "mode": "process"}
+
+
+class CameraAgent:
+    """
+    Runs inside a worker process: applies the commands in `camera_control`
+    to a local CameraManager and writes a heartbeat per camera.
+
+    With no `camera_ids` it serves every registered camera. A camera without
+    a control document follows its `enabled` flag.
+    """
+
+    def __init__(self, mongo_db, camera_ids=None, poll_s=2.0):
+        self.db = mongo_db
+        self.cameras_col = mongo_db["cameras"]
+        self.control_col = mongo_db[CONTROL_COLLECTION]
+        self.camera_ids = list(camera_ids or [])
+        self.poll_s = max(0.5, float(poll_s))
+        self.stop_event = Event()
+        self.host = socket.gethostname()
+        self._applied_restart = {}
+        self._applied_schedule = {}
+
+        gallery = FaceGallery(mongo_db["students"])
+        gallery.load_snapshot()
+        self.compute_pool = ComputePool(CAMERA_COMPUTE_WORKERS, CAMERA_COMPUTE_MAX_PENDING, timeout_s=COMPUTE_TIMEOUT_S)
+        self.writer = AttendanceWriter(
+            mongo_db["attendance"], flush_ms=ATTENDANCE_FLUSH_MS, max_batch=ATTENDANCE_FLUSH_MAX,
+            max_queue=ATTENDANCE_QUEUE_MAX,
+        )
+        self.manager = CameraManager(
+            self.cameras_col, mongo_db, gallery, compute_pool=self.compute_pool,
+            defaults=default_camera_settings(), gallery_poll_s=GALLERY_POLL_INTERVAL_S,
+            marked_cache=MarkedCache(mongo_db["attendance"], refresh_s=ATTENDANCE_MARKED_REFRESH_S, writer=self.writer),
+        )
+
+    def _cameras(self):
+        query = {"_id": {"$in": self.camera_ids}} if self.camera_ids else {}
+        return list(self.cameras_col.find(query, {"enabled": 1, "schedule": 1}))
+
+    def _apply(self, camera):
+        camera_id = camera["_id"]
+        control = self.control_col.find_one({"_id": camera_id}) or {}
+        desired = control.get("desired") or ("running" if camera.get("enabled", True) else "stopped")
+        restart_at = control.get("restart_at")
+
+        if desired == "running":
+            if restart_at and restart_at != self._applied_restart.get(camera_id):
+                if camera_id in self._applied_restart:
+                    # settings changed since this process started the worker
+                    self.manager.stop(camera_id)
+                self._applied_restart[camera_id] = restart_at
+            self.manager.start(camera_id)
+            # bounds changed through the API are applied live, without a restart
+            schedule = camera.get("schedule") or {}
+            if schedule != self._applied_schedule.get(camera_id):
+                self.manager.set_schedule(camera_id, schedule)
+                self._applied_schedule[camera_id] = schedule
+        else:
+            self.manager.stop(camera_id)
+
+        self.control_col.update_one(
+            {"_id": camera_id},
+            {"$set": {
+                "heartbeat_at": datetime.now(),
+                "status": self.manager.status(camera_id),
+                "pid": os.getpid(),
+                "host": self.host,
+            }},
+            upsert=True,
+        )
+
+    def run(self):
+        self.writer.start()
+        try:
+            while not self.stop_event.is_set():
+                seen = set()
+                for camera in self._cameras():
+                    seen.add(camera["_id"])
+                    try:
+                        self._apply(camera)
+                    except KeyError:
+                        pass
+                # cameras deleted from the registry
+                for camera_id in [c for c in self.manager.workers if c not in seen]:
+                    self.manager.stop(camera_id)
+                self.stop_event.wait(self.poll_s)
+        finally:
+            self.manager.stop_all()
+            self.compute_pool.shutdown()
+            self.writer.stop()
+
+    def stop(self):
+        self.stop_event.set()
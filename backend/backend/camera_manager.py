@@ -0,0 +1,244 @@
+from datetime import datetime
+from threading import Lock
+
+try:
+    from .face_gallery import make_scope
+    from .gallery_sync import GallerySync
+    from .rtsp_worker import RtspAttendanceWorker
+    from .roi import normalize_rois
+    from .scan_scheduler import validate_schedule
+    from . import config
+except ImportError:
+    # Fallback when running as a script
+    from face_gallery import make_scope
+    from gallery_sync import GallerySync
+    from rtsp_worker import RtspAttendanceWorker
+    from roi import normalize_rois
+    from scan_scheduler import validate_schedule
+    import config
+
+# Per-camera settings stored on a camera document; unset ones use the manager defaults
+CAMERA_FIELDS = {
+    "name": str,
+    "rtsp_url": str,
+    "enabled": bool,
+    "interval_ms": int,
+    "frame_skip": int,
+    "detect_scale": float,
+    "detect_upsample": int,
+    "rois": list,
+    "schedule": dict,
+    "scope": dict,
+    "scope_fallback": bool,
+    "start_after": datetime,
+    "track_reverify_s": float,
+    "track_correlation": bool,
+    "motion_threshold": float,
+    "motion_pixel_delta": int,
+    "keyframe_s": float,
+    "stall_s": float,
+    "freeze_s": float,
+    "backoff_max_s": float,
+}
+
+# Camera fields that are RtspAttendanceWorker keyword arguments
+WORKER_FIELDS = [f for f in CAMERA_FIELDS if f not in ("name", "rtsp_url", "enabled")]
+
+
+def default_camera_settings():
+    """Worker settings from config.py, used for anything a camera document leaves unset."""
+    start_after = None
+    if config.ATTENDANCE_START_AFTER:
+        try:
+            start_after = datetime.fromisoformat(config.ATTENDANCE_START_AFTER)
+        except ValueError:
+            start_after = None
+    return {
+        "interval_ms": config.RTSP_SCAN_INTERVAL_MS,
+        "frame_skip": config.RTSP_FRAME_SKIP,
+        "start_after": start_after,
+        "scope": config.RTSP_SCOPE,
+        "scope_fallback": config.RTSP_SCOPE_FALLBACK,
+        "detect_scale": config.RTSP_DETECT_SCALE,
+        "detect_upsample": config.RTSP_DETECT_UPSAMPLE,
+        "rois": normalize_rois(config.RTSP_ROIS),
+        "track_reverify_s": config.RTSP_TRACK_REVERIFY_S,
+        "track_correlation": config.RTSP_TRACK_CORRELATION,
+        "motion_threshold": config.RTSP_MOTION_THRESHOLD,
+        "motion_pixel_delta": config.RTSP_MOTION_PIXEL_DELTA,
+        "keyframe_s": config.RTSP_KEYFRAME_S,
+        "stall_s": config.RTSP_STALL_S,
+        "freeze_s": config.RTSP_FREEZE_S,
+        "backoff_max_s": config.RTSP_BACKOFF_MAX_S,
+        "schedule": {
+            "enabled": config.RTSP_ADAPTIVE,
+            "min_interval_ms": config.RTSP_MIN_INTERVAL_MS,
+            "max_interval_ms": config.RTSP_MAX_INTERVAL_MS,
+            "target_frame_age_ms": config.RTSP_TARGET_FRAME_AGE_MS,
+            "cpu_budget": config.RTSP_CPU_BUDGET,
+        },
+    }
+
+
+def _convert(field, kind, value):
+    if value is None or kind is str:
+        return value if value is None else str(value)
+    if kind is bool:
+        if isinstance(value, str):
+            return value.strip().lower() in ("1", "true", "yes", "on")
+        return bool(value)
+    if kind is datetime:
+        return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+    if field == "schedule":
+        return validate_schedule(value)
+    if kind is dict:
+        if not isinstance(value, dict):
+            raise ValueError(f"{field} must be an object")
+        # {} (not None) so an explicit "whole institution" overrides the default scope
+        return make_scope(value) or {}
+    if kind is list:
+        # [] (not None) likewise means "whole frame" over a configured default
+        return normalize_rois(value) or []
+    return kind(value)
+
+
+def camera_settings(data):
+    """
+    Validate and normalise camera fields from a request body. Unknown fields
+    and values of the wrong type raise ValueError.
+    """
+    unknown = set(data) - set(CAMERA_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown camera fields: {', '.join(sorted(unknown))}")
+    settings = {}
+    for field, value in data.items():
+        try:
+            settings[field] = _convert(field, CAMERA_FIELDS[field], value)
+        except (TypeError, ValueError) as e:
+            if field in ("rois", "schedule"):
+                raise ValueError(f"Invalid {field}: {e}")
+            raise ValueError(f"Invalid value for {field}: {value!r}")
+    if "detect_scale" in settings and settings["detect_scale"] is not None and not 0 < settings["detect_scale"] <= 1:
+        raise ValueError("detect_scale must be in (0, 1]")
+    return settings
+
+
+class CameraManager:
+    """
+    Runs one RtspAttendanceWorker per enabled camera in the `cameras`
+    collection.
+
+    All workers share the API's face gallery (kept current by a single
+    GallerySync) and one capped compute pool for detection/encoding, so
+    adding cameras adds queueing rather than CPU oversubscription: a camera
+    whose frame finds the pool full just skips that frame.
+    """
+
+    def __init__(self, cameras_col, mongo_db, gallery, compute_pool=None, defaults=None, gallery_poll_s=5.0,
+                 marked_cache=None):
+        self.cameras_col = cameras_col
+        self.mongo_db = mongo_db
+        self.gallery = gallery
+        self.compute_pool = compute_pool
+        self.marked_cache = marked_cache
+        self.defaults = dict(defaults or {})
+        self.gallery_sync = GallerySync(gallery, mongo_db["students"], poll_interval=gallery_poll_s)
+        self.workers = {}
+        self._lock = Lock()
+
+    def _worker_kwargs(self, camera):
+        kwargs = {f: self.defaults[f] for f in WORKER_FIELDS if f in self.defaults}
+        kwargs.update({f: camera[f] for f in WORKER_FIELDS if camera.get(f) is not None})
+        # scheduler bounds set on the camera override the configured ones one by one
+        kwargs["schedule"] = dict(self.defaults.get("schedule") or {}, **(camera.get("schedule") or {}))
+        return kwargs
+
+    def start(self, camera_id):
+        """Start (or leave running) the worker for a camera. Raises KeyError if unknown."""
+        camera = self.cameras_col.find_one({"_id": camera_id})
+        if camera is None:
+            raise KeyError(camera_id)
+        with self._lock:
+            worker = self.workers.get(camera_id)
+            if worker and worker.thread and worker.thread.is_alive():
+                return False
+            worker = RtspAttendanceWorker(
+                camera["rtsp_url"], self.mongo_db, camera_id=camera_id, gallery=self.gallery,
+                gallery_sync=self.gallery_sync, compute_pool=self.compute_pool, marked_cache=self.marked_cache,
+                **self._worker_kwargs(camera)
+            )
+            self.workers[camera_id] = worker
+            self.gallery_sync.start()
+            return worker.start()
+
+    def stop(self, camera_id):
+        with self._lock:
+            worker = self.workers.pop(camera_id, None)
+        if worker is None:
+            return False
+        worker.stop()
+        return True
+
+    def restart(self, camera_id):
+        """
+        Apply edited settings: a running worker restarts, a camera the
+        operator stopped stays stopped, and a disabled camera is stopped.
+        """
+        was_running = self.stop(camera_id)
+        camera = self.cameras_col.find_one({"_id": camera_id}, {"enabled": 1})
+        if was_running and camera and camera.get("enabled", True):
+            return self.start(camera_id)
+        return False
+
+    def set_schedule(self, camera_id, bounds):
+        """Apply new scheduler bounds to a running worker; returns its scheduler status or None."""
+        worker = self.workers.get(camera_id)
+        if worker is None:
+            return None
+        worker.scheduler.configure(**bounds)
+        return worker.scheduler.status()
+
+    def start_enabled(self):
+        started = []
+        for camera in self.cameras_col.find({"enabled": {"$ne": False}}, {"_id": 1}):
+            if self.start(camera["_id"]):
+                started.append(camera["_id"])
+        return started
+
+    def stop_all(self):
+        with self._lock:
+            workers, self.workers = list(self.workers.values()), {}
+        for worker in workers:
+            worker.stop_event.set()
+        for worker in workers:
+            worker.stop()
+        self.gallery_sync.stop()
+
+    def is_running(self, camera_id):
+        worker = self.workers.get(camera_id)
+        return bool(worker and worker.running)
+
+    def status(self, camera_id):
+        worker = self.workers.get(camera_id)
+        if worker is None:
+            return {"camera_id": camera_id, "running": False}
+        return {"camera_id": camera_id, **worker.status()}
+
+    def status_all(self):
+        cameras = []
+        for camera in self.cameras_col.find({}, {"name": 1, "enabled": 1}):
+            worker = self.workers.get(camera["_id"])
+            summary = {"camera_id": camera["_id"], "name": camera.get("name"),
+                       "enabled": camera.get("enabled", True), "running": False}
+            if worker is not None:
+                status = worker.status()
+                for key in ("running", "last_frame_ts", "frame_age_ms", "frames_dropped", "frames_busy",
+                            "active_tracks", "last_error"):
+                    summary[key] = status.get(key)
+            cameras.append(summary)
+        return {
+            "cameras": cameras,
+            "running": sum(1 for c in cameras if c["running"]),
+            "compute_pool": self.compute_pool.status() if self.compute_pool else None,
+            **self.gallery_sync.status(),
+        }
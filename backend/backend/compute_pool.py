@@ -0,0 +1,141 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from threading import BoundedSemaphore, Lock
+
+
+class PoolBusy(Exception):
+    """All workers are busy and the wait queue is full (maps to HTTP 429)."""
+
+
+class PoolTimeout(Exception):
+    """A job did not finish within the per-job timeout (maps to HTTP 503)."""
+
+
+class ComputePool:
+    """
+    Process pool for CPU-bound face work with bounded backpressure.
+
+    At most `workers` jobs run at once and `max_pending` more may wait;
+    beyond that submissions fail fast with PoolBusy instead of piling up.
+    Each job must finish within `timeout_s` or the caller gets PoolTimeout.
+    A running job cannot be cancelled, so a timeout recycles the executor:
+    its worker processes are killed (jobs still in them fail with
+    PoolTimeout too) and new jobs go to a fresh one, so stuck jobs do not
+    hold their slots forever.
+    """
+
+    def __init__(self, workers, max_pending, timeout_s=30.0):
+        self.workers = max(1, int(workers))
+        self.max_pending = max(0, int(max_pending))
+        self.timeout_s = float(timeout_s)
+        self._slots = BoundedSemaphore(self.workers + self.max_pending)
+        self._executor = None
+        # future -> executor it was submitted to, until it finishes
+        self._jobs = {}
+        self._lock = Lock()
+
+        self.submitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.recycled = 0
+        self.in_flight = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a threaded server process is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise PoolBusy("Face processing queue is full, retry shortly")
+        try:
+            executor = self._get_executor()
+            future = executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.submitted += 1
+            self.in_flight += 1
+            self._jobs[future] = executor
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self._lock:
+            self.in_flight -= 1
+            self._jobs.pop(future, None)
+        self._slots.release()
+
+    def abandon(self, future):
+        """
+        Give up on a job that timed out. A job still waiting is cancelled; a
+        running one takes its executor down with it, which frees its slot.
+        """
+        with self._lock:
+            self.timed_out += 1
+        if future.cancel():
+            return
+        with self._lock:
+            executor = self._jobs.get(future)
+            if executor is None:
+                return  # finished meanwhile
+            if executor is self._executor:
+                self._executor = None
+                self.recycled += 1
+        # the private process table is the only handle on the workers; terminating
+        # them breaks the executor, which fails its remaining futures
+        processes = list((executor._processes or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    def submit(self, fn, *args, **kwargs):
+        """Submit without waiting; returns a concurrent Future (raises PoolBusy when full)."""
+        return self._submit(fn, *args, **kwargs)
+
+    def run_sync(self, fn, *args, **kwargs):
+        """Run `fn` in the pool and block for its result (for sync endpoints/threads)."""
+        future = self._submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=self.timeout_s)
+        except FutureTimeout:
+            self.abandon(future)
+            raise PoolTimeout(f"Face processing timed out after {self.timeout_s:g}s")
+        except BrokenProcessPool:
+            raise PoolTimeout("Face processing was interrupted, retry shortly")
+
+    async def run(self, fn, *args, **kwargs):
+        """Await `fn` in the pool without blocking the event loop."""
+        future = self._submit(fn, *args, **kwargs)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout_s)
+        except asyncio.TimeoutError:
+            self.abandon(future)
+            raise PoolTimeout(f"Face processing timed out after {self.timeout_s:g}s")
+        except BrokenProcessPool:
+            raise PoolTimeout("Face processing was interrupted, retry shortly")
+
+    def status(self):
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_flight": self.in_flight,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "recycled": self.recycled,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,23 @@
+"""pytest fixtures for the backend tests."""
+import pytest
+from pymongo import MongoClient
+
+from test_indexes import MONGODB_URL, TEST_DB, seed
+
+
+@pytest.fixture(scope="module")
+def db():
+    """Seeded scratch database, dropped afterwards; skips without a reachable MongoDB."""
+    client = MongoClient(MONGODB_URL, serverSelectionTimeoutMS=3000)
+    try:
+        client.admin.command('ping')
+    except Exception as e:
+        client.close()
+        pytest.skip(f"MongoDB not reachable: {e}")
+    client.drop_database(TEST_DB)
+    try:
+        seed(client[TEST_DB])
+        yield client[TEST_DB]
+    finally:
+        client.drop_database(TEST_DB)
+        client.close()
@@ -0,0 +1,165 @@
+"""
+Cache of detection results keyed by the SHA-256 of the uploaded bytes, so a
+re-submitted photo (frontend retries, the same group photo sent again with a
+different custom_time) skips decode and dlib entirely.
+"""
+import hashlib
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from threading import Lock
+
+import numpy as np
+
+
+def cache_key(image_bytes, upsample=1, scale=1.0):
+    """Content hash plus the detection settings that change the result."""
+    return f"{hashlib.sha256(image_bytes).hexdigest()}-u{int(upsample)}-s{float(scale):g}"
+
+
+class EncodingCache:
+    """
+    In-memory LRU of (face_locations, face_encodings) with a TTL, optionally
+    backed by a directory of .npz files that survives restarts and is shared
+    by every API process on the host. `None` results ("not an image") are
+    only kept in memory.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, max_entries=512, ttl_s=3600.0, disk_dir=None, disk_max_entries=5000):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl_s = float(ttl_s)
+        self.disk_dir = disk_dir or None
+        self.disk_max_entries = max(0, int(disk_max_entries))
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._lock = Lock()
+        self._puts = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _expired(self, stored_at, now):
+        return self.ttl_s > 0 and now - stored_at > self.ttl_s
+
+    def get(self, key, default=None):
+        """Cached value for `key`, or `default` on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[0], now):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+        value = self._load(key, now)
+        with self._lock:
+            if value is self._MISSING:
+                self.misses += 1
+                return default
+            self.disk_hits += 1
+            self._remember(key, value, now)
+        return value
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            self._puts += 1
+            prune = self._puts % 100 == 0
+        if value is not None:
+            self._store(key, value)
+        if prune:
+            self._prune_disk()
+
+    def _remember(self, key, value, now):
+        if not self.max_entries:
+            return
+        self._entries[key] = (now, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.npz")
+
+    def _load(self, key, now):
+        if not self.disk_dir:
+            return self._MISSING
+        path = self._path(key)
+        try:
+            if self._expired(os.path.getmtime(path), now):
+                os.remove(path)
+                return self._MISSING
+            with np.load(path) as data:
+                locations = [tuple(int(v) for v in box) for box in data["locations"]]
+                encodings = [row for row in data["encodings"]]
+        except (OSError, ValueError, KeyError):
+            return self._MISSING
+        return locations, encodings
+
+    def _store(self, key, value):
+        if not self.disk_dir:
+            return
+        locations, encodings = value
+        try:
+            # write-then-rename so a concurrent reader never sees half a file
+            fd, tmp = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as fh:
+                np.savez(
+                    fh,
+                    locations=np.asarray(locations, dtype=np.int32).reshape(-1, 4),
+                    encodings=np.asarray(encodings, dtype=np.float64).reshape(-1, 128),
+                )
+            os.replace(tmp, self._path(key))
+        except OSError as e:
+            print(f"Encoding cache write failed: {e}")
+
+    def _prune_disk(self):
+        if not self.disk_dir:
+            return
+        now = time.time()
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if not entry.name.endswith(".npz"):
+                continue
+            try:
+                mtime = entry.stat().st_mtime
+                if self._expired(mtime, now):
+                    os.remove(entry.path)
+                else:
+                    files.append((mtime, entry.path))
+            except OSError:
+                pass
+        files.sort()
+        for _, path in files[:max(0, len(files) - self.disk_max_entries)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def status(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "disk": bool(self.disk_dir),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.disk_hits) / float(lookups), 3) if lookups else None,
+        }
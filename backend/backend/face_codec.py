@@ -0,0 +1,27 @@
+import numpy as np
+from bson.binary import Binary
+
+# Encodings are stored as BSON Binary holding little-endian float32 values
+ENCODING_DTYPE = np.dtype("<f4")
+
+
+def pack_encoding(encoding):
+    """Encode a face encoding as compact BSON Binary (512 bytes for 128-d)."""
+    return Binary(np.asarray(encoding, dtype=ENCODING_DTYPE).tobytes())
+
+
+def unpack_encoding(value):
+    """
+    Decode a stored face encoding to a float32 array.
+
+    Binary values are viewed zero-copy with np.frombuffer (the result is
+    read-only); legacy 128-element BSON arrays are still accepted.
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return np.frombuffer(value, dtype=ENCODING_DTYPE)
+    return np.asarray(value, dtype=np.float32)
+
+
+def encoding_to_list(value):
+    """JSON-friendly list form of a stored encoding."""
+    return unpack_encoding(value).tolist()
@@ -0,0 +1,645 @@
+import time
+import numpy as np
+from threading import Lock, RLock, Thread, Timer
+
+try:
+    from .ann_index import IVFIndex
+    from .face_codec import unpack_encoding
+    from . import gallery_snapshot
+    from .config import (
+        FACE_ANN_MIN_GALLERY, FACE_ANN_NLIST, FACE_ANN_NPROBE, FACE_ANN_CANDIDATES, GALLERY_SNAPSHOT_DIR,
+        FACE_CENTROID_CANDIDATES, GALLERY_PUBLISH_DELAY_S, GALLERY_REFRESH_CHECK_S, FACE_ANN_RETRAIN_AFTER
+    )
+except ImportError:
+    # Fallback when running as a script
+    from ann_index import IVFIndex
+    from face_codec import unpack_encoding
+    import gallery_snapshot
+    from config import (
+        FACE_ANN_MIN_GALLERY, FACE_ANN_NLIST, FACE_ANN_NPROBE, FACE_ANN_CANDIDATES, GALLERY_SNAPSHOT_DIR,
+        FACE_CENTROID_CANDIDATES, GALLERY_PUBLISH_DELAY_S, GALLERY_REFRESH_CHECK_S, FACE_ANN_RETRAIN_AFTER
+    )
+
+# Matching thresholds shared by every recognition path
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_CONFIDENCE_THRESHOLD = 0.75
+ENCODING_DIM = 128
+
+# Student fields a gallery can be partitioned on (staff carry the same ones)
+SCOPE_FIELDS = ("department", "section", "batch", "specialization")
+
+# Only the fields needed for matching; never pull photo_b64 into the gallery
+GALLERY_PROJECTION = {
+    "roll": 1, "name": 1, "face_encoding": 1, "face_samples": 1, **{f: 1 for f in SCOPE_FIELDS}
+}
+
+# Students whose face_encoding load() can use: packed float32 Binary or a legacy array, ENCODING_DIM values
+LOADABLE_ENCODING_QUERY = {"$or": [
+    {"$expr": {"$eq": [
+        {"$cond": [{"$eq": [{"$type": "$face_encoding"}, "binData"]}, {"$binarySize": "$face_encoding"}, -1]},
+        ENCODING_DIM * 4,
+    ]}},
+    {"face_encoding": {"$size": ENCODING_DIM}},
+]}
+
+
+def _parse_one(value):
+    try:
+        enc = unpack_encoding(value).reshape(-1)
+    except Exception:
+        return None
+    if enc.shape[0] != ENCODING_DIM:
+        return None
+    return enc
+
+
+def _parse_encoding(student):
+    """
+    (centroid, samples) for a student doc, or None without a usable encoding.
+    `face_encoding` holds the centroid; `face_samples`, when present, the
+    individual enrolment encodings. Single-sample students use the encoding
+    as their only sample.
+    """
+    centroid = _parse_one(student.get("face_encoding"))
+    if centroid is None:
+        return None
+    samples = [e for e in (_parse_one(v) for v in student.get("face_samples") or []) if e is not None]
+    if not samples:
+        return centroid, centroid[None, :]
+    return centroid, np.vstack(samples)
+
+
+def _flatten(sample_blocks):
+    if not sample_blocks:
+        return np.empty((0, ENCODING_DIM), dtype=np.float32), np.zeros(1, dtype=np.intp)
+    offsets = np.zeros(len(sample_blocks) + 1, dtype=np.intp)
+    np.cumsum([len(b) for b in sample_blocks], out=offsets[1:])
+    return np.vstack(sample_blocks), offsets
+
+
+def make_scope(mapping=None, **fields):
+    """
+    Normalise a partition scope: keep only SCOPE_FIELDS with non-empty
+    values. Returns None (search everything) when nothing is left.
+    """
+    merged = dict(mapping or {}, **fields)
+    scope = {f: str(merged[f]) for f in SCOPE_FIELDS if merged.get(f) not in (None, "")}
+    return scope or None
+
+
+def _scope_of(student):
+    return {f: student.get(f) for f in SCOPE_FIELDS if student.get(f) is not None}
+
+
+def _key(student):
+    return student.get("_id") if student.get("_id") is not None else student["roll"]
+
+
+def _row_keys(ids, rolls):
+    # _key() of every row, from the parallel arrays
+    return [i if i is not None else r for i, r in zip(ids, rolls)]
+
+
+class FaceGallery:
+    """
+    All enrolled face encodings held as one contiguous float32 matrix, with
+    parallel roll/name/id arrays. Matching N probe faces against the whole
+    gallery is a single matrix product instead of N x students Python calls.
+
+    Galleries of at least `ann_min_size` entries are additionally indexed
+    with an IVF index; candidates it returns are re-checked with exact
+    distance before the tolerance test. Incremental changes keep the index
+    in step: it is dropped when the gallery shrinks below `ann_min_size`,
+    and trained again on a background thread when the gallery grows past it
+    or after `ann_retrain_after` (a share of the indexed size) changes.
+
+    With a `snapshot_dir`, the gallery is published as a versioned on-disk
+    snapshot that every process maps read-only, so they share one page-cached
+    copy. Incremental changes are published in the background (at most every
+    `publish_delay_s`) and matching remaps a newer snapshot published by
+    another process (checked at most every `refresh_check_s`). Changes made
+    here and not yet published are re-applied on top of whatever is mapped.
+
+    Matching can be limited to a partition `scope` such as
+    {"department": "CSE", "section": "A"}; the shard's rows are cached per
+    gallery version, so a classroom search only touches its own students.
+
+    Students enrolled from several photos keep all their sample encodings.
+    The matrix rows are the per-student centroids: a probe is first ranked
+    by centroid distance, and only the shortlisted students' samples are
+    compared (a student's distance is its nearest sample).
+    """
+
+    def __init__(self, students_col=None, ann_min_size=FACE_ANN_MIN_GALLERY,
+                 ann_nlist=FACE_ANN_NLIST, ann_nprobe=FACE_ANN_NPROBE, ann_candidates=FACE_ANN_CANDIDATES,
+                 snapshot_dir=GALLERY_SNAPSHOT_DIR, centroid_candidates=FACE_CENTROID_CANDIDATES,
+                 publish_delay_s=GALLERY_PUBLISH_DELAY_S, refresh_check_s=GALLERY_REFRESH_CHECK_S,
+                 ann_retrain_after=FACE_ANN_RETRAIN_AFTER):
+        self.students_col = students_col
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_version = None
+        self.publish_delay_s = max(0.0, float(publish_delay_s))
+        self.refresh_check_s = max(0.0, float(refresh_check_s))
+        # key -> student doc (None = removed) changed here since the last publish
+        self._pending = {}
+        self._publish_timer = None
+        self._publish_lock = Lock()
+        self._checked_at = 0.0
+        self.ann_min_size = int(ann_min_size)
+        self.ann_nlist = int(ann_nlist)
+        self.ann_nprobe = int(ann_nprobe)
+        self.ann_candidates = max(1, int(ann_candidates))
+        self.ann_retrain_after = max(0.0, float(ann_retrain_after))
+        self._retrain_thread = None
+        # (key, encoding or None) changed while a retrain builds its index; None = no retrain running
+        self._retrain_log = None
+        self.centroid_candidates = max(1, int(centroid_candidates))
+        self.index = None
+        self.lock = RLock()
+        self.version = 0
+        self._dirty = True
+        empty_samples, empty_offsets = _flatten([])
+        self._set_arrays(np.empty((0, ENCODING_DIM), dtype=np.float32), empty_samples, empty_offsets,
+                         [], [], [], [])
+
+    def _set_arrays(self, encodings, samples, offsets, rolls, names, ids, scopes):
+        # Arrays are replaced, never mutated, so readers holding a snapshot stay consistent
+        self.encodings = np.ascontiguousarray(encodings, dtype=np.float32)
+        self.sq_norms = np.einsum("ij,ij->i", self.encodings, self.encodings)
+        self.samples = np.ascontiguousarray(samples, dtype=np.float32)
+        self.offsets = np.asarray(offsets, dtype=np.intp)
+        # radius = farthest sample from its centroid; bounds which centroids can still match
+        self.radii = np.zeros(len(self.encodings), dtype=np.float32)
+        if len(self.encodings):
+            owner = np.repeat(np.arange(len(self.encodings)), np.diff(self.offsets))
+            spread = np.linalg.norm(self.samples - self.encodings[owner], axis=1)
+            self.radii = np.maximum.reduceat(spread, self.offsets[:-1]).astype(np.float32)
+        self.rolls = list(rolls)
+        self.names = list(names)
+        self.ids = list(ids)
+        self.scopes = list(scopes)
+        self._shards = {}
+        self._row_of = {
+            (i if i is not None else r): row for row, (i, r) in enumerate(zip(self.ids, self.rolls))
+        }
+
+    def __len__(self):
+        return len(self.rolls)
+
+    def invalidate(self):
+        """Mark the gallery stale; it is rebuilt on the next match."""
+        with self.lock:
+            self._dirty = True
+
+    def load(self, students=None, publish=True):
+        """Rebuild from an iterable of student docs (or the students collection)."""
+        if students is None:
+            students = self.students_col.find({}, GALLERY_PROJECTION)
+        rows, sample_blocks, rolls, names, ids, scopes = [], [], [], [], [], []
+        for s in students:
+            parsed = _parse_encoding(s)
+            if parsed is None:
+                continue
+            rows.append(parsed[0])
+            sample_blocks.append(parsed[1])
+            rolls.append(s["roll"])
+            names.append(s["name"])
+            ids.append(s.get("_id"))
+            scopes.append(_scope_of(s))
+        matrix = np.vstack(rows) if rows else np.empty((0, ENCODING_DIM), dtype=np.float32)
+        samples, offsets = _flatten(sample_blocks)
+        # train the index outside the lock so matching keeps serving the old gallery
+        index = self._build_index(matrix, rolls, ids)
+        with self.lock:
+            self._set_arrays(matrix, samples, offsets, rolls, names, ids, scopes)
+            self.index = index
+            self._retrain_log = None
+            self.version += 1
+            self._dirty = False
+            # the students collection already has every change made here
+            self._pending = {}
+        if publish:
+            self.save_snapshot()
+        return len(rolls)
+
+    def _build_index(self, encodings, rolls, ids, centroids=None, cells=None):
+        if not self.ann_min_size or len(rolls) < self.ann_min_size:
+            return None
+        if centroids is None or cells is None or len(cells) != len(rolls):
+            cells = None
+        return IVFIndex(nlist=self.ann_nlist, nprobe=self.ann_nprobe).build(
+            encodings, _row_keys(ids, rolls), centroids=centroids, cells=cells
+        )
+
+    def _check_index(self):
+        # caller holds the lock; runs after every incremental change
+        if not self.ann_min_size or len(self.rolls) < self.ann_min_size:
+            self.index = None
+            return
+        if self.index is not None:
+            stale_after = self.ann_retrain_after * self.index.trained_size
+            if not self.ann_retrain_after or self.index.changes < max(1.0, stale_after):
+                return
+        if self._retrain_thread is None:
+            self._retrain_thread = Thread(target=self._retrain, name="gallery-ann-retrain", daemon=True)
+            self._retrain_thread.start()
+
+    def _retrain(self):
+        """Train and build a new index outside the lock, then swap it in."""
+        try:
+            with self.lock:
+                encodings, rolls, ids = self.encodings, self.rolls, self.ids
+                self._retrain_log = []
+            index = self._build_index(encodings, rolls, ids)
+            with self.lock:
+                log, self._retrain_log = self._retrain_log, None
+                # log is None: a full load replaced the gallery (and its index) meanwhile
+                if log is None or index is None or len(self.rolls) < self.ann_min_size:
+                    return
+                # rows changed while building are applied to the new index too
+                for key, enc in log:
+                    if enc is None:
+                        index.remove(key)
+                    else:
+                        index.add(key, enc)
+                self.index = index
+        finally:
+            with self.lock:
+                self._retrain_log = None
+                self._retrain_thread = None
+
+    def save_snapshot(self):
+        """
+        Publish the gallery for other processes, then map the published files
+        back so this process shares their pages too. A snapshot another
+        process published meanwhile is mapped first and this process's
+        unpublished changes applied on top, so neither side's edits are lost.
+        No-op without a snapshot_dir.
+        """
+        if not self.snapshot_dir:
+            return None
+        with self._publish_lock:
+            try:
+                with gallery_snapshot.publish_lock(self.snapshot_dir):
+                    self.load_snapshot(only_if_newer=True)
+                    with self.lock:
+                        encodings, ids, rolls, names, scopes = (
+                            self.encodings, self.ids, self.rolls, self.names, self.scopes
+                        )
+                        samples, offsets = self.samples, self.offsets
+                        centroids = cells = None
+                        if self.index is not None:
+                            # the inverted lists too, so mapping the snapshot does not reassign every row
+                            centroids, cells = self.index.centroids, self.index.cells_of(_row_keys(ids, rolls))
+                        published = dict(self._pending)
+                    version = gallery_snapshot.write_snapshot(
+                        self.snapshot_dir, encodings, ids, rolls, names, scopes=scopes, centroids=centroids,
+                        samples=samples, offsets=offsets, cells=cells
+                    )
+            except OSError:
+                return None
+            with self.lock:
+                for key, student in published.items():
+                    # changed again while writing: still pending
+                    if key in self._pending and self._pending[key] is student:
+                        del self._pending[key]
+            self.load_snapshot(version=version)
+        return version
+
+    def publish_later(self):
+        """Publish within `publish_delay_s` on a background thread; later changes join the same publish."""
+        if not self.snapshot_dir:
+            return
+        with self.lock:
+            if self._publish_timer is not None:
+                return
+            self._publish_timer = Timer(self.publish_delay_s, self._publish_pending)
+            self._publish_timer.daemon = True
+            self._publish_timer.start()
+
+    def _publish_pending(self):
+        with self.lock:
+            self._publish_timer = None
+            if not self._pending:
+                return
+        self.save_snapshot()
+
+    def load_snapshot(self, only_if_newer=False, version=None):
+        """
+        Map the latest (or given) on-disk snapshot read-only instead of
+        scanning Mongo, re-applying changes not published yet. Returns True
+        if a snapshot was loaded.
+        """
+        if not self.snapshot_dir:
+            return False
+        if only_if_newer:
+            current = gallery_snapshot.current_version(self.snapshot_dir)
+            if current is None or current == self.snapshot_version:
+                return False
+        snap = gallery_snapshot.read_snapshot(self.snapshot_dir, version=version)
+        if snap is None:
+            return False
+        index = self._build_index(snap["encodings"], snap["rolls"], snap["ids"], centroids=snap["centroids"],
+                                  cells=snap["cells"])
+        with self.lock:
+            self._set_arrays(snap["encodings"], snap["samples"], snap["offsets"],
+                             snap["rolls"], snap["names"], snap["ids"], snap["scopes"])
+            self.index = index
+            self._retrain_log = None
+            self.snapshot_version = snap["version"]
+            self.version += 1
+            self._dirty = False
+            for key, student in list(self._pending.items()):
+                if student is None:
+                    self._remove(key)
+                else:
+                    self._upsert(student)
+        return True
+
+    def refresh(self):
+        """
+        Map a snapshot another process published since ours. Only reads the
+        CURRENT pointer, at most every `refresh_check_s`, so it is cheap to
+        call before every match. Returns True if the gallery changed.
+        """
+        if not self.snapshot_dir or self._dirty:
+            return False
+        now = time.monotonic()
+        if now - self._checked_at < self.refresh_check_s:
+            return False
+        self._checked_at = now
+        return self.load_snapshot(only_if_newer=True)
+
+    def snapshot_is_current(self):
+        """
+        True if the mapped snapshot still matches the students collection: no
+        student updated after it was written and the same number with a
+        loadable encoding. Both are answered by the server ($binarySize needs
+        MongoDB 4.4+), without pulling any encodings.
+        """
+        if not self.snapshot_version or self.students_col is None:
+            return False
+        written = gallery_snapshot.version_time(self.snapshot_version)
+        if self.students_col.find_one({"updated_at": {"$gt": written}}, {"_id": 1}):
+            return False
+        return self.students_col.count_documents(LOADABLE_ENCODING_QUERY) == len(self)
+
+    def ensure_loaded(self):
+        with self.lock:
+            loading = self._dirty and self.students_col is not None
+            if loading:
+                self.load(publish=False)
+        if loading:
+            # outside the lock: publishing maps other processes' snapshots first
+            self.save_snapshot()
+        else:
+            self.refresh()
+
+    def _sample_blocks(self):
+        return [self.samples[self.offsets[r]:self.offsets[r + 1]] for r in range(len(self.rolls))]
+
+    def upsert(self, student):
+        """Insert or replace one student without reloading the whole gallery."""
+        with self.lock:
+            if self._dirty or not student:
+                return  # full load pending anyway
+            self._upsert(student)
+            if self.snapshot_dir:
+                self._pending[_key(student)] = student
+        self.publish_later()
+
+    def _upsert(self, student):
+        # caller holds the lock
+        parsed = _parse_encoding(student)
+        if parsed is None:
+            self._remove(_key(student))
+            return
+        enc, student_samples = parsed
+        key = _key(student)
+        row = self._row_of.get(key)
+        encodings, rolls, names, ids = self.encodings, list(self.rolls), list(self.names), list(self.ids)
+        scopes, blocks = list(self.scopes), self._sample_blocks()
+        if row is None:
+            encodings = np.vstack([encodings, enc[None, :]])
+            blocks.append(student_samples)
+            rolls.append(student["roll"])
+            names.append(student["name"])
+            ids.append(student.get("_id"))
+            scopes.append(_scope_of(student))
+        else:
+            encodings = np.array(encodings)
+            encodings[row] = enc
+            blocks[row] = student_samples
+            rolls[row], names[row] = student["roll"], student["name"]
+            scopes[row] = _scope_of(student)
+        samples, offsets = _flatten(blocks)
+        self._set_arrays(encodings, samples, offsets, rolls, names, ids, scopes)
+        if self.index is not None:
+            self.index.add(key, enc)
+        if self._retrain_log is not None:
+            self._retrain_log.append((key, enc))
+        self._check_index()
+        self.version += 1
+
+    def remove(self, key):
+        """Drop a student by `_id` (or roll for docs without one)."""
+        with self.lock:
+            if self._dirty:
+                return False
+            removed = self._remove(key)
+            if self.snapshot_dir:
+                self._pending[key] = None
+        if removed:
+            self.publish_later()
+        return removed
+
+    def _remove(self, key):
+        # caller holds the lock
+        row = self._row_of.get(key)
+        if row is None:
+            return False
+        keep = np.arange(len(self.rolls)) != row
+        samples, offsets = _flatten([b for i, b in enumerate(self._sample_blocks()) if i != row])
+        self._set_arrays(
+            self.encodings[keep],
+            samples,
+            offsets,
+            [v for i, v in enumerate(self.rolls) if i != row],
+            [v for i, v in enumerate(self.names) if i != row],
+            [v for i, v in enumerate(self.ids) if i != row],
+            [v for i, v in enumerate(self.scopes) if i != row],
+        )
+        if self.index is not None:
+            self.index.remove(key)
+        if self._retrain_log is not None:
+            self._retrain_log.append((key, None))
+        self._check_index()
+        self.version += 1
+        return True
+
+    def _shard(self, scope):
+        """Row indices, centroids, norms and radii of one partition (cached per version)."""
+        key = tuple(sorted(scope.items()))
+        shard = self._shards.get(key)
+        if shard is None:
+            rows = np.array([
+                row for row, attrs in enumerate(self.scopes)
+                if all(str(attrs.get(f)) == v for f, v in scope.items())
+            ], dtype=np.intp)
+            shard = (rows, self.encodings[rows], self.sq_norms[rows], self.radii[rows])
+            self._shards[key] = shard
+        return shard
+
+    def distances(self, probes, scope=None):
+        """
+        Euclidean distances, shape (len(probes), len(gallery)) -- or
+        (len(probes), len(shard)) for a scope -- in one BLAS call.
+        """
+        probes = np.atleast_2d(np.asarray(probes, dtype=np.float32))
+        with self.lock:
+            if scope:
+                _, gallery, sq_norms, _ = self._shard(scope)
+            else:
+                gallery, sq_norms = self.encodings, self.sq_norms
+        if gallery.shape[0] == 0 or probes.shape[0] == 0:
+            return np.empty((probes.shape[0], gallery.shape[0]), dtype=np.float32)
+        probe_sq = np.einsum("ij,ij->i", probes, probes)
+        d2 = probe_sq[:, None] + sq_norms[None, :] - 2.0 * (probes @ gallery.T)
+        np.maximum(d2, 0.0, out=d2)
+        return np.sqrt(d2)
+
+    def _candidates(self, probes, tolerance=None, scope=None):
+        """
+        Candidate rows per probe with exact float64 distances, nearest first.
+
+        Students are shortlisted by centroid distance: the closest
+        `centroid_candidates`, plus (given a `tolerance`) any whose centroid
+        is within tolerance + its sample radius, so no sample that could
+        match is skipped. Only shortlisted students' samples are compared.
+        Scoped searches are exact over the shard; the ANN index only serves
+        whole-gallery searches.
+        """
+        probes = np.atleast_2d(np.asarray(probes, dtype=np.float32))
+        if self.index is not None and not scope:
+            candidates = self.index.search(probes, k=max(self.ann_candidates, self.centroid_candidates))
+            rows = [[self._row_of[c] for c in cand if c in self._row_of] for cand in candidates]
+        else:
+            dist = self.distances(probes, scope=scope)
+            if scope:
+                shard_rows, _, _, radii = self._shard(scope)
+            else:
+                shard_rows, radii = None, self.radii
+            rows = []
+            for d in dist:
+                if not d.size:
+                    rows.append([])
+                    continue
+                k = min(self.centroid_candidates, d.size)
+                cand = set(np.argpartition(d, k - 1)[:k].tolist())
+                if tolerance is not None:
+                    # small slack so float32 rounding never drops a borderline row
+                    cand.update(np.nonzero(d <= tolerance + radii + 1e-4)[0].tolist())
+                cand = sorted(cand)
+                rows.append(cand if shard_rows is None else shard_rows[cand].tolist())
+        result = []
+        for probe, cand in zip(probes, rows):
+            if not cand:
+                result.append(([], np.empty(0)))
+                continue
+            # exact float64 distance to each shortlisted student's nearest sample
+            probe64 = probe.astype(np.float64)
+            exact = np.array([
+                np.linalg.norm(self.samples[self.offsets[r]:self.offsets[r + 1]].astype(np.float64) - probe64,
+                               axis=1).min()
+                for r in cand
+            ])
+            order = np.argsort(exact, kind="stable")
+            result.append(([cand[i] for i in order], exact[order]))
+        return result
+
+    def _result(self, idx, distance):
+        return {
+            "roll": self.rolls[idx],
+            "name": self.names[idx],
+            "_id": self.ids[idx],
+            "distance": distance,
+            "confidence": (1 - distance) * 100,
+        }
+
+    def match(self, probes, tolerance=DEFAULT_TOLERANCE, confidence_threshold=DEFAULT_CONFIDENCE_THRESHOLD,
+              scope=None, fallback=False):
+        """
+        Best gallery entry for each probe encoding.
+
+        Returns one dict per probe with "distance" (nearest, for logging) and,
+        when it passes tolerance and confidence, "roll", "name", "_id" and
+        "confidence"; otherwise "roll" is None. With a `scope`, only that
+        partition is searched; `fallback` retries misses against everyone.
+        """
+        self.ensure_loaded()
+        results = []
+        with self.lock:
+            for rows, dists in self._candidates(probes, tolerance=tolerance, scope=scope):
+                if not rows:
+                    results.append({"roll": None, "distance": float("inf")})
+                    continue
+                distance = float(dists[0])
+                if distance <= tolerance and (1 - distance) * 100 >= confidence_threshold:
+                    results.append(self._result(rows[0], distance))
+                else:
+                    results.append({"roll": None, "distance": distance})
+            if scope and fallback:
+                misses = [i for i, r in enumerate(results) if r["roll"] is None]
+                if misses:
+                    retry = self.match(np.atleast_2d(np.asarray(probes, dtype=np.float32))[misses],
+                                       tolerance, confidence_threshold)
+                    for i, r in zip(misses, retry):
+                        if r["roll"] is not None:
+                            results[i] = r
+        return results
+
+    def assign(self, probes, tolerance=DEFAULT_TOLERANCE, confidence_threshold=DEFAULT_CONFIDENCE_THRESHOLD,
+               scope=None, fallback=False):
+        """
+        One-to-one assignment of the faces in one frame to students.
+
+        All face x student pairs within tolerance are taken greedily in order
+        of increasing distance, so no student is claimed by two faces and the
+        outcome does not depend on face order. Same result shape and scope
+        handling as match(); fallback never reuses a student already taken.
+        """
+        self.ensure_loaded()
+        probes = np.atleast_2d(np.asarray(probes, dtype=np.float32))
+        with self.lock:
+            candidates = self._candidates(probes, tolerance=tolerance, scope=scope)
+            taken_faces, taken_rows = {}, set()
+            self._greedy(candidates, range(len(probes)), tolerance, confidence_threshold, taken_faces, taken_rows)
+            if scope and fallback:
+                misses = [i for i in range(len(probes)) if i not in taken_faces]
+                if misses:
+                    retry = self._candidates(probes[misses], tolerance=tolerance)
+                    self._greedy(retry, misses, tolerance, confidence_threshold, taken_faces, taken_rows)
+                    for face, cand in zip(misses, retry):
+                        # report the global nearest distance for faces still unmatched
+                        if len(cand[1]) and (not len(candidates[face][1]) or cand[1][0] < candidates[face][1][0]):
+                            candidates[face] = cand
+            results = []
+            for face, (rows, dists) in enumerate(candidates):
+                if face in taken_faces:
+                    results.append(taken_faces[face])
+                else:
+                    results.append({"roll": None, "distance": float(dists[0]) if len(dists) else float("inf")})
+        return results
+
+    def _greedy(self, candidates, faces, tolerance, confidence_threshold, taken_faces, taken_rows):
+        pairs = []
+        for face, (rows, dists) in zip(faces, candidates):
+            for row, distance in zip(rows, dists):
+                if distance <= tolerance and (1 - distance) * 100 >= confidence_threshold:
+                    pairs.append((float(distance), face, row))
+        pairs.sort()
+        for distance, face, row in pairs:
+            if face in taken_faces or row in taken_rows:
+                continue
+            taken_faces[face] = self._result(row, distance)
+            taken_rows.add(row)
@@ -0,0 +1,155 @@
+"""
+CPU-bound face work (decode, detect, encode). Kept free of app state so the
+functions can run inside ComputePool worker processes.
+"""
+import tempfile
+import cv2
+import numpy as np
+import face_recognition
+
+try:
+    from .roi import roi_regions
+except ImportError:
+    # Fallback when running as a script
+    from roi import roi_regions
+
+
+def decode_image(image_bytes):
+    """Uploaded bytes -> RGB array, or None if the bytes are not an image."""
+    img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+
+def _overlap(a, b):
+    # intersection over the smaller box, for boxes (top, right, bottom, left)
+    inter = max(0, min(a[2], b[2]) - max(a[0], b[0])) * max(0, min(a[1], b[1]) - max(a[3], b[3]))
+    smaller = min((a[2] - a[0]) * (a[1] - a[3]), (b[2] - b[0]) * (b[1] - b[3]))
+    return inter / float(smaller) if smaller > 0 else 0.0
+
+
+def detect_faces(rgb, upsample=1, scale=1.0, rois=None):
+    """
+    Face boxes (top, right, bottom, left) in full-frame coordinates.
+
+    With scale < 1 the HOG detector runs on a resized copy (it is by far the
+    most expensive step and its cost grows with pixel count) and the boxes
+    are mapped back to the original frame. With `rois` (normalised, see
+    roi.py) only the ROI crops are scanned; polygon ROIs are masked so
+    posters or screens inside their bounding box are ignored.
+    """
+    if rois:
+        height, width = rgb.shape[:2]
+        found = []
+        for x1, y1, x2, y2, polygon in roi_regions(rois, width, height):
+            crop = rgb[y1:y2, x1:x2]
+            if polygon is not None:
+                mask = np.zeros(crop.shape[:2], dtype=np.uint8)
+                cv2.fillPoly(mask, [polygon], 255)
+                crop = cv2.bitwise_and(crop, crop, mask=mask)
+            for top, right, bottom, left in detect_faces(crop, upsample=upsample, scale=scale):
+                box = (max(top, 0) + y1, min(right + x1, x2), min(bottom + y1, y2), max(left, 0) + x1)
+                # overlapping ROIs can see the same face twice
+                if not any(_overlap(box, other) > 0.5 for other in found):
+                    found.append(box)
+        return found
+
+    scale = min(1.0, max(0.05, float(scale)))
+    upsample = max(0, int(upsample))
+    if scale >= 1.0:
+        return face_recognition.face_locations(rgb, number_of_times_to_upsample=upsample)
+
+    height, width = rgb.shape[:2]
+    small = cv2.resize(rgb, (max(1, round(width * scale)), max(1, round(height * scale))),
+                       interpolation=cv2.INTER_AREA)
+    locations = []
+    for top, right, bottom, left in face_recognition.face_locations(small, number_of_times_to_upsample=upsample):
+        locations.append((
+            max(0, int(top / scale)),
+            min(width, int(round(right / scale))),
+            min(height, int(round(bottom / scale))),
+            max(0, int(left / scale)),
+        ))
+    return locations
+
+
+def encode_faces(rgb, locations):
+    """Encodings for known face boxes, computed on the full-resolution frame."""
+    if not locations:
+        return []
+    return face_recognition.face_encodings(rgb, locations)
+
+
+def detect_and_encode_rgb(rgb, upsample=1, scale=1.0, rois=None):
+    """(face_locations, face_encodings) for an RGB frame; encodings always use full resolution."""
+    locations = detect_faces(rgb, upsample=upsample, scale=scale, rois=rois)
+    return locations, encode_faces(rgb, locations)
+
+
+def detect_and_encode_bgr(frame, upsample=1, scale=1.0, rois=None):
+    """Same as detect_and_encode_rgb for an OpenCV (BGR) frame."""
+    return detect_and_encode_rgb(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), upsample=upsample, scale=scale, rois=rois)
+
+
+def detect_and_encode(image_bytes, upsample=1, scale=1.0):
+    """Decode uploaded bytes and detect/encode; None if they are not an image."""
+    rgb = decode_image(image_bytes)
+    if rgb is None:
+        return None
+    return detect_and_encode_rgb(rgb, upsample=upsample, scale=scale)
+
+
+def clip_encodings(video_bytes, max_frames):
+    """Encodings from evenly spaced frames of a short clip (first face per frame)."""
+    encodings = []
+    # OpenCV can only decode video from a file path
+    with tempfile.NamedTemporaryFile(suffix=".mp4") as tmp:
+        tmp.write(video_bytes)
+        tmp.flush()
+        cap = cv2.VideoCapture(tmp.name)
+        try:
+            total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or max_frames
+            step = max(1, total // max_frames)
+            idx = 0
+            while len(encodings) < max_frames:
+                ok, frame = cap.read()
+                if not ok or frame is None:
+                    break
+                if idx % step == 0:
+                    found = face_recognition.face_encodings(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                    if found:
+                        encodings.append(found[0])
+                idx += 1
+        finally:
+            cap.release()
+    return encodings
+
+
+def video_segment_encodings(path, start_frame, end_frame=None, step=1, upsample=1, scale=1.0):
+    """
+    Detect/encode every `step`-th frame of a video file between start_frame
+    and end_frame (None = to the end). Frames in between are only grabbed,
+    never decoded. Returns [(frame_index, encodings), ...].
+    """
+    step = max(1, int(step))
+    results = []
+    cap = cv2.VideoCapture(path)
+    try:
+        if start_frame:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        idx = start_frame
+        while end_frame is None or idx < end_frame:
+            if (idx - start_frame) % step:
+                if not cap.grab():
+                    break
+            else:
+                ok, frame = cap.read()
+                if not ok or frame is None:
+                    break
+                _, encodings = detect_and_encode_bgr(frame, upsample=upsample, scale=scale)
+                results.append((idx, encodings))
+            idx += 1
+    finally:
+        cap.release()
+    return results
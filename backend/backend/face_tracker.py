@@ -0,0 +1,216 @@
+import itertools
+import time
+import cv2
+
+
+def _iou(a, b):
+    # boxes are face_recognition style (top, right, bottom, left)
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(0, bottom - top) * max(0, right - left)
+    if not inter:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    return inter / float(area_a + area_b - inter)
+
+
+def _centre_distance(a, b):
+    """Distance between box centres relative to the size of box a."""
+    ay, ax = (a[0] + a[2]) / 2.0, (a[1] + a[3]) / 2.0
+    by, bx = (b[0] + b[2]) / 2.0, (b[1] + b[3]) / 2.0
+    size = max(1.0, float(max(a[2] - a[0], a[1] - a[3])))
+    return ((ay - by) ** 2 + (ax - bx) ** 2) ** 0.5 / size
+
+
+def _make_correlation_tracker():
+    # MOSSE is the cheapest; builds without contrib fall back to KCF or nothing
+    for factory in ("legacy.TrackerMOSSE_create", "TrackerMOSSE_create", "legacy.TrackerKCF_create", "TrackerKCF_create"):
+        obj = cv2
+        for part in factory.split("."):
+            obj = getattr(obj, part, None)
+            if obj is None:
+                break
+        if obj is not None:
+            return obj()
+    return None
+
+
+class Track:
+    def __init__(self, track_id, box, now):
+        self.id = track_id
+        self.box = box
+        self.first_seen = now
+        self.last_seen = now
+        self.missed = 0
+        # identity (None until the face has been encoded and matched)
+        self.roll = None
+        self.name = None
+        self.student_id = None
+        self.confidence = None
+        self.last_verified = None
+        self.failed_checks = 0
+        self.cv_tracker = None
+
+    def as_dict(self, now):
+        return {
+            "track_id": self.id,
+            "roll": self.roll,
+            "name": self.name,
+            "confidence": self.confidence,
+            "age_s": round(now - self.first_seen, 1),
+            "verified_ago_s": round(now - self.last_verified, 1) if self.last_verified is not None else None,
+        }
+
+
+class FaceTracker:
+    """
+    Follows faces between RTSP frames so each one is encoded and matched
+    once, not on every frame.
+
+    Detections are associated with existing tracks by IoU, then by centre
+    distance for faces that moved further than their own size overlaps.
+    Identified tracks are only re-encoded every `reverify_s` seconds;
+    unidentified ones at most every `unknown_retry_s`. A track that is not
+    seen for `max_missed` processed frames is dropped. With `correlation`
+    an OpenCV correlation tracker keeps a track alive through frames where
+    the detector misses it (head turned, motion blur).
+    """
+
+    def __init__(self, iou_threshold=0.3, max_centre_distance=0.5, reverify_s=5.0, unknown_retry_s=1.0,
+                 max_missed=3, correlation=False):
+        self.iou_threshold = float(iou_threshold)
+        self.max_centre_distance = float(max_centre_distance)
+        self.reverify_s = max(0.0, float(reverify_s))
+        self.unknown_retry_s = max(0.0, float(unknown_retry_s))
+        self.max_missed = max(0, int(max_missed))
+        self.correlation = bool(correlation)
+        self.tracks = []
+        self._ids = itertools.count(1)
+
+        self.encodes = 0
+        self.encodes_skipped = 0
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def reset(self):
+        self.tracks = []
+
+    def update(self, locations, frame=None, now=None):
+        """
+        Associate this frame's face boxes with tracks. Returns the track for
+        each location (same order); unmatched locations start new tracks.
+        """
+        now = time.time() if now is None else now
+        assigned = [None] * len(locations)
+        free = set(range(len(self.tracks)))
+
+        pairs = sorted(
+            ((_iou(t.box, box), ti, di) for ti, t in enumerate(self.tracks) for di, box in enumerate(locations)),
+            reverse=True,
+        )
+        for score, ti, di in pairs:
+            if score < self.iou_threshold:
+                break
+            if ti in free and assigned[di] is None:
+                free.discard(ti)
+                assigned[di] = self.tracks[ti]
+
+        # faces that moved a lot between (sparse) processed frames
+        pairs = sorted(
+            (_centre_distance(self.tracks[ti].box, box), ti, di)
+            for ti in free for di, box in enumerate(locations) if assigned[di] is None
+        )
+        for dist, ti, di in pairs:
+            if dist > self.max_centre_distance:
+                break
+            if ti in free and assigned[di] is None:
+                free.discard(ti)
+                assigned[di] = self.tracks[ti]
+
+        for di, box in enumerate(locations):
+            track = assigned[di]
+            if track is None:
+                track = assigned[di] = Track(next(self._ids), box, now)
+                self.tracks.append(track)
+            track.box = box
+            track.last_seen = now
+            track.missed = 0
+            if self.correlation and frame is not None:
+                self._init_correlation(track, frame)
+
+        survivors = set(map(id, assigned))
+        for ti in free:
+            track = self.tracks[ti]
+            track.missed += 1
+            # a correlation-followed face gets longer, but not forever (trackers drift onto background)
+            followed = self.correlation and frame is not None and self._follow(track, frame)
+            if track.missed <= (self.max_missed * 3 if followed else self.max_missed):
+                survivors.add(id(track))
+        self.tracks = [t for t in self.tracks if id(t) in survivors]
+        return assigned
+
+    def needs_identity(self, track, now=None):
+        """True when the track's face should be encoded and matched this frame."""
+        now = time.time() if now is None else now
+        if track.last_verified is None:
+            return True
+        wait = self.reverify_s if track.roll is not None else self.unknown_retry_s
+        return now - track.last_verified >= wait
+
+    def identify(self, track, match, now=None):
+        """Record the gallery match (or miss) for a freshly encoded track."""
+        now = time.time() if now is None else now
+        track.last_verified = now
+        self.encodes += 1
+        if match and match.get("roll") is not None:
+            track.roll = match["roll"]
+            track.name = match.get("name")
+            track.student_id = match.get("_id")
+            track.confidence = match.get("confidence")
+            track.failed_checks = 0
+        elif track.roll is not None:
+            # one bad frame should not drop a known identity
+            track.failed_checks += 1
+            if track.failed_checks >= 2:
+                track.roll = track.name = track.student_id = track.confidence = None
+                track.failed_checks = 0
+
+    def skipped(self, count=1):
+        self.encodes_skipped += count
+
+    def status(self, now=None):
+        now = time.time() if now is None else now
+        return {
+            "active_tracks": len(self.tracks),
+            "identified_tracks": sum(1 for t in self.tracks if t.roll is not None),
+            "tracks": [t.as_dict(now) for t in self.tracks[:20]],
+            "encodes": self.encodes,
+            "encodes_skipped": self.encodes_skipped,
+        }
+
+    def _init_correlation(self, track, frame):
+        top, right, bottom, left = track.box
+        tracker = _make_correlation_tracker()
+        if tracker is None:
+            self.correlation = False
+            return
+        try:
+            tracker.init(frame, (int(left), int(top), int(right - left), int(bottom - top)))
+            track.cv_tracker = tracker
+        except cv2.error:
+            track.cv_tracker = None
+
+    def _follow(self, track, frame):
+        if track.cv_tracker is None:
+            return False
+        try:
+            ok, (x, y, w, h) = track.cv_tracker.update(frame)
+        except cv2.error:
+            ok = False
+        if not ok or w <= 0 or h <= 0:
+            track.cv_tracker = None
+            return False
+        track.box = (int(y), int(x + w), int(y + h), int(x))
+        return True
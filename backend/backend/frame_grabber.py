@@ -0,0 +1,102 @@
+import time
+from threading import Condition, Event, Thread
+
+
+class FrameGrabber:
+    """
+    Reads an opened cv2.VideoCapture on its own thread and keeps only the
+    newest frame.
+
+    OpenCV buffers an RTSP stream while the caller is busy, so a slow
+    consumer calling read() gets ever older frames. Here the capture is
+    drained continuously and the consumer always gets the latest frame;
+    frames it never saw are counted as dropped. With `frame_skip` only
+    every (frame_skip + 1)-th grabbed frame is decoded.
+    """
+
+    def __init__(self, cap, frame_skip=0, retry_s=0.5):
+        self.cap = cap
+        self.frame_skip = max(0, int(frame_skip))
+        self.retry_s = float(retry_s)
+        self.stop_event = Event()
+        self.thread = None
+
+        self._cond = Condition()
+        self._frame = None
+        self._captured_at = None
+        self._seq = 0
+        self._consumed_seq = 0
+
+        self.frames_grabbed = 0
+        self.frames_decoded = 0
+        self.frames_dropped = 0
+        self.failures = 0  # consecutive failed grabs; the worker's watchdog decides when to reconnect
+        self.last_frame_at = None
+        self.last_error = None
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    def read(self, timeout=5.0):
+        """
+        Wait for a frame newer than the last one returned. Returns
+        (frame, captured_at) with captured_at from time.time(), or
+        (None, None) on timeout/stop.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._seq == self._consumed_seq and not self.stop_event.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None, None
+                self._cond.wait(remaining)
+            if self._seq == self._consumed_seq:
+                return None, None
+            self._consumed_seq = self._seq
+            return self._frame, self._captured_at
+
+    def status(self):
+        return {
+            "frames_grabbed": self.frames_grabbed,
+            "frames_decoded": self.frames_decoded,
+            "frames_dropped": self.frames_dropped,
+            "capture_failures": self.failures,
+            "capture_error": self.last_error,
+        }
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            # grab() only pulls the packet; decoding happens in retrieve()
+            if not self.cap.grab():
+                self.failures += 1
+                self.last_error = "Frame read failed"
+                self.stop_event.wait(self.retry_s)
+                continue
+            self.failures = 0
+            self.last_frame_at = time.time()
+            self.frames_grabbed += 1
+            if self.frame_skip and self.frames_grabbed % (self.frame_skip + 1) != 0:
+                continue
+            ok, frame = self.cap.retrieve()
+            if not ok or frame is None:
+                self.last_error = "Frame decode failed"
+                continue
+            self.last_error = None
+            self.frames_decoded += 1
+            with self._cond:
+                if self._seq != self._consumed_seq:
+                    # the previous frame was never picked up
+                    self.frames_dropped += 1
+                self._frame = frame
+                self._captured_at = time.time()
+                self._seq += 1
+                self._cond.notify_all()
@@ -0,0 +1,158 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+from bson import ObjectId
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: publishes from several processes are not serialised
+    fcntl = None
+
+# Layout inside the snapshot directory:
+#   CURRENT                       -> name of the live snapshot version
+#   gallery-<version>.npy         -> (N, 128) float32 encodings, mmap-able
+#   gallery-<version>.json        -> parallel ids / rolls / names / scopes
+#   gallery-<version>.samples.npy -> (S, 128) float32 enrolment samples, mmap-able
+#   gallery-<version>.offsets.npy -> (N + 1,) start of each student's samples
+#   gallery-<version>.centroids.npy (optional) -> IVF coarse quantizer
+#   gallery-<version>.cells.npy (optional)     -> (N,) IVF cell of each row (the inverted lists)
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = ".lock"
+KEEP_SNAPSHOTS = 2
+
+
+def _paths(directory, version):
+    base = os.path.join(directory, f"gallery-{version}")
+    return (base + ".npy", base + ".json", base + ".centroids.npy", base + ".samples.npy", base + ".offsets.npy",
+            base + ".cells.npy")
+
+
+def _atomic_write(path, write):
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def current_version(directory):
+    try:
+        with open(os.path.join(directory, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def version_time(version):
+    """Local time a snapshot version was written."""
+    return datetime.fromtimestamp(int(version.split("-")[0]) / 1e9)
+
+
+@contextmanager
+def publish_lock(directory):
+    """
+    Held while a process merges the current snapshot with its own changes and
+    publishes the result, so two processes never overwrite each other's.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK_FILE), "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def write_snapshot(directory, encodings, ids, rolls, names, scopes=None, centroids=None, samples=None, offsets=None,
+                   cells=None):
+    """
+    Write a new versioned snapshot and point CURRENT at it; returns the
+    version. `cells` (each row's IVF cell) is only kept with `centroids`.
+    """
+    os.makedirs(directory, exist_ok=True)
+    version = f"{time.time_ns()}-{os.getpid()}"
+    npy_path, meta_path, centroids_path, samples_path, offsets_path, cells_path = _paths(directory, version)
+    _atomic_write(npy_path, lambda f: np.save(f, np.ascontiguousarray(encodings, dtype=np.float32)))
+    if samples is not None:
+        _atomic_write(samples_path, lambda f: np.save(f, np.ascontiguousarray(samples, dtype=np.float32)))
+        _atomic_write(offsets_path, lambda f: np.save(f, np.asarray(offsets, dtype=np.int64)))
+    meta = {
+        "ids": [str(i) if i is not None else None for i in ids],
+        "rolls": list(rolls),
+        "names": list(names),
+        "scopes": list(scopes) if scopes is not None else [{} for _ in ids],
+    }
+    _atomic_write(meta_path, lambda f: f.write(json.dumps(meta).encode("utf-8")))
+    if centroids is not None:
+        _atomic_write(centroids_path, lambda f: np.save(f, np.asarray(centroids, dtype=np.float32)))
+        if cells is not None:
+            _atomic_write(cells_path, lambda f: np.save(f, np.asarray(cells, dtype=np.int32)))
+    _atomic_write(os.path.join(directory, CURRENT_FILE), lambda f: f.write(version.encode("utf-8")))
+    _prune(directory, version)
+    return version
+
+
+def read_snapshot(directory, version=None):
+    """
+    Map the current (or given) snapshot read-only. Returns a dict with
+    "version", "encodings" (np.memmap shared through the page cache), "ids",
+    "rolls", "names", "scopes", "samples"/"offsets" (per-student enrolment
+    samples), "centroids" and "cells" (each row's IVF cell, mapped; either
+    may be None), or None if there is no snapshot.
+    """
+    version = version or current_version(directory)
+    if not version:
+        return None
+    npy_path, meta_path, centroids_path, samples_path, offsets_path, cells_path = _paths(directory, version)
+    try:
+        encodings = np.load(npy_path, mmap_mode="r")
+        if os.path.exists(samples_path):
+            samples = np.load(samples_path, mmap_mode="r")
+            offsets = np.load(offsets_path)
+        else:
+            # single-sample snapshot: every student's only sample is its encoding
+            samples, offsets = encodings, np.arange(encodings.shape[0] + 1)
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    centroids = np.load(centroids_path) if os.path.exists(centroids_path) else None
+    cells = None
+    if centroids is not None and os.path.exists(cells_path):
+        cells = np.load(cells_path, mmap_mode="r")
+    ids = [ObjectId(i) if i and ObjectId.is_valid(i) else i for i in meta["ids"]]
+    return {
+        "version": version,
+        "encodings": encodings,
+        "ids": ids,
+        "rolls": meta["rolls"],
+        "names": meta["names"],
+        "scopes": meta.get("scopes") or [{} for _ in ids],
+        "samples": samples,
+        "offsets": offsets,
+        "centroids": centroids,
+        "cells": cells,
+    }
+
+
+def _prune(directory, keep_version):
+    # Keep a couple of older versions so readers mid-remap never lose their files
+    versions = sorted(
+        {name[len("gallery-"):].split(".")[0] for name in os.listdir(directory) if name.startswith("gallery-")},
+        key=lambda v: int(v.split("-")[0]),
+    )
+    for version in versions[:-KEEP_SNAPSHOTS]:
+        if version == keep_version:
+            continue
+        for path in _paths(directory, version):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
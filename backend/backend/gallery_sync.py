@@ -0,0 +1,140 @@
+from datetime import datetime
+from threading import Event, Thread
+from pymongo.errors import OperationFailure, PyMongoError
+
+try:
+    from .face_gallery import GALLERY_PROJECTION
+except ImportError:
+    # Fallback when running as a script
+    from face_gallery import GALLERY_PROJECTION
+
+
+class GallerySync:
+    """
+    Keeps a FaceGallery current with the students collection incrementally.
+
+    The gallery is loaded once (roll, name and encoding only), then inserts,
+    updates and deletes are applied as they happen: through a change stream
+    on replica sets, or on standalone Mongo by polling an `updated_at`/`_id`
+    watermark plus a cheap `_id`-only pass to notice deletions.
+    """
+
+    def __init__(self, gallery, students_col, poll_interval=5.0, reconcile_every=12):
+        self.gallery = gallery
+        self.students_col = students_col
+        self.poll_interval = max(0.5, float(poll_interval))
+        self.reconcile_every = max(1, int(reconcile_every))
+        self.stop_event = Event()
+        self.thread = None
+
+        self.mode = None
+        self.last_sync_ts = None
+        self.last_error = None
+        self.changes_applied = 0
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return False
+        self.stop_event.clear()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    def status(self):
+        return {
+            "gallery_version": self.gallery.version,
+            "gallery_size": len(self.gallery),
+            "gallery_sync": self.mode,
+            "gallery_last_sync": self.last_sync_ts.isoformat() if self.last_sync_ts else None,
+            "gallery_changes_applied": self.changes_applied,
+            "gallery_sync_error": self.last_error,
+        }
+
+    def _run(self):
+        use_change_stream = True
+        while not self.stop_event.is_set():
+            try:
+                if use_change_stream:
+                    self._watch_change_stream()
+                else:
+                    self._poll()
+            except OperationFailure as e:
+                if use_change_stream:
+                    # standalone servers cannot open change streams
+                    use_change_stream = False
+                    continue
+                self.last_error = f"Gallery sync error: {e}"
+                self.stop_event.wait(self.poll_interval)
+            except PyMongoError as e:
+                self.last_error = f"Gallery sync error: {e}"
+                self.stop_event.wait(self.poll_interval)
+
+    def _full_load(self):
+        self.gallery.load(self.students_col.find({}, GALLERY_PROJECTION))
+        self.last_sync_ts = datetime.now()
+
+    def _watch_change_stream(self):
+        # Open the stream before loading so no change between the two is lost
+        with self.students_col.watch(full_document="updateLookup", max_await_time_ms=1000) as stream:
+            self.mode = "change_stream"
+            self._full_load()
+            while not self.stop_event.is_set() and stream.alive:
+                change = stream.try_next()
+                if change is None:
+                    continue
+                op = change.get("operationType")
+                if op in ("insert", "update", "replace"):
+                    doc = change.get("fullDocument")
+                    if doc is None:
+                        self.gallery.remove(change["documentKey"]["_id"])
+                    else:
+                        self.gallery.upsert({k: doc.get(k) for k in ("_id", *GALLERY_PROJECTION)})
+                elif op == "delete":
+                    self.gallery.remove(change["documentKey"]["_id"])
+                elif op in ("drop", "rename", "invalidate"):
+                    break
+                else:
+                    continue
+                self.changes_applied += 1
+                self.last_sync_ts = datetime.now()
+
+    def _latest(self, field):
+        doc = self.students_col.find_one({field: {"$exists": True}}, {field: 1}, sort=[(field, -1)])
+        return doc[field] if doc else None
+
+    def _poll(self):
+        self.mode = "polling"
+        # Watermarks are read before loading: a change made during the load is polled again, not skipped
+        last_id, watermark = self._latest("_id"), self._latest("updated_at")
+        self._full_load()
+        polls = 0
+
+        while not self.stop_event.wait(self.poll_interval):
+            polls += 1
+            clauses = []
+            if last_id is not None:
+                clauses.append({"_id": {"$gt": last_id}})
+            if watermark is not None:
+                clauses.append({"updated_at": {"$gt": watermark}})
+            query = {"$or": clauses} if clauses else {}
+            projection = dict(GALLERY_PROJECTION, updated_at=1)
+            for doc in self.students_col.find(query, projection):
+                self.gallery.upsert(doc)
+                self.changes_applied += 1
+                if last_id is None or doc["_id"] > last_id:
+                    last_id = doc["_id"]
+                if doc.get("updated_at") and (watermark is None or doc["updated_at"] > watermark):
+                    watermark = doc["updated_at"]
+
+            if polls % self.reconcile_every == 0:
+                # deletions leave no trace to poll for; diff the _id set instead
+                live_ids = {d["_id"] for d in self.students_col.find({}, {"_id": 1})}
+                for gone in [i for i in self.gallery.ids if i is not None and i not in live_ids]:
+                    self.gallery.remove(gone)
+                    self.changes_applied += 1
+            self.last_sync_ts = datetime.now()
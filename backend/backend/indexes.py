@@ -0,0 +1,59 @@
+"""
+Indexes every collection needs, created idempotently at startup.
+
+Each entry backs a query that runs on a hot path; test_indexes.py checks
+with explain() that those queries really use them.
+"""
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+try:
+    from .attendance_store import BUCKET_INDEX_MODEL
+except ImportError:
+    # Fallback when running as a script
+    from attendance_store import BUCKET_INDEX_MODEL
+
+INDEXES = {
+    "attendance": [
+        # once-per-hour upsert on every recognition
+        BUCKET_INDEX_MODEL,
+        # /attendance_by_hour, /attendance/clear_hour, the marked-this-hour seed,
+        # and /attendance pages ordered by (timestamp, _id)
+        IndexModel([("timestamp", ASCENDING), ("_id", ASCENDING)], name="timestamp_id"),
+        # one student's records in a time range
+        IndexModel([("roll", ASCENDING), ("timestamp", DESCENDING)], name="roll_timestamp"),
+    ],
+    "students": [
+        # duplicate checks in add_student
+        IndexModel([("roll", ASCENDING)], name="roll"),
+        IndexModel([("name", ASCENDING)], name="name"),
+        # gallery polling watermark (newest updated_at)
+        IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+        # cohort filters on /students_full and /attendance
+        IndexModel([("section", ASCENDING)], name="section"),
+    ],
+    "staffs": [
+        # signup, login and password reset look staff up by email
+        IndexModel([("email", ASCENDING)], name="email"),
+    ],
+}
+
+
+def ensure_indexes(db):
+    """
+    Create any missing index; existing ones are left as they are. Returns
+    (created_or_present, failed) lists of "collection.index" names. One
+    failure (e.g. an index with the same name but other options) does not
+    stop the rest.
+    """
+    ok, failed = [], []
+    for collection, models in INDEXES.items():
+        for model in models:
+            name = f"{collection}.{model.document['name']}"
+            try:
+                db[collection].create_indexes([model])
+                ok.append(name)
+            except OperationFailure as e:
+                print(f"Could not create index {name}: {e}")
+                failed.append(name)
+    return ok, failed
@@ -0,0 +1,350 @@
+"""
+Background attendance jobs for bulk uploads: recorded lecture videos,
+batches of photos and zip archives of photos.
+
+Uploads are spooled to a temp dir and processed on a job thread. Videos are
+cut into segments that are decoded, sampled and detected/encoded in the
+compute pool in parallel; photos go one per pool job. Recognitions from all
+frames are deduplicated per (roll, hour) and attendance is written once at
+the end. Job progress lives in Mongo so any API process can answer a poll.
+"""
+import math
+import os
+import shutil
+import socket
+import tempfile
+import time
+import uuid
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime, timedelta
+
+import cv2
+
+try:
+    from .compute_pool import PoolBusy, PoolTimeout
+    from . import face_pipeline
+    from .attendance_store import MarkedCache, hour_bucket
+except ImportError:
+    # Fallback when running as a script
+    from compute_pool import PoolBusy, PoolTimeout
+    import face_pipeline
+    from attendance_store import MarkedCache, hour_bucket
+
+JOBS_COLLECTION = "media_jobs"
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".avi", ".mkv", ".webm", ".m4v", ".mpg", ".mpeg"}
+MAX_IMAGE_BYTES = 25 * 1024 * 1024  # per photo inside a zip
+
+# Same bar as /process_media_attendance
+TOLERANCE = 0.25
+CONFIDENCE_THRESHOLD = 0.75
+MIN_CONFIDENCE = 75.0
+
+
+def media_kind(filename, content_type=None):
+    """"video", "zip" or "image" for an upload, or None if it is none of those."""
+    ext = os.path.splitext(filename or "")[1].lower()
+    content_type = content_type or ""
+    if ext == ".zip" or content_type in ("application/zip", "application/x-zip-compressed"):
+        return "zip"
+    if ext in VIDEO_EXTENSIONS or content_type.startswith("video/"):
+        return "video"
+    if ext in IMAGE_EXTENSIONS or content_type.startswith("image/"):
+        return "image"
+    return None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        pass
+    return True
+
+
+class MediaJobs:
+    """
+    Runs media attendance jobs on `workers` threads. Each job keeps at most
+    `concurrency` pool jobs in flight so a long video leaves room in the
+    shared compute pool for interactive requests. A pool job that is not
+    done within `task_timeout_s` (default: the pool's own timeout) fails
+    the whole media job instead of leaving it "running" forever.
+    """
+
+    def __init__(self, jobs_col, attendance_col, gallery, compute_pool, workers=1, concurrency=2,
+                 segment_s=60.0, marked_cache=None, task_timeout_s=None):
+        self.jobs_col = jobs_col
+        self.attendance_col = attendance_col
+        self.marked = marked_cache if marked_cache is not None else MarkedCache(attendance_col)
+        self.gallery = gallery
+        self.compute_pool = compute_pool
+        self.concurrency = max(1, int(concurrency))
+        self.segment_s = max(1.0, float(segment_s))
+        self.task_timeout_s = float(task_timeout_s or compute_pool.timeout_s)
+        self.host = socket.gethostname()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="media-job")
+
+    def create(self, uploads, base_time, scope=None, scope_fallback=False, sample_every_s=2.0,
+               detect_scale=1.0, upsample=1):
+        """
+        Spool `uploads` (objects with .filename, .content_type and a readable
+        .file, e.g. FastAPI UploadFile) to disk and queue a job. Returns the
+        job id; raises ValueError for unsupported files.
+        """
+        files = []
+        for upload in uploads:
+            kind = media_kind(upload.filename, upload.content_type)
+            if kind is None:
+                raise ValueError(f"Unsupported file: {upload.filename}")
+            files.append((upload, kind))
+        if not files:
+            raise ValueError("No files uploaded")
+
+        job_id = uuid.uuid4().hex
+        workdir = tempfile.mkdtemp(prefix=f"media_job_{job_id[:8]}_")
+        saved = []
+        try:
+            for i, (upload, kind) in enumerate(files):
+                path = os.path.join(workdir, f"{i}{os.path.splitext(upload.filename or '')[1].lower()}")
+                with open(path, "wb") as out:
+                    shutil.copyfileobj(upload.file, out, 1024 * 1024)
+                saved.append({"name": upload.filename, "kind": kind, "path": path})
+        except Exception:
+            shutil.rmtree(workdir, ignore_errors=True)
+            raise
+
+        now = datetime.now()
+        self.jobs_col.insert_one({
+            "_id": job_id,
+            "status": "queued",
+            "files": [{"name": f["name"], "kind": f["kind"]} for f in saved],
+            "options": {"sample_every_s": sample_every_s, "detect_scale": detect_scale, "upsample": upsample,
+                        "scope": scope or {}, "scope_fallback": scope_fallback},
+            "base_time": base_time,
+            "total": None,
+            "processed": 0,
+            "faces_detected": 0,
+            "recognized": [],
+            "attendance_marked": 0,
+            "error": None,
+            "host": self.host,
+            "pid": os.getpid(),
+            "created_at": now,
+            "updated_at": now,
+        })
+        self._executor.submit(self._run, job_id, workdir, saved, base_time, scope, scope_fallback,
+                              float(sample_every_s), detect_scale, upsample)
+        return job_id
+
+    def get(self, job_id):
+        """The job document shaped for the API, or None."""
+        job = self.jobs_col.find_one({"_id": job_id}, {"host": 0, "pid": 0})
+        if job is None:
+            return None
+        job["job_id"] = job.pop("_id")
+        total = job.get("total")
+        job["progress"] = round(job["processed"] / float(total), 3) if total else None
+        for key in ("base_time", "created_at", "updated_at", "started_at", "finished_at"):
+            if isinstance(job.get(key), datetime):
+                job[key] = job[key].isoformat()
+        return job
+
+    def fail_interrupted(self):
+        """Mark jobs whose process on this host died (e.g. an API restart) as failed."""
+        stale = [
+            job["_id"] for job in self.jobs_col.find(
+                {"status": {"$in": ["queued", "running"]}, "host": self.host}, {"pid": 1}
+            )
+            if job.get("pid") != os.getpid() and not _pid_alive(job.get("pid") or 0)
+        ]
+        if stale:
+            self.jobs_col.update_many(
+                {"_id": {"$in": stale}},
+                {"$set": {"status": "failed", "error": "Interrupted by a server restart", "updated_at": datetime.now()}},
+            )
+        return len(stale)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _update(self, job_id, **fields):
+        fields["updated_at"] = datetime.now()
+        self.jobs_col.update_one({"_id": job_id}, {"$set": fields})
+
+    def _tasks(self, files, sample_every_s, detect_scale, upsample):
+        """
+        Plan the pool jobs. Returns (total frames, iterator of
+        (fn, args, kwargs, to_frames)) where to_frames turns a pool result
+        into [(offset_s, encodings), ...].
+        """
+        total = 0
+        plans = []
+        detect = {"upsample": upsample, "scale": detect_scale}
+        for f in files:
+            if f["kind"] == "video":
+                cap = cv2.VideoCapture(f["path"])
+                try:
+                    opened = cap.isOpened()
+                    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+                    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+                finally:
+                    cap.release()
+                if not opened:
+                    raise ValueError(f"Could not open video: {f['name']}")
+                step = max(1, int(round(fps * sample_every_s)))
+                # whole number of sampling steps per segment keeps the sampling grid even
+                segment = step * max(1, int(self.segment_s // sample_every_s))
+                if frame_count > 0:
+                    total += int(math.ceil(frame_count / float(step)))
+                    bounds = [(start, min(start + segment, frame_count)) for start in range(0, frame_count, segment)]
+                else:
+                    # unknown length (some containers): one pass to the end
+                    bounds = [(0, None)]
+                plans.append(("video", f, fps, step, bounds))
+            elif f["kind"] == "zip":
+                with zipfile.ZipFile(f["path"]) as archive:
+                    members = [m.filename for m in archive.infolist()
+                               if not m.is_dir() and m.file_size <= MAX_IMAGE_BYTES
+                               and media_kind(m.filename) == "image"]
+                total += len(members)
+                plans.append(("zip", f, members))
+            else:
+                total += 1
+                plans.append(("image", f))
+
+        def image_frames(result):
+            # files that are not images still count as processed
+            return [(0.0, [] if result is None else result[1])]
+
+        def tasks():
+            for plan in plans:
+                if plan[0] == "video":
+                    _, f, fps, step, bounds = plan
+                    to_frames = lambda result, fps=fps: [(idx / fps, enc) for idx, enc in result]
+                    for start, end in bounds:
+                        yield face_pipeline.video_segment_encodings, (f["path"], start, end, step), detect, to_frames
+                elif plan[0] == "zip":
+                    _, f, members = plan
+                    with zipfile.ZipFile(f["path"]) as archive:
+                        for name in members:
+                            yield face_pipeline.detect_and_encode, (archive.read(name),), detect, image_frames
+                else:
+                    with open(plan[1]["path"], "rb") as fh:
+                        data = fh.read()
+                    yield face_pipeline.detect_and_encode, (data,), detect, image_frames
+
+        return total, tasks()
+
+    def _run(self, job_id, workdir, files, base_time, scope, scope_fallback, sample_every_s, detect_scale, upsample):
+        try:
+            self._update(job_id, status="running", started_at=datetime.now())
+            self.gallery.ensure_loaded()
+            if not len(self.gallery):
+                self._update(job_id, status="done", finished_at=datetime.now(), message="No students registered")
+                return
+
+            total, tasks = self._tasks(files, sample_every_s, detect_scale, upsample)
+            self._update(job_id, total=total or None)
+
+            seen = {}  # (roll, hour_start) -> best sighting
+            counts = {"processed": 0, "faces_detected": 0}
+            last_report = time.monotonic()
+
+            def collect(future, to_frames):
+                nonlocal last_report
+                try:
+                    result = future.result(timeout=self.task_timeout_s)
+                except FutureTimeout:
+                    # frees the stuck job's slot in the shared pool
+                    self.compute_pool.abandon(future)
+                    raise PoolTimeout(f"Face processing timed out after {self.task_timeout_s:g}s")
+                for offset_s, encodings in to_frames(result):
+                    counts["processed"] += 1
+                    counts["faces_detected"] += len(encodings)
+                    if len(encodings):
+                        self._remember(seen, encodings, base_time + timedelta(seconds=offset_s), scope, scope_fallback)
+                if time.monotonic() - last_report >= 1.0:
+                    last_report = time.monotonic()
+                    self._update(job_id, **counts, recognized=self._recognized(seen))
+
+            pending = deque()
+            try:
+                for fn, args, kwargs, to_frames in tasks:
+                    while True:
+                        if len(pending) >= self.concurrency:
+                            collect(*pending.popleft())
+                            continue
+                        try:
+                            pending.append((self.compute_pool.submit(fn, *args, **kwargs), to_frames))
+                            break
+                        except PoolBusy:
+                            # the pool is shared with the API; wait for our own work or for a free slot
+                            if pending:
+                                collect(*pending.popleft())
+                            else:
+                                time.sleep(0.5)
+                while pending:
+                    collect(*pending.popleft())
+            finally:
+                # after a failure, segments not started yet must not keep the shared pool busy
+                for future, _ in pending:
+                    future.cancel()
+
+            marked = self._mark(job_id, seen)
+            self._update(job_id, **counts, total=total or counts["processed"], recognized=self._recognized(seen, marked),
+                         attendance_marked=len(marked), status="done", finished_at=datetime.now())
+            print(f"Media job {job_id} done: {counts['processed']} frames, {len(seen)} recognized, {len(marked)} marked")
+        except Exception as e:
+            print(f"Media job {job_id} failed: {e}")
+            self._update(job_id, status="failed", error=str(e), finished_at=datetime.now())
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _remember(self, seen, encodings, when, scope, scope_fallback):
+        matches = self.gallery.assign(
+            encodings, tolerance=TOLERANCE, confidence_threshold=CONFIDENCE_THRESHOLD,
+            scope=scope, fallback=scope_fallback,
+        )
+        hour_start = hour_bucket(when)
+        for match in matches:
+            if match["roll"] is None or match.get("confidence", 0) < MIN_CONFIDENCE:
+                continue
+            key = (match["roll"], hour_start)
+            best = seen.get(key)
+            if best is None:
+                seen[key] = {"roll": match["roll"], "name": match["name"], "confidence": match["confidence"],
+                             "first_seen": when, "sightings": 1}
+            else:
+                best["confidence"] = max(best["confidence"], match["confidence"])
+                best["first_seen"] = min(best["first_seen"], when)
+                best["sightings"] += 1
+
+    def _mark(self, job_id, seen):
+        """Record attendance once per (roll, hour); returns the keys that were new."""
+        marked = set()
+        for (roll, hour_start), best in seen.items():
+            if self.marked.mark(roll, best["name"], best["first_seen"], confidence=best["confidence"],
+                                face_detected=True, source="media_batch", job_id=job_id):
+                marked.add((roll, hour_start))
+        return marked
+
+    @staticmethod
+    def _recognized(seen, marked=None):
+        recognized = []
+        for key, best in sorted(seen.items(), key=lambda item: item[1]["first_seen"]):
+            entry = {
+                "roll": best["roll"],
+                "name": best["name"],
+                "confidence": best["confidence"],
+                "first_seen": best["first_seen"].isoformat(),
+                "sightings": best["sightings"],
+            }
+            if marked is not None:
+                entry["marked"] = key in marked
+            recognized.append(entry)
+        return recognized
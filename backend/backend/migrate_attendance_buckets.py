@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+One-shot migration: add `hour_bucket` to attendance records written before
+it existed, so the (roll, hour_bucket) unique index covers them too. Safe to
+re-run. When a roll already has a record in that hour, the extra rows are
+left without a bucket (they stay visible in reports, only dedup ignores them).
+The API backfills the current hour itself at startup; this covers the rest.
+
+Usage: python migrate_attendance_buckets.py [--batch-size 500] [--dry-run]
+"""
+
+import argparse
+import sys
+from pymongo import MongoClient
+
+try:
+    from .config import MONGODB_URL, DATABASE_NAME
+    from .attendance_store import backfill_hour_buckets, ensure_bucket_index
+except ImportError:
+    # Fallback when running as a script
+    from config import MONGODB_URL, DATABASE_NAME
+    from attendance_store import backfill_hour_buckets, ensure_bucket_index
+
+
+def migrate_attendance(attendance_col, batch_size=500, dry_run=False):
+    """Backfill hour_bucket on legacy records; returns (updated, duplicates)."""
+    if not dry_run:
+        ensure_bucket_index(attendance_col)
+    return backfill_hour_buckets(attendance_col, batch_size=batch_size, dry_run=dry_run)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill attendance hour buckets")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    try:
+        client = MongoClient(MONGODB_URL)
+        client.admin.command('ping')
+    except Exception as e:
+        print(f"❌ MongoDB connection failed: {e}")
+        sys.exit(1)
+
+    attendance_col = client[DATABASE_NAME]["attendance"]
+    updated, duplicates = migrate_attendance(attendance_col, batch_size=args.batch_size, dry_run=args.dry_run)
+    action = "Would bucket" if args.dry_run else "Bucketed"
+    print(f"✅ {action} {updated} attendance records ({duplicates} duplicates in the same hour left unbucketed)")
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+One-shot migration: convert `students.face_encoding` from 128-element BSON
+arrays to packed float32 Binary. Safe to re-run; already packed documents
+are skipped.
+
+Usage: python migrate_encodings.py [--batch-size 500] [--dry-run]
+"""
+
+import argparse
+import sys
+from pymongo import MongoClient, UpdateOne
+
+try:
+    from .config import MONGODB_URL, DATABASE_NAME
+    from .face_codec import pack_encoding
+except ImportError:
+    # Fallback when running as a script
+    from config import MONGODB_URL, DATABASE_NAME
+    from face_codec import pack_encoding
+
+
+def migrate_students(students_col, batch_size=500, dry_run=False):
+    """Pack every legacy array encoding; returns (converted, skipped)."""
+    converted, skipped = 0, 0
+    ops = []
+    # BSON type 4 = array; packed documents already hold type 5 (binary)
+    cursor = students_col.find({"face_encoding": {"$type": "array"}}, {"face_encoding": 1})
+    for doc in cursor:
+        try:
+            packed = pack_encoding(doc["face_encoding"])
+        except Exception:
+            skipped += 1
+            continue
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"face_encoding": packed}}))
+        if len(ops) >= batch_size:
+            if not dry_run:
+                students_col.bulk_write(ops, ordered=False)
+            converted += len(ops)
+            ops = []
+    if ops:
+        if not dry_run:
+            students_col.bulk_write(ops, ordered=False)
+        converted += len(ops)
+    return converted, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack student face encodings as float32 binary")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    try:
+        client = MongoClient(MONGODB_URL)
+        client.admin.command('ping')
+    except Exception as e:
+        print(f"❌ MongoDB connection failed: {e}")
+        sys.exit(1)
+
+    students_col = client[DATABASE_NAME]["students"]
+    converted, skipped = migrate_students(students_col, batch_size=args.batch_size, dry_run=args.dry_run)
+    action = "Would convert" if args.dry_run else "Converted"
+    print(f"✅ {action} {converted} student encodings ({skipped} skipped as invalid)")
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,7 @@ def insert_student(col: Collection, student: Dict):
     return col.insert_one(student)
 
 def get_students(col: Collection):
-    return list(col.find({}, {"face_encoding": 0}))
+    return list(col.find({}, {"face_encoding": 0, "face_samples": 0}))
 
 def insert_attendance(col: Collection, record: Dict):
     return col.insert_one(record)
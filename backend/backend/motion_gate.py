@@ -0,0 +1,87 @@
+import time
+import cv2
+import numpy as np
+
+try:
+    from .roi import roi_mask
+except ImportError:
+    # Fallback when running as a script
+    from roi import roi_mask
+
+
+class MotionGate:
+    """
+    Cheap pre-check that decides whether a frame is worth a face detection.
+
+    Each frame is shrunk to a small blurred grayscale thumbnail and compared
+    with a running-average background. Detection runs when at least
+    `threshold` of the thumbnail's pixels changed by more than `pixel_delta`
+    grey levels, or when `keyframe_s` seconds have passed since the last
+    detection (so a seated, still class is still re-checked). A threshold of
+    0 disables gating. With `rois` only changes inside them count.
+    """
+
+    def __init__(self, threshold=0.01, pixel_delta=15, keyframe_s=30.0, thumb_width=160, learning_rate=0.1,
+                 rois=None):
+        self.threshold = max(0.0, float(threshold))
+        self.pixel_delta = float(pixel_delta)
+        self.keyframe_s = max(0.0, float(keyframe_s))
+        self.thumb_width = max(16, int(thumb_width))
+        self.learning_rate = float(learning_rate)
+        self.rois = rois
+        self.reset()
+
+        self.frames_detected = 0
+        self.frames_gated = 0
+
+    def reset(self):
+        self._background = None
+        self._mask = None
+        self._last_detect = None
+        self.last_change = None
+
+    def _thumbnail(self, frame):
+        height, width = frame.shape[:2]
+        thumb_height = max(1, round(height * self.thumb_width / float(width)))
+        gray = cv2.cvtColor(cv2.resize(frame, (self.thumb_width, thumb_height), interpolation=cv2.INTER_AREA),
+                            cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0).astype(np.float32)
+
+    def should_detect(self, frame, now=None):
+        """True if the (BGR) frame changed enough or a keyframe is due."""
+        if not self.threshold:
+            self.frames_detected += 1
+            return True
+        now = time.time() if now is None else now
+        thumb = self._thumbnail(frame)
+
+        if self._background is None or self._background.shape != thumb.shape:
+            self._background = thumb
+            self._mask = roi_mask(self.rois, thumb.shape[1], thumb.shape[0])
+            changed = 1.0
+        else:
+            moved = cv2.absdiff(thumb, self._background) > self.pixel_delta
+            if self._mask is None:
+                changed = float(np.count_nonzero(moved)) / thumb.size
+            else:
+                inside = self._mask > 0
+                changed = float(np.count_nonzero(moved & inside)) / max(1, np.count_nonzero(inside))
+            # slow lighting drift is absorbed into the background
+            cv2.accumulateWeighted(thumb, self._background, self.learning_rate)
+        self.last_change = round(changed, 4)
+
+        keyframe_due = self._last_detect is None or now - self._last_detect >= self.keyframe_s
+        if changed >= self.threshold or keyframe_due:
+            self._last_detect = now
+            self.frames_detected += 1
+            return True
+        self.frames_gated += 1
+        return False
+
+    def status(self):
+        return {
+            "motion_threshold": self.threshold,
+            "motion_last_change": self.last_change,
+            "frames_detected": self.frames_detected,
+            "frames_gated": self.frames_gated,
+        }
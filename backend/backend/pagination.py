@@ -0,0 +1,65 @@
+"""
+Helpers for listing endpoints that must not build the whole collection in
+memory: opaque keyset cursors, caller-chosen projections and NDJSON lines.
+"""
+import base64
+import json
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+
+def parse_fields(fields, always=("_id",)):
+    """
+    "roll,name" -> Mongo projection {"roll": 1, "name": 1, "_id": 1}, or
+    None (all fields) for an empty value. Raises ValueError on bad names.
+    """
+    if not fields:
+        return None
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    if any(name.startswith("$") or not name.replace("_", "").replace(".", "").isalnum() for name in names):
+        raise ValueError(f"Invalid fields: {fields}")
+    return {name: 1 for name in [*always, *names]}
+
+
+def encode_cursor(*values):
+    """Opaque cursor for the sort key of the last item on a page."""
+    parts = [v.isoformat() if isinstance(v, datetime) else str(v) for v in values]
+    return base64.urlsafe_b64encode("|".join(parts).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, count):
+    """The `count` raw string parts of a cursor; raises ValueError if it is not one of ours."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    parts = raw.split("|")
+    if len(parts) != count:
+        raise ValueError("Invalid cursor")
+    return parts
+
+
+def after_id_cursor(cursor):
+    """Filter for the page after an `_id` cursor (ascending _id order)."""
+    try:
+        return {"_id": {"$gt": ObjectId(decode_cursor(cursor, 1)[0])}}
+    except InvalidId:
+        raise ValueError("Invalid cursor")
+
+
+def before_timestamp_cursor(cursor):
+    """Filter for the page after a (timestamp, _id) cursor in newest-first order."""
+    ts, oid = decode_cursor(cursor, 2)
+    try:
+        ts, oid = datetime.fromisoformat(ts), ObjectId(oid)
+    except (ValueError, InvalidId):
+        raise ValueError("Invalid cursor")
+    return {"$or": [{"timestamp": {"$lt": ts}}, {"timestamp": ts, "_id": {"$lt": oid}}]}
+
+
+def ndjson_lines(docs, convert):
+    """One JSON line per converted document, straight off a Mongo cursor."""
+    for doc in docs:
+        yield json.dumps(convert(doc), default=str) + "\n"
@@ -0,0 +1,82 @@
+"""
+Camera regions of interest. ROIs are given as fractions of the frame so
+they survive resolution changes: [x1, y1, x2, y2] for a rectangle or
+[[x, y], [x, y], ...] (3+ points) for a polygon.
+"""
+import cv2
+import numpy as np
+
+
+def normalize_rois(rois):
+    """
+    Validate ROIs and return them as a list of polygons ([[x, y], ...] in
+    0..1), or None for "whole frame". Raises ValueError on bad input.
+    """
+    if not rois:
+        return None
+    if not isinstance(rois, (list, tuple)):
+        raise ValueError("rois must be a list of rectangles or polygons")
+    polygons = []
+    for roi in rois:
+        if not isinstance(roi, (list, tuple)) or not roi:
+            raise ValueError(f"Invalid ROI: {roi!r}")
+        if all(isinstance(v, (int, float)) for v in roi):
+            if len(roi) != 4:
+                raise ValueError(f"Rectangle ROI needs [x1, y1, x2, y2]: {roi!r}")
+            x1, y1, x2, y2 = (float(v) for v in roi)
+            x1, x2 = sorted((x1, x2))
+            y1, y2 = sorted((y1, y2))
+            points = [[x1, y1], [x2, y1], [x2, y2], [x1, y2]]
+        else:
+            try:
+                points = [[float(x), float(y)] for x, y in roi]
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid polygon ROI: {roi!r}")
+            if len(points) < 3:
+                raise ValueError(f"Polygon ROI needs at least 3 points: {roi!r}")
+        if any(not 0.0 <= v <= 1.0 for point in points for v in point):
+            raise ValueError(f"ROI coordinates are fractions of the frame (0..1): {roi!r}")
+        xs, ys = [p[0] for p in points], [p[1] for p in points]
+        if max(xs) - min(xs) <= 0 or max(ys) - min(ys) <= 0:
+            raise ValueError(f"ROI has no area: {roi!r}")
+        polygons.append(points)
+    return polygons
+
+
+def _to_pixels(polygon, width, height):
+    return np.array([[round(x * width), round(y * height)] for x, y in polygon], dtype=np.int32)
+
+
+def roi_regions(rois, width, height):
+    """
+    Pixel crops for each ROI: (x1, y1, x2, y2, polygon) where polygon is the
+    pixel outline relative to the crop, or None when the ROI is the crop
+    rectangle itself (nothing to mask).
+    """
+    regions = []
+    for polygon in rois or []:
+        points = _to_pixels(polygon, width, height)
+        x1, y1 = max(0, points[:, 0].min()), max(0, points[:, 1].min())
+        x2, y2 = min(width, points[:, 0].max()), min(height, points[:, 1].max())
+        if x2 <= x1 or y2 <= y1:
+            continue
+        is_rect = len(points) == 4 and cv2.contourArea(points) >= (x2 - x1) * (y2 - y1)
+        regions.append((int(x1), int(y1), int(x2), int(y2), None if is_rect else points - [x1, y1]))
+    return regions
+
+
+def roi_mask(rois, width, height):
+    """uint8 mask (255 inside any ROI) at the given size, or None for the whole frame."""
+    if not rois:
+        return None
+    mask = np.zeros((height, width), dtype=np.uint8)
+    cv2.fillPoly(mask, [_to_pixels(polygon, width, height) for polygon in rois], 255)
+    return mask
+
+
+def roi_area(rois):
+    """Fraction of the frame covered by the ROI bounding crops (what detection actually scans)."""
+    if not rois:
+        return 1.0
+    return min(1.0, sum((max(p[0] for p in poly) - min(p[0] for p in poly)) *
+                        (max(p[1] for p in poly) - min(p[1] for p in poly)) for poly in rois))
@@ -1,26 +1,97 @@
+import random
 import time
 import cv2
 import numpy as np
-import face_recognition
-from datetime import datetime, timedelta
+from datetime import datetime
 from threading import Event, Thread
 
+try:
+    from .face_gallery import FaceGallery, make_scope
+    from .gallery_sync import GallerySync
+    from . import face_pipeline
+    from .face_tracker import FaceTracker
+    from .frame_grabber import FrameGrabber
+    from .motion_gate import MotionGate
+    from .compute_pool import PoolBusy
+    from .roi import normalize_rois, roi_area
+    from .scan_scheduler import ScanScheduler
+    from .attendance_store import MarkedCache
+except ImportError:
+    # Fallback when running as a script
+    from face_gallery import FaceGallery, make_scope
+    from gallery_sync import GallerySync
+    import face_pipeline
+    from face_tracker import FaceTracker
+    from frame_grabber import FrameGrabber
+    from motion_gate import MotionGate
+    from compute_pool import PoolBusy
+    from roi import normalize_rois, roi_area
+    from scan_scheduler import ScanScheduler
+    from attendance_store import MarkedCache
+
 
 class RtspAttendanceWorker:
-    def __init__(self, rtsp_url, mongo_db, interval_ms=1000, frame_skip=0, start_after: datetime | None = None):
+    def __init__(self, rtsp_url, mongo_db, interval_ms=1000, frame_skip=0, start_after: datetime | None = None,
+                 gallery_poll_s=5.0, scope=None, scope_fallback=False, detect_scale=1.0, detect_upsample=1,
+                 track_reverify_s=5.0, track_correlation=False, motion_threshold=0.0, motion_pixel_delta=15,
+                 keyframe_s=30.0, camera_id=None, gallery=None, gallery_sync=None, compute_pool=None,
+                 stall_s=15.0, freeze_s=60.0, backoff_max_s=60.0, rois=None, schedule=None, marked_cache=None):
         self.rtsp_url = rtsp_url
+        self.camera_id = camera_id
         self.mongo_db = mongo_db
         self.interval_ms = max(200, int(interval_ms))
         self.frame_skip = max(0, int(frame_skip))
         self.start_after = start_after
+        # gallery partition this camera searches (None = whole institution)
+        self.scope = make_scope(scope)
+        self.scope_fallback = bool(scope_fallback)
+        # detection runs on a frame resized by detect_scale; encodings use the full frame
+        self.detect_scale = min(1.0, max(0.05, float(detect_scale)))
+        self.detect_upsample = max(0, int(detect_upsample))
+        # interval/scale/upsample above are starting points; the scheduler moves them within its bounds
+        self.scheduler = ScanScheduler(self.interval_ms, self.detect_scale, self.detect_upsample, pool=compute_pool,
+                                       **(schedule or {}))
+        self._frame_stats = {}
+        # only these regions (doorway, seating) are scanned; None = whole frame
+        self.rois = normalize_rois(rois)
+        self.tracker = FaceTracker(reverify_s=track_reverify_s, correlation=track_correlation)
+        self.motion_gate = MotionGate(motion_threshold, pixel_delta=motion_pixel_delta, keyframe_s=keyframe_s,
+                                      rois=self.rois)
+        # watchdog: reconnect when no frame arrives for stall_s or frames stop changing for freeze_s (0 = off)
+        self.stall_s = max(1.0, float(stall_s))
+        self.freeze_s = max(0.0, float(freeze_s))
+        self.backoff_base_s = 1.0
+        self.backoff_max_s = max(1.0, float(backoff_max_s))
         self.stop_event = Event()
         self.thread = None
+        self._cap = None
+        self._frame_signature = None
+        self._frozen_since = None
 
         # runtime state for status endpoint
         self.running = False
         self.last_frame_ts = None
         self.last_error = None
         self.last_recognized = []
+        self.last_frame_age_ms = None
+        self.grabber = None
+        self.frames_busy = 0
+        self.reconnects = 0
+        self.started_at = None
+        self.connected_since = None
+        self.next_retry_ts = None
+        self.last_disconnect_reason = None
+
+        # detection/encoding run in this thread unless a (shared) compute pool is given
+        self.compute_pool = compute_pool
+        # a CameraManager passes its shared gallery and sync; a standalone worker owns both
+        self._owns_gallery = gallery is None
+        self.gallery = gallery if gallery is not None else FaceGallery(mongo_db["students"])
+        if gallery_sync is None:
+            gallery_sync = GallerySync(self.gallery, mongo_db["students"], poll_interval=gallery_poll_s)
+        self.gallery_sync = gallery_sync
+        # rolls already marked this hour, shared by the cameras of one process
+        self.marked = marked_cache if marked_cache is not None else MarkedCache(mongo_db["attendance"])
 
     def start(self):
         if self.thread and self.thread.is_alive():
@@ -37,129 +108,290 @@ class RtspAttendanceWorker:
         self.running = False
 
     def status(self):
+        now = time.time()
+        last_good = self.grabber.last_frame_at if self.grabber else None
         return {
+            "camera_id": self.camera_id,
             "running": self.running,
             "last_frame_ts": self.last_frame_ts.isoformat() if self.last_frame_ts else None,
+            # capture -> attendance written, for the last processed frame
+            "frame_age_ms": self.last_frame_age_ms,
+            **(self.grabber.status() if self.grabber else {}),
+            "frames_busy": self.frames_busy,
+            "connected": self.connected_since is not None,
+            "reconnects": self.reconnects,
+            "last_disconnect_reason": self.last_disconnect_reason,
+            "uptime_s": round(now - self.started_at, 1) if self.running and self.started_at else None,
+            "connected_s": round(now - self.connected_since, 1) if self.connected_since else None,
+            "since_last_good_frame_s": round(now - last_good, 1) if last_good else None,
+            "next_retry_in_s": round(max(0.0, self.next_retry_ts - now), 1)
+            if self.next_retry_ts and not self.connected_since else None,
             "last_error": self.last_error,
             "last_recognized": self.last_recognized[-10:],
             "start_after": self.start_after.isoformat() if self.start_after else None,
+            "scope": self.scope,
+            "detect_scale": self.detect_scale,
+            "detect_upsample": self.detect_upsample,
+            "interval_ms": self.interval_ms,
+            "scheduler": self.scheduler.status(),
+            "rois": self.rois,
+            "roi_area": round(roi_area(self.rois), 3),
+            **self.motion_gate.status(),
+            **self.tracker.status(),
+            **self.gallery_sync.status(),
         }
 
+    def _compute(self, fn, *args, **kwargs):
+        if self.compute_pool is None:
+            return fn(*args, **kwargs)
+        return self.compute_pool.run_sync(fn, *args, **kwargs)
+
+    def _reschedule(self):
+        self.scheduler.record(frame_age_ms=self.last_frame_age_ms, **self._frame_stats)
+        if not self.scheduler.enabled:
+            return
+        self.interval_ms = self.scheduler.interval_ms
+        self.detect_scale = self.scheduler.detect_scale
+        self.detect_upsample = self.scheduler.detect_upsample
+
+    def _pace(self, started):
+        # processing time counts towards the scan interval
+        self.stop_event.wait(max(0.0, self.interval_ms / 1000.0 - (time.time() - started)))
+
+    def _process_frame(self, frame):
+        """Gate, detect, track, identify and record attendance for one frame."""
+        stats = self._frame_stats = {"faces": len(self.tracker)}
+        # static scene: skip detection (tracks are kept until the next keyframe)
+        if not self.motion_gate.should_detect(frame):
+            return
+
+        started = time.perf_counter()
+        try:
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            face_locations = self._compute(
+                face_pipeline.detect_faces, rgb, upsample=self.detect_upsample, scale=self.detect_scale,
+                rois=self.rois
+            )
+        except PoolBusy:
+            # shared pool saturated by other cameras: drop this frame
+            self.frames_busy += 1
+            stats["pool_busy"] = True
+            return
+        except Exception as e:
+            self.last_error = f"Face detection error: {e}"
+            return
+
+        stats["detect_ms"] = (time.perf_counter() - started) * 1000
+        tracks = self.tracker.update(face_locations, frame)
+        stats["faces"] = len(tracks)
+        if not tracks:
+            return
+
+        now = datetime.now()
+        # schedule gate: do not mark before start_after
+        if self.start_after and now < self.start_after:
+            return
+        tolerance = 0.25
+        confidence_threshold = 0.75
+
+        # only new tracks and tracks due for re-verification are encoded
+        now_ts = time.time()
+        pending = [t for t in tracks if self.tracker.needs_identity(t, now_ts)]
+        self.tracker.skipped(len(tracks) - len(pending))
+        if pending:
+            stats["new_faces"] = sum(1 for t in pending if t.last_verified is None)
+            started = time.perf_counter()
+            try:
+                face_encodings = self._compute(face_pipeline.encode_faces, rgb, [t.box for t in pending])
+            except PoolBusy:
+                self.frames_busy += 1
+                stats["pool_busy"] = True
+                return
+            except Exception as e:
+                self.last_error = f"Face encoding error: {e}"
+                return
+            stats["encode_ms"] = (time.perf_counter() - started) * 1000
+            started = time.perf_counter()
+            matches = self.gallery.assign(
+                face_encodings, tolerance=tolerance, confidence_threshold=confidence_threshold,
+                scope=self.scope, fallback=self.scope_fallback
+            )
+            stats["match_ms"] = (time.perf_counter() - started) * 1000
+            held = {t.roll for t in tracks if t.roll is not None and t not in pending}
+            for track, match in zip(pending, matches):
+                # a student already followed by another track in view is not matched twice
+                if match["roll"] in held:
+                    match = None
+                self.tracker.identify(track, match, now_ts)
+
+        recognized_this_frame = []
+
+        for track in tracks:
+            if track.roll is None:
+                continue
+            extra = {"camera_id": self.camera_id} if self.camera_id is not None else {}
+            try:
+                self.marked.queue(track.roll, track.name, now, confidence=track.confidence, source="rtsp", **extra)
+            except Exception:
+                pass
+            recognized_this_frame.append({
+                "roll": track.roll,
+                "name": track.name,
+                "confidence": track.confidence,
+                "track_id": track.id
+            })
+
+        if recognized_this_frame:
+            self.last_recognized.extend(recognized_this_frame)
+            # keep memory bounded
+            if len(self.last_recognized) > 200:
+                self.last_recognized = self.last_recognized[-200:]
+
+    def _open_stream(self):
+        params = []
+        # bound how long a dead camera can block open/read (OpenCV >= 4.5 FFmpeg backend)
+        for prop in ("CAP_PROP_OPEN_TIMEOUT_MSEC", "CAP_PROP_READ_TIMEOUT_MSEC"):
+            if hasattr(cv2, prop):
+                params += [getattr(cv2, prop), int(self.stall_s * 1000)]
+        cap = cv2.VideoCapture(self.rtsp_url, cv2.CAP_FFMPEG, params) if params else cv2.VideoCapture(self.rtsp_url)
+        if not cap.isOpened():
+            cap.release()
+            return None
+        # small driver buffer: the grabber drains it anyway
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return cap
+
+    def _connect(self):
+        """Open the stream, retrying with exponential backoff and jitter. False if stopped first."""
+        attempt = 0
+        while not self.stop_event.is_set():
+            cap = self._open_stream()
+            if cap is not None:
+                self._cap = cap
+                self.grabber = FrameGrabber(cap, frame_skip=self.frame_skip)
+                self.grabber.start()
+                self.connected_since = time.time()
+                self.last_error = None
+                self._frame_signature = None
+                self._frozen_since = None
+                return True
+            self.last_error = "Failed to open RTSP stream"
+            delay = min(self.backoff_max_s, self.backoff_base_s * (2 ** attempt)) * random.uniform(0.5, 1.0)
+            attempt += 1
+            self.next_retry_ts = time.time() + delay
+            self.stop_event.wait(delay)
+        return False
+
+    def _disconnect(self):
+        self.connected_since = None
+        grabber, cap, self._cap = self.grabber, self._cap, None
+        if grabber is not None:
+            grabber.stop()
+            if grabber.thread and grabber.thread.is_alive():
+                # still blocked inside grab(); releasing under it can crash the backend
+                return
+        if cap is not None:
+            try:
+                cap.release()
+            except Exception:
+                pass
+
+    def _watchdog(self, frame):
+        """Reason to reconnect (stalled or frozen stream), or None."""
+        now = time.time()
+        last_good = self.grabber.last_frame_at or self.connected_since
+        if now - last_good > self.stall_s:
+            return f"no frame for {int(now - last_good)}s"
+        if frame is not None and self.freeze_s:
+            # bit-identical sparse samples: a live sensor always has some noise
+            signature = hash(frame[::32, ::32].tobytes())
+            if signature != self._frame_signature:
+                self._frame_signature, self._frozen_since = signature, now
+            elif now - self._frozen_since > self.freeze_s:
+                return f"frame frozen for {int(now - self._frozen_since)}s"
+        return None
+
     def _run(self):
-        cap = None
         self.running = True
         self.last_error = None
-        frame_idx = 0
+        self.started_at = time.time()
+        self.tracker.reset()
+        self.motion_gate.reset()
 
-        # cache students for quick loop; refresh periodically
-        students = []
-        last_students_refresh = 0
+        # gallery loads once, then follows student changes incrementally
+        if self._owns_gallery:
+            self.gallery_sync.start()
 
         try:
-            cap = cv2.VideoCapture(self.rtsp_url)
-            if not cap.isOpened():
-                self.last_error = "Failed to open RTSP stream"
-                self.running = False
-                return
+            while self._connect():
+                while not self.stop_event.is_set():
+                    # newest frame only; the grabber thread keeps draining the stream meanwhile
+                    frame, captured_at = self.grabber.read(timeout=min(5.0, self.stall_s))
+                    reason = self._watchdog(frame)
+                    if reason:
+                        self.last_error = f"Reconnecting RTSP stream: {reason}"
+                        self.last_disconnect_reason = reason
+                        break
+                    if frame is None:
+                        self.last_error = self.grabber.last_error or "No frame from RTSP stream"
+                        continue
+                    loop_started = time.time()
+                    self.last_frame_ts = datetime.now()
+
+                    self._process_frame(frame)
 
-            while not self.stop_event.is_set():
-                # refresh students every 60s
-                now_ts = time.time()
-                if now_ts - last_students_refresh > 60:
-                    students = list(self.mongo_db["students"].find())
-                    last_students_refresh = now_ts
-
-                ok, frame = cap.read()
-                if not ok or frame is None:
-                    self.last_error = "Frame read failed"
-                    time.sleep(2)
-                    continue
-
-                frame_idx += 1
-                if self.frame_skip and frame_idx % (self.frame_skip + 1) != 0:
-                    # throttle via frame skipping
-                    time.sleep(self.interval_ms / 1000.0)
-                    continue
-
-                self.last_frame_ts = datetime.now()
-
-                try:
-                    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    face_locations = face_recognition.face_locations(
-                        rgb, number_of_times_to_upsample=1
-                    )
-                    face_encodings = face_recognition.face_encodings(rgb, face_locations)
-                except Exception as e:
-                    self.last_error = f"Face detection error: {e}"
-                    time.sleep(self.interval_ms / 1000.0)
-                    continue
-
-                if not face_encodings:
-                    time.sleep(self.interval_ms / 1000.0)
-                    continue
-
-                now = datetime.now()
-                # schedule gate: do not mark before start_after
-                if self.start_after and now < self.start_after:
-                    time.sleep(self.interval_ms / 1000.0)
-                    continue
-                hour_start = now.replace(minute=0, second=0, microsecond=0)
-                hour_end = hour_start + timedelta(hours=1)
-                tolerance = 0.25
-                confidence_threshold = 0.75
-
-                recognized_this_frame = []
-
-                for enc in face_encodings:
-                    best = None
-                    best_distance = float("inf")
-                    best_conf = 0
-                    for s in students:
-                        try:
-                            known = np.array(s["face_encoding"])
-                            distance = face_recognition.face_distance([known], enc)[0]
-                            conf = (1 - distance) * 100
-                        except Exception:
-                            continue
-                        if distance < best_distance and distance <= tolerance and conf >= confidence_threshold:
-                            best_distance = distance
-                            best_conf = conf
-                            best = s
-                    if best:
-                        exists = self.mongo_db["attendance"].find_one({
-                            "roll": best["roll"],
-                            "timestamp": {"$gte": hour_start, "$lt": hour_end}
-                        })
-                        if not exists:
-                            try:
-                                self.mongo_db["attendance"].insert_one({
-                                    "roll": best["roll"],
-                                    "name": best["name"],
-                                    "timestamp": now,
-                                    "confidence": best_conf,
-                                    "source": "rtsp"
-                                })
-                            except Exception:
-                                pass
-                        recognized_this_frame.append({
-                            "roll": best["roll"],
-                            "name": best["name"],
-                            "confidence": best_conf
-                        })
-
-                if recognized_this_frame:
-                    self.last_recognized.extend(recognized_this_frame)
-                    # keep memory bounded
-                    if len(self.last_recognized) > 200:
-                        self.last_recognized = self.last_recognized[-200:]
-
-                time.sleep(self.interval_ms / 1000.0)
+                    self.last_frame_age_ms = int((time.time() - captured_at) * 1000)
+                    self._reschedule()
+                    self._pace(loop_started)
 
+                self._disconnect()
+                if not self.stop_event.is_set():
+                    self.reconnects += 1
+                    # tracks from the old connection are meaningless after a gap
+                    self.tracker.reset()
+                    self.motion_gate.reset()
         finally:
-            if cap is not None:
-                try:
-                    cap.release()
-                except Exception:
-                    pass
+            self._disconnect()
+            if self._owns_gallery:
+                self.gallery_sync.stop()
             self.running = False
 
+
+def main():
+    """
+    Standalone worker process (RTSP_WORKER_MODE=process), controlled by the
+    API through the camera_control collection:
+
+        python -m backend.rtsp_worker [--camera ID ...] [--poll 2]
+    """
+    import argparse
+    import signal
+    from pymongo import MongoClient
+
+    try:
+        from .camera_control import CameraAgent
+        from .config import MONGODB_URL, DATABASE_NAME, RTSP_CONTROL_POLL_S
+    except ImportError:
+        # Fallback when running as a script
+        from camera_control import CameraAgent
+        from config import MONGODB_URL, DATABASE_NAME, RTSP_CONTROL_POLL_S
+
+    parser = argparse.ArgumentParser(description="Run RTSP attendance workers outside the API process")
+    parser.add_argument("--camera", action="append", default=[],
+                        help="camera id to serve (repeatable); default is every registered camera")
+    parser.add_argument("--poll", type=float, default=RTSP_CONTROL_POLL_S, help="seconds between command checks")
+    args = parser.parse_args()
+
+    client = MongoClient(MONGODB_URL)
+    agent = CameraAgent(client[DATABASE_NAME], camera_ids=args.camera, poll_s=args.poll)
+    signal.signal(signal.SIGTERM, lambda *_: agent.stop())
+    try:
+        agent.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
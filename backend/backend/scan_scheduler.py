@@ -0,0 +1,187 @@
+# Bounds a caller may change at runtime, with their types
+SCHEDULE_FIELDS = {
+    "enabled": bool,
+    "min_interval_ms": int,
+    "max_interval_ms": int,
+    "min_scale": float,
+    "max_scale": float,
+    "min_upsample": int,
+    "max_upsample": int,
+    "target_frame_age_ms": int,
+    "cpu_budget": float,
+}
+
+
+def validate_schedule(data):
+    """Check scheduler bounds from a request; returns the normalised dict or raises ValueError."""
+    if not isinstance(data, dict):
+        raise ValueError("schedule must be an object")
+    unknown = set(data) - set(SCHEDULE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown schedule fields: {', '.join(sorted(unknown))}")
+    bounds = {}
+    for field, value in data.items():
+        kind = SCHEDULE_FIELDS[field]
+        try:
+            if kind is bool and isinstance(value, str):
+                bounds[field] = value.strip().lower() in ("1", "true", "yes", "on")
+            else:
+                bounds[field] = kind(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid value for {field}: {value!r}")
+    for low, high in (("min_interval_ms", "max_interval_ms"), ("min_scale", "max_scale"),
+                      ("min_upsample", "max_upsample")):
+        if low in bounds and high in bounds and bounds[low] > bounds[high]:
+            raise ValueError(f"{low} must not exceed {high}")
+    if any(not 0 < bounds[f] <= 1 for f in ("min_scale", "max_scale") if f in bounds):
+        raise ValueError("Detection scales must be in (0, 1]")
+    return bounds
+
+
+class ScanScheduler:
+    """
+    Adjusts a camera's scan interval, detection scale and upsampling from
+    measured per-frame latency and activity, within configured bounds.
+
+    After each frame:
+      - over budget (processing takes more than `cpu_budget` of the
+        interval, frames are older than `target_frame_age_ms`, the shared
+        pool is full or backed up): make detection cheaper
+        first (upsample, then scale), then scan less often;
+      - new faces appeared: scan at the fastest interval (people arriving);
+      - nothing in view for a few frames: back off towards the slowest;
+      - comfortably under budget: spend the headroom on detection quality,
+        then on a shorter interval.
+    """
+
+    IDLE_FRAMES = 3
+    SMOOTHING = 0.3
+
+    def __init__(self, interval_ms, detect_scale, detect_upsample, enabled=False, min_interval_ms=None,
+                 max_interval_ms=None, min_scale=None, max_scale=None, min_upsample=0, max_upsample=None,
+                 target_frame_age_ms=1500, cpu_budget=0.5, pool=None):
+        self.interval_ms = int(interval_ms)
+        self.detect_scale = float(detect_scale)
+        self.detect_upsample = int(detect_upsample)
+        self.enabled = bool(enabled)
+        self.min_interval_ms = int(min_interval_ms if min_interval_ms is not None else max(200, interval_ms // 4))
+        self.max_interval_ms = int(max_interval_ms if max_interval_ms is not None else interval_ms * 4)
+        self.min_scale = float(min_scale if min_scale is not None else min(detect_scale, 0.25))
+        self.max_scale = float(max_scale if max_scale is not None else detect_scale)
+        self.min_upsample = int(min_upsample)
+        self.max_upsample = int(max_upsample if max_upsample is not None else detect_upsample)
+        self.target_frame_age_ms = int(target_frame_age_ms)
+        self.cpu_budget = float(cpu_budget)
+        # the camera's ComputePool; its counters say whether the host is short of CPU
+        self.pool = pool
+        self._pool_rejected = pool.rejected if pool is not None else 0
+        self._clamp()
+
+        # smoothed measurements
+        self.detect_ms = None
+        self.encode_ms = None
+        self.match_ms = None
+        self.frame_age_ms = None
+        self.faces = 0
+        self.idle_frames = 0
+        self.last_action = None
+        self.adjustments = 0
+
+    def configure(self, **bounds):
+        """
+        Change bounds live (keys from SCHEDULE_FIELDS); when enabled, current
+        settings are clamped into them.
+        """
+        for field, value in validate_schedule(bounds).items():
+            setattr(self, field, value)
+        self._clamp()
+
+    def _clamp(self):
+        self.max_interval_ms = max(self.max_interval_ms, self.min_interval_ms)
+        self.max_scale = max(self.max_scale, self.min_scale)
+        self.max_upsample = max(self.max_upsample, self.min_upsample)
+        if not self.enabled:
+            # disabled: the camera keeps its configured settings, whatever the bounds
+            return
+        self.interval_ms = min(self.max_interval_ms, max(self.min_interval_ms, self.interval_ms))
+        self.detect_scale = min(self.max_scale, max(self.min_scale, self.detect_scale))
+        self.detect_upsample = min(self.max_upsample, max(self.min_upsample, self.detect_upsample))
+
+    def _smooth(self, old, new):
+        return new if old is None else old + self.SMOOTHING * (new - old)
+
+    def _pool_backed_up(self):
+        # jobs waiting beyond the workers, or any rejected since the last frame. System
+        # load average would count the pool's own workers and throttle on them.
+        if self.pool is None:
+            return False
+        rejected, self._pool_rejected = self.pool.rejected - self._pool_rejected, self.pool.rejected
+        return rejected > 0 or self.pool.in_flight > self.pool.workers
+
+    def record(self, detect_ms=0.0, encode_ms=0.0, match_ms=0.0, faces=0, new_faces=0, frame_age_ms=None,
+               pool_busy=False):
+        """Feed one processed frame's measurements and adjust the settings."""
+        self.detect_ms = self._smooth(self.detect_ms, detect_ms)
+        self.encode_ms = self._smooth(self.encode_ms, encode_ms)
+        self.match_ms = self._smooth(self.match_ms, match_ms)
+        if frame_age_ms is not None:
+            self.frame_age_ms = self._smooth(self.frame_age_ms, frame_age_ms)
+        self.faces = faces
+        self.idle_frames = self.idle_frames + 1 if not faces else 0
+        pool_busy = self._pool_backed_up() or pool_busy
+        if self.enabled:
+            self._adjust(new_faces, pool_busy)
+
+    def _adjust(self, new_faces, pool_busy):
+        processing_ms = self.detect_ms + self.encode_ms + self.match_ms
+        load = processing_ms / float(self.interval_ms)
+        age = self.frame_age_ms or 0.0
+        before = (self.interval_ms, self.detect_scale, self.detect_upsample)
+
+        if pool_busy or load > self.cpu_budget or age > self.target_frame_age_ms:
+            if self.detect_upsample > self.min_upsample:
+                self.detect_upsample -= 1
+            elif self.detect_scale > self.min_scale:
+                self.detect_scale = round(self.detect_scale - 0.1, 2)
+            else:
+                self.interval_ms = int(self.interval_ms * 1.25)
+            action = "back_off"
+        elif new_faces:
+            self.interval_ms = self.min_interval_ms
+            action = "arrivals"
+        elif self.idle_frames >= self.IDLE_FRAMES:
+            self.interval_ms = int(self.interval_ms * 1.5)
+            action = "idle"
+        elif load < self.cpu_budget / 2 and age < self.target_frame_age_ms / 2:
+            if self.detect_scale < self.max_scale:
+                self.detect_scale = round(self.detect_scale + 0.1, 2)
+            elif self.detect_upsample < self.max_upsample:
+                self.detect_upsample += 1
+            else:
+                self.interval_ms = int(self.interval_ms * 0.8)
+            action = "headroom"
+        else:
+            action = "hold"
+        self._clamp()
+        if (self.interval_ms, self.detect_scale, self.detect_upsample) != before:
+            self.adjustments += 1
+            self.last_action = action
+
+    def status(self):
+        def ms(value):
+            return round(value, 1) if value is not None else None
+        return {
+            "enabled": self.enabled,
+            "interval_ms": self.interval_ms,
+            "detect_scale": self.detect_scale,
+            "detect_upsample": self.detect_upsample,
+            "bounds": {f: getattr(self, f) for f in SCHEDULE_FIELDS if f != "enabled"},
+            "detect_ms": ms(self.detect_ms),
+            "encode_ms": ms(self.encode_ms),
+            "match_ms": ms(self.match_ms),
+            "frame_age_ms": ms(self.frame_age_ms),
+            "faces": self.faces,
+            "idle_frames": self.idle_frames,
+            "last_action": self.last_action,
+            "adjustments": self.adjustments,
+        }
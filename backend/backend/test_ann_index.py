@@ -0,0 +1,86 @@
+"""Unit tests for the IVF approximate nearest-neighbour index."""
+import numpy as np
+
+import ann_index
+from ann_index import IVFIndex
+
+
+def _gallery(n=3000, dim=128, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(scale=0.1, size=(n, dim)).astype(np.float32)
+    return rng, vectors, [f"S{i}" for i in range(n)]
+
+
+def _exact_nearest(vectors, probes):
+    d = ((probes[:, None, :] - vectors[None, :, :]) ** 2).sum(axis=2)
+    return np.argmin(d, axis=1)
+
+
+def test_recall_against_exact_search():
+    rng, vectors, labels = _gallery()
+    index = IVFIndex(nprobe=8).build(vectors, labels)
+    # probes are new photos of enrolled people: near one gallery entry
+    probes = vectors[rng.choice(len(vectors), 300, replace=False)]
+    probes = probes + rng.normal(scale=0.02, size=probes.shape).astype(np.float32)
+    truth = _exact_nearest(vectors, probes)
+    found = index.search(probes, k=10)
+    recall = np.mean([labels[t] in cand for t, cand in zip(truth, found)])
+    assert recall >= 0.95
+
+
+def test_probing_every_cell_is_exact():
+    rng, vectors, labels = _gallery(n=500)
+    index = IVFIndex().build(vectors, labels)
+    probes = rng.normal(scale=0.1, size=(50, 128)).astype(np.float32)
+    truth = _exact_nearest(vectors, probes)
+    found = index.search(probes, k=1, nprobe=len(index.centroids))
+    assert [cand[0] for cand in found] == [labels[t] for t in truth]
+
+
+def test_add_and_remove():
+    rng, vectors, labels = _gallery(n=500)
+    index = IVFIndex().build(vectors, labels)
+    assert len(index) == 500 and index.trained_size == 500 and index.changes == 0
+
+    new = rng.normal(scale=0.1, size=128).astype(np.float32)
+    index.add("new", new)
+    assert len(index) == 501
+    assert index.search(new, k=1)[0] == ["new"]
+
+    assert index.remove("new")
+    assert not index.remove("new")
+    assert len(index) == 500
+    assert "new" not in index.search(new, k=10)[0]
+    assert index.changes == 2
+
+
+def test_re_adding_a_label_moves_it():
+    _, vectors, labels = _gallery(n=500)
+    index = IVFIndex().build(vectors, labels)
+    index.add(labels[0], vectors[1])
+    assert len(index) == 500
+    assert set(index.search(vectors[1], k=2)[0]) == {labels[0], labels[1]}
+
+
+def test_build_with_given_centroids_skips_training():
+    _, vectors, labels = _gallery(n=500)
+    trained = IVFIndex(nlist=16).train(vectors)
+    assert trained.shape == (16, 128)
+    index = IVFIndex().build(vectors, labels, centroids=trained)
+    np.testing.assert_array_equal(index.centroids, trained)
+    assert len(index) == 500
+
+
+def test_chunked_assignment_matches_a_single_pass(monkeypatch):
+    _, vectors, labels = _gallery(n=500)
+    whole = IVFIndex(nlist=16).build(vectors, labels)
+    monkeypatch.setattr(ann_index, "ASSIGN_CHUNK", 7)
+    chunked = IVFIndex(nlist=16).build(vectors, labels)
+    np.testing.assert_array_equal(chunked.centroids, whole.centroids)
+    assert chunked.cell_labels == whole.cell_labels
+
+
+def test_empty_index():
+    index = IVFIndex().build(np.empty((0, 128), dtype=np.float32), [])
+    assert len(index) == 0
+    assert index.search(np.zeros(128), k=5) == [[]]
@@ -0,0 +1,383 @@
+"""Unit tests for once-per-hour attendance writes (no MongoDB)."""
+import time
+from datetime import datetime, timedelta
+from threading import Event
+from types import SimpleNamespace
+
+import pytest
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+import attendance_store
+from attendance_store import AttendanceWriter, MarkedCache, backfill_hour_buckets, hour_bucket, mark_attendance
+
+NOW = datetime(2024, 5, 1, 9, 30)
+
+
+def _matches(doc, query):
+    for field, cond in query.items():
+        value = doc.get(field)
+        if not isinstance(cond, dict):
+            if value != cond:
+                return False
+            continue
+        for op, arg in cond.items():
+            if op == "$exists" and (field in doc) != arg:
+                return False
+            if op == "$type" and not isinstance(value, datetime):
+                return False
+            if op == "$gte" and not (value is not None and value >= arg):
+                return False
+            if op == "$lt" and not (value is not None and value < arg):
+                return False
+    return True
+
+
+class Cursor(list):
+    def sort(self, field, direction=1):
+        return Cursor(sorted(self, key=lambda doc: doc[field], reverse=direction < 0))
+
+
+class FakeAttendance:
+    """
+    Just enough of the attendance collection, including the unique
+    (roll, hour_bucket) index. `errors` (op index -> code) makes the next
+    bulk write fail like Mongo would; `down` makes every write raise.
+    """
+
+    def __init__(self, docs=(), errors=None, down=False):
+        self.docs = [dict(doc, _id=i) for i, doc in enumerate(docs)]
+        self.errors = dict(errors or {})
+        self.down = down
+        self.writes = []
+        self.updates = 0
+
+    def _taken(self, doc, bucket):
+        return any(other is not doc and other.get("roll") == doc.get("roll") and other.get("hour_bucket") == bucket
+                   for other in self.docs)
+
+    def _apply(self, query, update, upsert):
+        """(upserted_id, duplicate) for one update."""
+        if self.down:
+            raise ConnectionError("no primary")
+        self.updates += 1
+        doc = next((d for d in self.docs if _matches(d, query)), None)
+        if doc is None:
+            if not upsert:
+                return None, False
+            doc = dict(query, **update.get("$setOnInsert", {}), _id=len(self.docs))
+            if self._taken(doc, doc.get("hour_bucket")):
+                return None, True
+            self.docs.append(doc)
+            return doc["_id"], False
+        changes = update.get("$set", {})
+        if "hour_bucket" in changes and self._taken(doc, changes["hour_bucket"]):
+            return None, True
+        doc.update(changes)
+        return None, False
+
+    def update_one(self, query, update, upsert=False):
+        upserted_id, _ = self._apply(query, update, upsert)
+        return SimpleNamespace(upserted_id=upserted_id)
+
+    def bulk_write(self, ops, ordered=True):
+        batch = [(op._filter, op._doc, bool(getattr(op, "_upsert", False))) for op in ops]
+        self.writes.append(batch)
+        errors, self.errors = self.errors, {}
+        upserted = modified = 0
+        for i, (query, update, upsert) in enumerate(batch):
+            if i in errors:
+                continue
+            upserted_id, duplicate = self._apply(query, update, upsert)
+            if duplicate:
+                errors[i] = 11000
+            elif upserted_id is not None:
+                upserted += 1
+            elif "$set" in update:
+                modified += 1
+        if errors:
+            raise BulkWriteError({
+                "nUpserted": upserted, "nModified": modified,
+                "writeErrors": [{"index": i, "code": code, "errmsg": f"E{code}"} for i, code in sorted(errors.items())],
+            })
+        return SimpleNamespace(upserted_count=upserted, modified_count=modified)
+
+    def find(self, query, projection=None):
+        return Cursor(dict(doc) for doc in self.docs if _matches(doc, query))
+
+    def records(self, roll):
+        return [doc for doc in self.docs if doc["roll"] == roll]
+
+
+class Clock:
+    """Stands in for datetime.now() and time.monotonic() in attendance_store."""
+
+    def __init__(self, now):
+        self.now = now
+        self.monotonic = 0.0
+
+    def advance(self, **delta):
+        self.now += timedelta(**delta)
+        self.monotonic += timedelta(**delta).total_seconds()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock(NOW)
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return clock.now
+
+    monkeypatch.setattr(attendance_store, "datetime", FrozenDatetime)
+    monkeypatch.setattr(attendance_store.time, "monotonic", lambda: clock.monotonic)
+    return clock
+
+
+def test_hour_bucket():
+    assert hour_bucket(datetime(2024, 5, 1, 9, 59, 59, 999999)) == datetime(2024, 5, 1, 9)
+    assert hour_bucket(datetime(2024, 5, 1, 10)) == datetime(2024, 5, 1, 10)
+
+
+def test_mark_attendance_once_per_hour():
+    col = FakeAttendance()
+    assert mark_attendance(col, "R1", "A", datetime(2024, 5, 1, 9, 5), confidence=91.0, source="rtsp")
+    assert not mark_attendance(col, "R1", "A", datetime(2024, 5, 1, 9, 55), confidence=99.0)
+    assert mark_attendance(col, "R1", "A", datetime(2024, 5, 1, 10, 0))
+    first, second = col.records("R1")
+    # the first sighting's details are kept
+    assert first == {"_id": 0, "roll": "R1", "hour_bucket": datetime(2024, 5, 1, 9), "name": "A",
+                     "timestamp": datetime(2024, 5, 1, 9, 5), "confidence": 91.0, "source": "rtsp"}
+    assert second["hour_bucket"] == datetime(2024, 5, 1, 10)
+
+
+def test_concurrent_duplicate_is_not_an_error():
+    class Racing(FakeAttendance):
+        def update_one(self, query, update, upsert=False):
+            raise DuplicateKeyError("E11000 duplicate key")
+
+    assert not mark_attendance(Racing(), "R1", "A", NOW)
+
+
+def test_marked_cache_skips_rolls_marked_this_hour(clock):
+    col = FakeAttendance()
+    cache = MarkedCache(col, refresh_s=0)
+    assert cache.mark("R1", "A", NOW)
+    assert not cache.mark("R1", "A", NOW + timedelta(minutes=5))
+    assert cache.is_marked("R1", NOW)
+    assert col.updates == 1
+    assert cache.status()["hits"] == 1 and cache.status()["writes"] == 1
+
+
+def test_marked_cache_is_seeded_from_the_database(clock):
+    col = FakeAttendance([{"roll": "R1", "timestamp": NOW - timedelta(minutes=20), "hour_bucket": hour_bucket(NOW)},
+                          {"roll": "R2", "timestamp": NOW - timedelta(hours=1), "hour_bucket": hour_bucket(NOW) -
+                           timedelta(hours=1)}])
+    cache = MarkedCache(col, refresh_s=0)
+    assert not cache.mark("R1", "A", NOW)
+    assert col.updates == 0
+    assert cache.mark("R2", "B", NOW)
+
+
+def test_marked_cache_rolls_over_with_the_hour(clock):
+    col = FakeAttendance()
+    cache = MarkedCache(col, refresh_s=0)
+    cache.mark("R1", "A", NOW)
+    clock.advance(hours=1)
+    assert not cache.is_marked("R1", clock.now)
+    assert cache.mark("R1", "A", clock.now)
+    assert len(col.records("R1")) == 2
+    assert cache.status()["seeds"] == 2
+
+
+def test_other_hours_bypass_the_cache(clock):
+    col = FakeAttendance()
+    cache = MarkedCache(col, refresh_s=0)
+    earlier = NOW - timedelta(days=1)
+    assert cache.mark("R1", "A", earlier)
+    assert not cache.mark("R1", "A", earlier)
+    assert col.updates == 2
+    assert not cache.is_marked("R1", earlier)
+
+
+def test_invalidate_forgets_a_cleared_hour(clock):
+    col = FakeAttendance()
+    cache = MarkedCache(col, refresh_s=0)
+    cache.mark("R1", "A", NOW)
+    col.docs.clear()  # /attendance/clear_hour
+    cache.invalidate(NOW - timedelta(hours=2))
+    assert cache.is_marked("R1", NOW)
+    cache.invalidate(NOW)
+    assert cache.mark("R1", "A", NOW)
+
+
+def test_other_processes_reseed_every_refresh_s(clock):
+    col = FakeAttendance()
+    cache = MarkedCache(col, refresh_s=60)
+    cache.mark("R1", "A", NOW)
+    col.docs.clear()  # cleared by the API process
+    clock.advance(seconds=30)
+    assert cache.is_marked("R1", clock.now)
+    clock.advance(seconds=30)
+    assert not cache.is_marked("R1", clock.now)
+
+
+def test_queue_goes_through_the_writer(clock):
+    col = FakeAttendance()
+    writer = AttendanceWriter(col)
+    cache = MarkedCache(col, refresh_s=0, writer=writer)
+    assert cache.queue("R1", "A", NOW, source="rtsp")
+    assert not cache.queue("R1", "A", NOW)
+    assert col.updates == 0
+    writer.flush()
+    assert [doc["roll"] for doc in col.docs] == ["R1"]
+
+
+def test_failed_queued_write_is_retried_on_the_next_sighting(clock):
+    col = FakeAttendance(down=True)
+    writer = AttendanceWriter(col)
+    cache = MarkedCache(col, refresh_s=0, writer=writer)
+    assert cache.queue("R1", "A", NOW)
+    writer.flush()
+    assert not cache.is_marked("R1", NOW)
+    col.down = False
+    assert cache.queue("R1", "A", NOW)
+    writer.flush()
+    assert len(col.records("R1")) == 1
+
+
+def test_refused_queue_writes_directly(clock):
+    col = FakeAttendance()
+    full = AttendanceWriter(col, max_batch=1, max_queue=1)
+    full.add("R0", "Z", NOW)
+    stopped = AttendanceWriter(col)
+    stopped.stop()
+    for roll, writer in (("R1", full), ("R2", stopped)):
+        cache = MarkedCache(col, refresh_s=0, writer=writer)
+        assert cache.queue(roll, "A", NOW)
+        assert len(col.records(roll)) == 1
+        assert cache.is_marked(roll, NOW)
+
+
+def test_writer_upserts_once_per_roll_and_hour():
+    col = FakeAttendance()
+    writer = AttendanceWriter(col)
+    writer.add("R1", "A", datetime(2024, 5, 1, 9, 5), {"camera_id": "cam1"})
+    writer.add("R1", "A", datetime(2024, 5, 1, 9, 40), {"camera_id": "cam2"})
+    writer.add("R1", "A", datetime(2024, 5, 1, 10, 1))
+    writer.add("R2", "B", datetime(2024, 5, 1, 9, 50))
+    writer.flush()
+
+    assert len(col.writes) == 1
+    assert [query for query, _, _ in col.writes[0]] == [
+        {"roll": "R1", "hour_bucket": datetime(2024, 5, 1, 9)},
+        {"roll": "R1", "hour_bucket": datetime(2024, 5, 1, 10)},
+        {"roll": "R2", "hour_bucket": datetime(2024, 5, 1, 9)},
+    ]
+    # the first sighting in the hour wins, and is only written if no record exists yet
+    assert col.writes[0][0][1] == {"$setOnInsert": {"name": "A", "timestamp": datetime(2024, 5, 1, 9, 5),
+                                                    "camera_id": "cam1"}}
+    status = writer.status()
+    assert status["queued"] == 4 and status["written"] == 3 and status["failed"] == 0
+    assert status["queue_depth"] == 0
+
+
+def test_duplicate_key_is_not_a_failure():
+    col = FakeAttendance(errors={0: 11000, 1: 121})
+    writer = AttendanceWriter(col)
+    failed = []
+    writer.on_failed = lambda roll, timestamp: failed.append(roll)
+    for roll in ("R1", "R2", "R3"):
+        writer.add(roll, roll, datetime(2024, 5, 1, 9))
+    writer.flush()
+
+    # R1 lost a race with another writer (already recorded); R2 really failed
+    assert failed == ["R2"]
+    status = writer.status()
+    assert status["written"] == 2 and status["failed"] == 1 and status["inserted"] == 1
+    assert status["last_error"] == "E121"
+
+
+def test_failed_bulk_write_reports_every_event():
+    writer = AttendanceWriter(FakeAttendance(down=True))
+    failed = []
+    writer.on_failed = lambda roll, timestamp: failed.append(roll)
+    writer.add("R1", "A", datetime(2024, 5, 1, 9))
+    writer.add("R2", "B", datetime(2024, 5, 1, 9))
+    writer.flush()
+    assert failed == ["R1", "R2"]
+    assert writer.status()["last_error"] == "no primary"
+
+
+def test_flush_writes_in_batches():
+    col = FakeAttendance()
+    writer = AttendanceWriter(col, max_batch=2)
+    for i in range(5):
+        writer.add(f"R{i}", "x", datetime(2024, 5, 1, 9))
+    writer.flush()
+    assert [len(ops) for ops in col.writes] == [2, 2, 1]
+
+
+def test_flush_thread_and_stop_drain_the_queue():
+    col = FakeAttendance()
+    writer = AttendanceWriter(col, flush_ms=10)
+    writer.start()
+    writer.add("R1", "A", NOW)
+    writer.add("R2", "B", NOW)
+    writer.stop()
+    assert sorted(doc["roll"] for doc in col.docs) == ["R1", "R2"]
+    assert not writer.add("R3", "C", NOW)
+
+
+def test_flush_waits_for_a_batch_being_written():
+    class Slow(FakeAttendance):
+        def bulk_write(self, ops, ordered=True):
+            writing.set()
+            time.sleep(0.2)
+            return super().bulk_write(ops, ordered)
+
+    writing = Event()
+    col = Slow()
+    writer = AttendanceWriter(col, flush_ms=10)
+    writer.start()
+    try:
+        writer.add("R1", "A", NOW)
+        assert writing.wait(5)
+        # the flush thread holds R1 and the queue is empty; flush() still waits for it
+        writer.flush()
+        assert [doc["roll"] for doc in col.docs] == ["R1"]
+    finally:
+        writer.stop()
+
+
+def test_full_queue_refuses_events():
+    writer = AttendanceWriter(FakeAttendance(), max_batch=1, max_queue=2)
+    assert writer.add("R1", "A", datetime(2024, 5, 1, 9))
+    assert writer.add("R2", "B", datetime(2024, 5, 1, 9))
+    assert not writer.add("R3", "C", datetime(2024, 5, 1, 9))
+    writer.stop()
+    assert writer.status()["written"] == 2
+
+
+def test_backfill_adds_hour_buckets_to_legacy_records():
+    col = FakeAttendance([
+        {"roll": "R1", "timestamp": datetime(2024, 5, 1, 9, 10)},
+        {"roll": "R1", "timestamp": datetime(2024, 5, 1, 9, 50)},  # second record in the same hour
+        {"roll": "R2", "timestamp": datetime(2024, 5, 1, 8, 5)},
+        {"roll": "R3", "timestamp": datetime(2024, 5, 1, 10, 0), "hour_bucket": datetime(2024, 5, 1, 10)},
+    ])
+    assert backfill_hour_buckets(col, batch_size=2) == (2, 1)
+    assert [doc.get("hour_bucket") for doc in col.docs] == [
+        datetime(2024, 5, 1, 9), None, datetime(2024, 5, 1, 8), datetime(2024, 5, 1, 10),
+    ]
+
+
+def test_backfill_since_and_dry_run():
+    col = FakeAttendance([
+        {"roll": "R1", "timestamp": datetime(2024, 5, 1, 8, 10)},
+        {"roll": "R2", "timestamp": datetime(2024, 5, 1, 9, 10)},
+    ])
+    assert backfill_hour_buckets(col, since=datetime(2024, 5, 1, 9), dry_run=True) == (1, 0)
+    assert all("hour_bucket" not in doc for doc in col.docs)
+    assert backfill_hour_buckets(col, since=datetime(2024, 5, 1, 9)) == (1, 0)
+    assert [doc.get("hour_bucket") for doc in col.docs] == [None, datetime(2024, 5, 1, 9)]
@@ -0,0 +1,159 @@
+"""Unit tests for controlling out-of-process RTSP workers through Mongo (no MongoDB)."""
+from datetime import datetime, timedelta
+from threading import Event
+
+import pytest
+
+pytest.importorskip("face_recognition")
+
+from camera_control import CameraAgent, RemoteCameraManager
+
+
+class FakeCollection:
+    def __init__(self, *docs):
+        self.docs = {doc["_id"]: dict(doc) for doc in docs}
+
+    def find_one(self, query, projection=None):
+        doc = self.docs.get(query["_id"])
+        return dict(doc) if doc else None
+
+    def find(self, query=None, projection=None):
+        ids = (query or {}).get("_id", {}).get("$in")
+        return [dict(doc) for key, doc in self.docs.items() if ids is None or key in ids]
+
+    def update_one(self, query, update, upsert=False):
+        doc = self.docs.setdefault(query["_id"], {"_id": query["_id"]})
+        doc.update(update["$set"])
+
+
+def _remote(*cameras, controls=()):
+    cameras = FakeCollection(*(cameras or ({"_id": "door"},)))
+    return RemoteCameraManager(cameras, FakeCollection(*controls))
+
+
+def _heartbeat(camera_id, running=True, age_s=1, desired="running"):
+    return {"_id": camera_id, "desired": desired, "heartbeat_at": datetime.now() - timedelta(seconds=age_s),
+            "status": {"running": running, "frames_dropped": 3}, "pid": 42}
+
+
+def test_remote_start_and_stop_record_commands():
+    manager = _remote()
+    assert manager.start("door")
+    assert manager.control_col.docs["door"]["desired"] == "running"
+    # not running until a worker process reports so
+    assert not manager.is_running("door")
+    assert not manager.stop("door")
+    assert manager.control_col.docs["door"]["desired"] == "stopped"
+    with pytest.raises(KeyError):
+        manager.start("roof")
+
+
+def test_remote_status_follows_heartbeats():
+    manager = _remote(controls=[_heartbeat("door")])
+    assert manager.is_running("door")
+    assert not manager.start("door")
+    status = manager.status("door")
+    assert status["worker_online"] and status["worker_pid"] == 42 and status["frames_dropped"] == 3
+
+    manager.control_col.docs["door"]["heartbeat_at"] -= timedelta(seconds=60)
+    status = manager.status("door")
+    assert not manager.is_running("door")
+    assert not status["worker_online"] and not status["running"] and "frames_dropped" not in status
+
+
+def test_remote_restart_keeps_a_stopped_camera_stopped():
+    manager = _remote(controls=[_heartbeat("door", running=False, desired="stopped")])
+    assert not manager.restart("door")
+    control = manager.control_col.docs["door"]
+    assert control["desired"] == "stopped" and control["restart_at"] is not None
+
+    manager.control_col.docs["door"]["desired"] = "running"
+    assert manager.restart("door")
+
+
+def test_remote_restart_stops_a_disabled_camera():
+    manager = _remote({"_id": "door", "enabled": False}, controls=[_heartbeat("door")])
+    assert not manager.restart("door")
+    assert manager.control_col.docs["door"]["desired"] == "stopped"
+
+
+class FakeManager:
+    def __init__(self):
+        self.workers = {}
+        self.calls = []
+
+    def start(self, camera_id):
+        self.calls.append(("start", camera_id))
+        if camera_id in self.workers:
+            return False
+        self.workers[camera_id] = True
+        return True
+
+    def stop(self, camera_id):
+        self.calls.append(("stop", camera_id))
+        return self.workers.pop(camera_id, None) is not None
+
+    def set_schedule(self, camera_id, bounds):
+        self.calls.append(("schedule", camera_id))
+
+    def status(self, camera_id):
+        return {"running": camera_id in self.workers}
+
+
+def _agent(cameras, controls=()):
+    # skip __init__: no gallery, pool or writer needed to apply commands
+    agent = CameraAgent.__new__(CameraAgent)
+    agent.cameras_col = FakeCollection(*cameras)
+    agent.control_col = FakeCollection(*controls)
+    agent.camera_ids = []
+    agent.host = "test"
+    agent.stop_event = Event()
+    agent._applied_restart = {}
+    agent._applied_schedule = {}
+    agent.manager = FakeManager()
+    return agent
+
+
+def test_agent_follows_enabled_without_a_command():
+    agent = _agent([{"_id": "door"}, {"_id": "lab", "enabled": False}])
+    for camera in agent._cameras():
+        agent._apply(camera)
+    assert agent.manager.workers == {"door": True}
+    beat = agent.control_col.docs["door"]
+    assert beat["status"] == {"running": True} and beat["host"] == "test"
+    assert agent.control_col.docs["lab"]["status"] == {"running": False}
+
+
+def test_agent_restarts_once_per_restart_command():
+    restart_at = datetime(2024, 5, 1, 9)
+    agent = _agent([{"_id": "door"}], [{"_id": "door", "desired": "running", "restart_at": restart_at}])
+    camera = agent._cameras()[0]
+    agent._apply(camera)
+    agent._apply(camera)
+    # the first command predates this process: nothing to restart
+    assert ("stop", "door") not in agent.manager.calls
+
+    agent.control_col.docs["door"]["restart_at"] = restart_at + timedelta(minutes=5)
+    agent._apply(camera)
+    agent._apply(camera)
+    assert agent.manager.calls.count(("stop", "door")) == 1
+    assert agent.manager.workers == {"door": True}
+
+
+def test_agent_stops_cameras_told_to_stop():
+    agent = _agent([{"_id": "door"}])
+    camera = agent._cameras()[0]
+    agent._apply(camera)
+    agent.control_col.docs["door"]["desired"] = "stopped"
+    agent._apply(camera)
+    assert agent.manager.workers == {}
+
+
+def test_agent_applies_edited_schedules_without_a_restart():
+    agent = _agent([{"_id": "door", "schedule": {"max_interval_ms": 4000}}])
+    agent._apply(agent._cameras()[0])
+    agent._apply(agent._cameras()[0])
+    agent.cameras_col.docs["door"]["schedule"] = {"max_interval_ms": 2000}
+    agent._apply(agent._cameras()[0])
+    assert agent.manager.calls.count(("schedule", "door")) == 2
+    assert ("stop", "door") not in agent.manager.calls
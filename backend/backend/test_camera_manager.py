@@ -0,0 +1,128 @@
+"""Unit tests for running one RTSP worker per camera (no cameras, no MongoDB)."""
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("face_recognition")
+
+import camera_manager
+from camera_manager import CameraManager, camera_settings
+
+
+class FakeWorker:
+    def __init__(self, rtsp_url, mongo_db, camera_id=None, **kwargs):
+        self.rtsp_url = rtsp_url
+        self.camera_id = camera_id
+        self.kwargs = kwargs
+        self.thread = None
+        self.running = False
+        self.stop_event = SimpleNamespace(set=lambda: None)
+
+    def start(self):
+        self.running = True
+        self.thread = SimpleNamespace(is_alive=lambda: self.running)
+        return True
+
+    def stop(self):
+        self.running = False
+
+    def status(self):
+        return {"running": self.running, "last_error": None}
+
+
+class FakeCameras:
+    def __init__(self, *cameras):
+        self.cameras = {camera["_id"]: dict(camera) for camera in cameras}
+
+    def find_one(self, query, projection=None):
+        camera = self.cameras.get(query["_id"])
+        return dict(camera) if camera else None
+
+    def find(self, query=None, projection=None):
+        if query and "enabled" in query:
+            return [dict(c) for c in self.cameras.values() if c.get("enabled", True) is not False]
+        return [dict(c) for c in self.cameras.values()]
+
+
+@pytest.fixture
+def cameras(monkeypatch):
+    monkeypatch.setattr(camera_manager, "RtspAttendanceWorker", FakeWorker)
+    return FakeCameras(
+        {"_id": "door", "name": "Door", "rtsp_url": "rtsp://door", "interval_ms": 500},
+        {"_id": "hall", "name": "Hall", "rtsp_url": "rtsp://hall", "schedule": {"max_interval_ms": 4000}},
+        {"_id": "lab", "name": "Lab", "rtsp_url": "rtsp://lab", "enabled": False},
+    )
+
+
+def _manager(cameras):
+    defaults = {"interval_ms": 1000, "frame_skip": 2, "schedule": {"enabled": True, "max_interval_ms": 8000}}
+    manager = CameraManager(cameras, {"students": None}, gallery=None, defaults=defaults)
+    manager.gallery_sync = SimpleNamespace(start=lambda: None, stop=lambda: None, status=lambda: {})
+    return manager
+
+
+def test_enabled_cameras_start_with_their_own_settings(cameras):
+    manager = _manager(cameras)
+    assert sorted(manager.start_enabled()) == ["door", "hall"]
+    door, hall = manager.workers["door"], manager.workers["hall"]
+    assert door.rtsp_url == "rtsp://door" and door.kwargs["interval_ms"] == 500
+    assert hall.kwargs["interval_ms"] == 1000 and hall.kwargs["frame_skip"] == 2
+    # scheduler bounds are merged field by field
+    assert hall.kwargs["schedule"] == {"enabled": True, "max_interval_ms": 4000}
+    assert manager.is_running("door") and not manager.is_running("lab")
+
+
+def test_start_is_idempotent_and_rejects_unknown_cameras(cameras):
+    manager = _manager(cameras)
+    assert manager.start("door")
+    assert not manager.start("door")
+    with pytest.raises(KeyError):
+        manager.start("roof")
+
+
+def test_restart_applies_edited_settings(cameras):
+    manager = _manager(cameras)
+    manager.start("door")
+    old = manager.workers["door"]
+    cameras.cameras["door"]["interval_ms"] = 250
+    assert manager.restart("door")
+    assert not old.running
+    assert manager.workers["door"].kwargs["interval_ms"] == 250
+
+
+def test_restart_stops_a_disabled_camera(cameras):
+    manager = _manager(cameras)
+    manager.start("door")
+    cameras.cameras["door"]["enabled"] = False
+    assert not manager.restart("door")
+    assert not manager.is_running("door") and "door" not in manager.workers
+
+
+def test_restart_keeps_a_stopped_camera_stopped(cameras):
+    manager = _manager(cameras)
+    manager.start("door")
+    manager.stop("door")
+    cameras.cameras["door"]["interval_ms"] = 250
+    assert not manager.restart("door")
+    assert "door" not in manager.workers
+
+
+def test_status_all_lists_every_camera(cameras):
+    manager = _manager(cameras)
+    manager.start("door")
+    status = manager.status_all()
+    assert status["running"] == 1
+    assert [(c["camera_id"], c["running"]) for c in status["cameras"]] == [
+        ("door", True), ("hall", False), ("lab", False)
+    ]
+    manager.stop_all()
+    assert not manager.workers
+
+
+def test_camera_settings_are_validated():
+    assert camera_settings({"interval_ms": "750", "enabled": "no", "name": None}) == {
+        "interval_ms": 750, "enabled": False, "name": None
+    }
+    for bad in ({"speed": 1}, {"interval_ms": "fast"}, {"detect_scale": 2}):
+        with pytest.raises(ValueError):
+            camera_settings(bad)
@@ -0,0 +1,84 @@
+"""Unit tests for the bounded compute pool (429 when full, 503 on timeout)."""
+import asyncio
+import operator
+import time
+
+import pytest
+
+from compute_pool import ComputePool, PoolBusy, PoolTimeout
+
+
+@pytest.fixture
+def pool():
+    pool = ComputePool(workers=1, max_pending=0, timeout_s=5)
+    yield pool
+    pool.shutdown()
+
+
+def test_run_sync_returns_the_result(pool):
+    assert pool.run_sync(operator.add, 2, 3) == 5
+    assert pool.status()["submitted"] == 1
+
+
+def test_run_awaits_the_result(pool):
+    assert asyncio.run(pool.run(operator.mul, 6, 7)) == 42
+
+
+def test_worker_errors_reach_the_caller(pool):
+    with pytest.raises(ZeroDivisionError):
+        pool.run_sync(operator.truediv, 1, 0)
+    # the slot is freed after a failed job
+    assert pool.run_sync(operator.add, 1, 1) == 2
+
+
+def test_full_pool_rejects_instead_of_queueing(pool):
+    future = pool.submit(time.sleep, 0.5)
+    with pytest.raises(PoolBusy):
+        pool.submit(operator.add, 1, 1)
+    assert pool.status()["rejected"] == 1
+    future.result(timeout=10)
+    # a finished job gives its slot back
+    assert pool.run_sync(operator.add, 1, 1) == 2
+    assert pool.status()["in_flight"] == 0
+
+
+def test_waiting_room_takes_max_pending_jobs():
+    pool = ComputePool(workers=1, max_pending=1, timeout_s=5)
+    try:
+        running = pool.submit(time.sleep, 0.3)
+        waiting = pool.submit(operator.add, 1, 2)
+        with pytest.raises(PoolBusy):
+            pool.submit(operator.add, 1, 1)
+        assert waiting.result(timeout=10) == 3
+        running.result(timeout=10)
+    finally:
+        pool.shutdown()
+
+
+def test_slow_job_times_out():
+    pool = ComputePool(workers=1, max_pending=1, timeout_s=0.2)
+    try:
+        pool.run_sync(operator.add, 0, 0)  # start the worker process first
+        with pytest.raises(PoolTimeout):
+            pool.run_sync(time.sleep, 1)
+        with pytest.raises(PoolTimeout):
+            asyncio.run(pool.run(time.sleep, 1))
+        assert pool.status()["timed_out"] == 2
+    finally:
+        pool.shutdown()
+
+
+def test_stuck_job_gives_its_capacity_back():
+    pool = ComputePool(workers=1, max_pending=0, timeout_s=0.5)
+    try:
+        pool.run_sync(operator.add, 0, 0)
+        with pytest.raises(PoolTimeout):
+            pool.run_sync(time.sleep, 60)
+        # the stuck worker is killed, which frees its slot
+        deadline = time.monotonic() + 10
+        while pool.status()["in_flight"] and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert pool.run_sync(operator.add, 1, 1) == 2
+        assert pool.status()["recycled"] == 1 and pool.status()["in_flight"] == 0
+    finally:
+        pool.shutdown()
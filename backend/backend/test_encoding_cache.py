@@ -0,0 +1,98 @@
+"""Unit tests for the upload detection cache (LRU, TTL and the disk tier)."""
+import numpy as np
+import pytest
+
+import encoding_cache
+from encoding_cache import EncodingCache, cache_key
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(encoding_cache.time, "time", clock)
+    return clock
+
+
+def _result(seed):
+    rng = np.random.default_rng(seed)
+    return [(10, 60, 50, 20)], [rng.normal(size=128)]
+
+
+def test_cache_key_covers_the_detection_settings():
+    image = b"jpeg bytes"
+    assert cache_key(image) == cache_key(image, upsample=1, scale=1)
+    assert len({cache_key(image), cache_key(image, upsample=2), cache_key(image, scale=0.5),
+                cache_key(b"other bytes")}) == 4
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = EncodingCache(max_entries=2, ttl_s=60)
+    cache.put("a", _result(1))
+    cache.put("b", _result(2))
+    assert cache.get("a") is not None  # a is now the most recent
+    cache.put("c", _result(3))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    status = cache.status()
+    assert status["evictions"] == 1 and status["entries"] == 2
+    assert status["hits"] == 3 and status["misses"] == 1 and status["hit_rate"] == 0.75
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = EncodingCache(max_entries=10, ttl_s=60)
+    cache.put("a", _result(1))
+    clock.now += 60
+    assert cache.get("a") is not None
+    clock.now += 1
+    assert cache.get("a", "missing") == "missing"
+    assert cache.status()["entries"] == 0
+
+
+def test_zero_ttl_never_expires(clock):
+    cache = EncodingCache(max_entries=10, ttl_s=0)
+    cache.put("a", _result(1))
+    clock.now += 10 ** 6
+    assert cache.get("a") is not None
+
+
+def test_not_an_image_is_cached_in_memory():
+    cache = EncodingCache(max_entries=10)
+    cache.put("a", None)
+    assert cache.get("a", "missing") is None
+
+
+def test_zero_entries_disables_the_memory_tier():
+    cache = EncodingCache(max_entries=0)
+    cache.put("a", _result(1))
+    assert cache.get("a") is None
+
+
+def test_disk_tier_survives_a_restart(tmp_path, clock):
+    locations, encodings = _result(1)
+    EncodingCache(max_entries=10, disk_dir=str(tmp_path)).put("a", (locations, encodings))
+    EncodingCache(max_entries=10, disk_dir=str(tmp_path)).put("none", None)
+
+    cache = EncodingCache(max_entries=10, ttl_s=60, disk_dir=str(tmp_path))
+    cached_locations, cached_encodings = cache.get("a")
+    assert cached_locations == locations
+    np.testing.assert_array_equal(cached_encodings[0], encodings[0])
+    assert cache.get("none", "missing") == "missing"
+    assert cache.status()["disk_hits"] == 1
+    # now in memory too
+    assert cache.get("a") is not None and cache.status()["hits"] == 1
+
+
+def test_expired_disk_entries_are_removed(tmp_path, clock, monkeypatch):
+    EncodingCache(disk_dir=str(tmp_path)).put("a", _result(1))
+    monkeypatch.setattr(encoding_cache.os.path, "getmtime", lambda path: clock.now - 120)
+    cache = EncodingCache(ttl_s=60, disk_dir=str(tmp_path))
+    assert cache.get("a") is None
+    assert not list(tmp_path.glob("*.npz"))
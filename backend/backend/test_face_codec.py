@@ -0,0 +1,39 @@
+"""Unit tests for the stored face encoding format."""
+import numpy as np
+from bson import BSON
+from bson.binary import Binary
+
+from face_codec import encoding_to_list, pack_encoding, unpack_encoding
+
+
+def test_round_trip_is_exact_float32():
+    encoding = np.random.default_rng(0).normal(size=128)
+    packed = pack_encoding(encoding)
+    assert isinstance(packed, Binary)
+    assert len(packed) == 512
+    np.testing.assert_array_equal(unpack_encoding(packed), encoding.astype(np.float32))
+
+
+def test_round_trip_through_bson():
+    encoding = np.linspace(-1, 1, 128, dtype=np.float32)
+    doc = BSON.encode({"face_encoding": pack_encoding(encoding)}).decode()
+    np.testing.assert_array_equal(unpack_encoding(doc["face_encoding"]), encoding)
+
+
+def test_unpack_is_zero_copy_and_read_only():
+    unpacked = unpack_encoding(pack_encoding(np.ones(128)))
+    assert unpacked.dtype == np.float32
+    assert not unpacked.flags.writeable
+
+
+def test_legacy_list_is_accepted():
+    legacy = [0.5] * 128
+    unpacked = unpack_encoding(legacy)
+    assert unpacked.dtype == np.float32
+    assert unpacked.shape == (128,)
+    assert encoding_to_list(legacy) == legacy
+
+
+def test_encoding_to_list():
+    encoding = np.arange(128, dtype=np.float32) / 128
+    assert encoding_to_list(pack_encoding(encoding)) == encoding.tolist()
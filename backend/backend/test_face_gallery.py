@@ -0,0 +1,203 @@
+"""Unit tests for in-memory gallery matching (no MongoDB, no dlib)."""
+import numpy as np
+import pytest
+
+from face_codec import pack_encoding
+from face_gallery import FaceGallery, make_scope
+
+RNG = np.random.default_rng(7)
+# far apart (distance ~1.6) compared to the 0.25 tolerance
+ENCODINGS = RNG.normal(scale=0.1, size=(6, 128)).astype(np.float32)
+
+
+def _student(i, section="A", samples=None):
+    doc = {"_id": f"id{i}", "roll": f"R{i}", "name": f"Student {i}", "section": section,
+           "face_encoding": pack_encoding(ENCODINGS[i])}
+    if samples is not None:
+        doc["face_samples"] = [pack_encoding(s) for s in samples]
+    return doc
+
+
+def _near(i, distance):
+    """A probe `distance` away from student i."""
+    direction = RNG.normal(size=128)
+    return ENCODINGS[i] + (distance * direction / np.linalg.norm(direction)).astype(np.float32)
+
+
+def _gallery(students=None, **kwargs):
+    gallery = FaceGallery(snapshot_dir="", **kwargs)
+    if students is None:
+        students = [_student(i, section="A" if i < 3 else "B") for i in range(6)]
+    gallery.load(students, publish=False)
+    return gallery
+
+
+def test_match_finds_the_nearest_student():
+    gallery = _gallery()
+    results = gallery.match(np.stack([_near(2, 0.05), _near(4, 0.1)]))
+    assert [r["roll"] for r in results] == ["R2", "R4"]
+    assert results[0]["distance"] == pytest.approx(0.05, abs=1e-4)
+    assert results[0]["confidence"] == pytest.approx(95.0, abs=0.01)
+    assert results[1]["_id"] == "id4" and results[1]["name"] == "Student 4"
+
+
+def test_match_rejects_strangers_and_low_confidence():
+    gallery = _gallery()
+    stranger = RNG.normal(scale=0.1, size=128).astype(np.float32)
+    assert gallery.match(stranger)[0]["roll"] is None
+    # within tolerance, below the confidence bar
+    result = gallery.match(_near(1, 0.2), confidence_threshold=85)[0]
+    assert result["roll"] is None
+    assert result["distance"] == pytest.approx(0.2, abs=1e-4)
+
+
+def test_match_uses_the_nearest_enrolment_sample():
+    other = _near(0, 0.6)
+    gallery = _gallery([_student(0, samples=[ENCODINGS[0], other]), _student(1)])
+    result = gallery.match(other + 0.001)[0]
+    assert result["roll"] == "R0"
+    assert result["distance"] < 0.05
+
+
+def test_students_without_a_usable_encoding_are_skipped():
+    broken = [{"roll": "X1", "name": "x", "face_encoding": [0.1] * 64}, {"roll": "X2", "name": "y"}]
+    gallery = _gallery([_student(0), *broken])
+    assert len(gallery) == 1 and gallery.rolls == ["R0"]
+
+
+def test_empty_gallery():
+    gallery = _gallery([])
+    assert gallery.match(ENCODINGS[0]) == [{"roll": None, "distance": float("inf")}]
+    assert gallery.assign(ENCODINGS[:2])[1]["roll"] is None
+
+
+def test_assign_gives_each_student_to_one_face():
+    gallery = _gallery()
+    close, farther = _near(0, 0.05), _near(0, 0.15)
+    # match() lets both faces claim R0; assign() only the closer one
+    assert [r["roll"] for r in gallery.match(np.stack([farther, close]))] == ["R0", "R0"]
+    for probes, expected in (([farther, close], [None, "R0"]), ([close, farther], ["R0", None])):
+        results = gallery.assign(np.stack(probes))
+        assert [r["roll"] for r in results] == expected
+    unmatched = gallery.assign(np.stack([farther, close]))[0]
+    assert unmatched["distance"] == pytest.approx(0.15, abs=1e-4)
+
+
+def test_assign_matches_several_students():
+    gallery = _gallery()
+    probes = np.stack([_near(i, 0.05) for i in (5, 3, 1)])
+    assert [r["roll"] for r in gallery.assign(probes)] == ["R5", "R3", "R1"]
+
+
+def test_scope_limits_the_search():
+    gallery = _gallery()
+    probes = np.stack([_near(1, 0.05), _near(4, 0.05)])
+    scope = make_scope(section="A")
+    for method in (gallery.match, gallery.assign):
+        assert [r["roll"] for r in method(probes, scope=scope)] == ["R1", None]
+        assert [r["roll"] for r in method(probes, scope=make_scope(section="B"))] == [None, "R4"]
+        assert [r["roll"] for r in method(probes, scope=make_scope(section="C"))] == [None, None]
+
+
+def test_scope_fallback_searches_everyone_for_misses():
+    gallery = _gallery()
+    probes = np.stack([_near(1, 0.05), _near(4, 0.05)])
+    scope = make_scope(section="A")
+    for method in (gallery.match, gallery.assign):
+        assert [r["roll"] for r in method(probes, scope=scope, fallback=True)] == ["R1", "R4"]
+
+
+def test_assign_fallback_never_reuses_a_student():
+    gallery = _gallery()
+    # both faces are nearest to R1 (section A); the second misses in section B and falls back
+    probes = np.stack([_near(1, 0.05), _near(1, 0.1)])
+    results = gallery.assign(probes, scope=make_scope(section="A"), fallback=True)
+    assert [r["roll"] for r in results] == ["R1", None]
+
+
+def test_make_scope():
+    assert make_scope() is None
+    assert make_scope({"section": "", "unknown": "x"}) is None
+    assert make_scope({"section": "A"}, department="CSE") == {"department": "CSE", "section": "A"}
+
+
+def test_upsert_and_remove():
+    gallery = _gallery([_student(i) for i in range(3)])
+    gallery.upsert(_student(3))
+    assert len(gallery) == 4
+    assert gallery.match(_near(3, 0.05))[0]["roll"] == "R3"
+
+    moved = dict(_student(0), face_encoding=pack_encoding(ENCODINGS[5]))
+    gallery.upsert(moved)
+    assert len(gallery) == 4
+    assert gallery.match(_near(5, 0.05))[0]["roll"] == "R0"
+    assert gallery.match(_near(0, 0.05))[0]["roll"] is None
+
+    assert gallery.remove("id3")
+    assert not gallery.remove("id3")
+    assert gallery.match(_near(3, 0.05))[0]["roll"] is None
+
+
+def _wait_for_retrain(gallery):
+    thread = gallery._retrain_thread
+    if thread is not None:
+        thread.join(timeout=10)
+
+
+def test_ann_index_gives_the_same_matches_as_exact_search():
+    rng = np.random.default_rng(1)
+    encodings = rng.normal(scale=0.1, size=(400, 128)).astype(np.float32)
+    students = [{"_id": f"id{i}", "roll": f"R{i}", "name": str(i), "face_encoding": pack_encoding(e)}
+                for i, e in enumerate(encodings)]
+    indexed, exact = _gallery(students, ann_min_size=100), _gallery(students, ann_min_size=0)
+    assert indexed.index is not None and exact.index is None
+    probes = encodings[:100] + rng.normal(scale=0.005, size=(100, 128)).astype(np.float32)
+    assert [r["roll"] for r in indexed.match(probes)] == [r["roll"] for r in exact.match(probes)]
+    assert [r["roll"] for r in indexed.match(probes)] == [f"R{i}" for i in range(100)]
+
+
+def test_ann_index_follows_the_gallery_size():
+    rng = np.random.default_rng(2)
+    encodings = rng.normal(scale=0.1, size=(30, 128)).astype(np.float32)
+    students = [{"_id": f"id{i}", "roll": f"R{i}", "name": str(i), "face_encoding": pack_encoding(e)}
+                for i, e in enumerate(encodings)]
+    gallery = _gallery(students[:19], ann_min_size=20, ann_retrain_after=0.2)
+    assert gallery.index is None
+
+    gallery.upsert(students[19])
+    _wait_for_retrain(gallery)
+    assert gallery.index is not None and gallery.index.trained_size == 20
+
+    # a fifth of the trained size in incremental changes re-clusters it
+    for student in students[20:24]:
+        gallery.upsert(student)
+    _wait_for_retrain(gallery)
+    assert gallery.index.trained_size == 24 and gallery.index.changes == 0
+
+    for i in range(5):
+        gallery.remove(f"id{i}")
+    assert gallery.index is None
+    assert gallery.match(encodings[10])[0]["roll"] == "R10"
+
+
+def test_retrain_keeps_changes_made_while_it_builds():
+    rng = np.random.default_rng(3)
+    encodings = rng.normal(scale=0.1, size=(30, 128)).astype(np.float32)
+    students = [{"_id": f"id{i}", "roll": f"R{i}", "name": str(i), "face_encoding": pack_encoding(e)}
+                for i, e in enumerate(encodings)]
+    gallery = _gallery(students[:25], ann_min_size=20)
+    build = gallery._build_index
+
+    def build_while_changing(*args, **kwargs):
+        index = build(*args, **kwargs)
+        # the gallery is not locked while the new index is built
+        gallery.upsert(students[25])
+        gallery.remove("id0")
+        return index
+
+    gallery._build_index = build_while_changing
+    gallery._retrain()
+    assert gallery.index.trained_size == 25 and len(gallery.index) == 25
+    assert gallery.index.search(encodings[25], k=1)[0] == ["id25"]
+    assert "id0" not in gallery.index.search(encodings[0], k=25)[0]
+    assert gallery._retrain_log is None
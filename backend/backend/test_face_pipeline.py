@@ -0,0 +1,103 @@
+"""
+Unit tests for detection coordinates: downscaled detection and ROI crops
+must report boxes in full-frame pixels. dlib itself is replaced by a fake
+detector, but face_recognition has to be importable.
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip("face_recognition")
+
+import face_pipeline
+from roi import normalize_rois
+
+
+class FakeDetector:
+    """Returns fixed boxes (in the coordinates of the image it is given) and records what it saw."""
+
+    def __init__(self, boxes):
+        self.boxes = boxes
+        self.images = []
+
+    def __call__(self, image, number_of_times_to_upsample=1):
+        self.images.append(image.copy())
+        return list(self.boxes)
+
+
+@pytest.fixture
+def detector(monkeypatch):
+    def install(boxes):
+        fake = FakeDetector(boxes)
+        monkeypatch.setattr(face_pipeline.face_recognition, "face_locations", fake)
+        return fake
+    return install
+
+
+def _frame(height=200, width=400):
+    return np.full((height, width, 3), 200, dtype=np.uint8)
+
+
+def test_full_scale_boxes_are_unchanged(detector):
+    fake = detector([(10, 60, 50, 20)])
+    assert face_pipeline.detect_faces(_frame(), scale=1.0) == [(10, 60, 50, 20)]
+    assert fake.images[0].shape == (200, 400, 3)
+
+
+def test_downscaled_boxes_map_back_to_the_full_frame(detector):
+    fake = detector([(10, 60, 50, 20)])
+    assert face_pipeline.detect_faces(_frame(), scale=0.5) == [(20, 120, 100, 40)]
+    assert fake.images[0].shape == (100, 200, 3)
+
+
+def test_mapped_boxes_stay_inside_the_frame(detector):
+    detector([(-2, 210, 105, -3)])
+    assert face_pipeline.detect_faces(_frame(), scale=0.5) == [(0, 400, 200, 0)]
+
+
+def test_scale_is_clamped(detector):
+    fake = detector([])
+    face_pipeline.detect_faces(_frame(), scale=3)
+    face_pipeline.detect_faces(_frame(), scale=0.001)
+    assert fake.images[0].shape == (200, 400, 3)
+    assert fake.images[1].shape == (10, 20, 3)
+
+
+def test_encodings_use_the_full_resolution_frame(detector, monkeypatch):
+    detector([(10, 60, 50, 20)])
+    seen = []
+    monkeypatch.setattr(face_pipeline.face_recognition, "face_encodings",
+                        lambda image, locations: seen.append((image.shape, locations)) or [np.zeros(128)])
+    locations, encodings = face_pipeline.detect_and_encode_rgb(_frame(), scale=0.5)
+    assert seen == [((200, 400, 3), [(20, 120, 100, 40)])]
+    assert len(encodings) == 1
+
+
+def test_roi_boxes_map_back_to_the_full_frame(detector):
+    fake = detector([(10, 30, 40, 5)])
+    rois = normalize_rois([[0.5, 0.5, 1.0, 1.0]])
+    assert face_pipeline.detect_faces(_frame(), rois=rois) == [(110, 230, 140, 205)]
+    # only the crop is scanned
+    assert fake.images[0].shape == (100, 200, 3)
+
+
+def test_roi_and_scale_combine(detector):
+    fake = detector([(10, 30, 40, 5)])
+    rois = normalize_rois([[0.5, 0.5, 1.0, 1.0]])
+    assert face_pipeline.detect_faces(_frame(), scale=0.5, rois=rois) == [(120, 260, 180, 210)]
+    assert fake.images[0].shape == (50, 100, 3)
+
+
+def test_overlapping_rois_report_a_face_once(detector):
+    detector([(10, 30, 40, 5)])
+    rois = normalize_rois([[0, 0, 0.5, 0.5], [0, 0, 0.5, 0.5]])
+    assert face_pipeline.detect_faces(_frame(), rois=rois) == [(10, 30, 40, 5)]
+
+
+def test_polygon_roi_masks_the_rest_of_its_crop(detector):
+    fake = detector([])
+    rois = normalize_rois([[[0, 0], [1, 0], [0, 1]]])
+    face_pipeline.detect_faces(_frame(), rois=rois)
+    crop = fake.images[0]
+    assert crop.shape == (200, 400, 3)
+    assert crop[5, 5].tolist() == [200, 200, 200]
+    assert crop[195, 395].tolist() == [0, 0, 0]
@@ -0,0 +1,79 @@
+"""Unit tests for following faces between RTSP frames."""
+from face_tracker import FaceTracker
+
+
+def _box(top, left, size=100):
+    return (top, left + size, top + size, left)
+
+
+def test_detections_keep_their_track_while_they_overlap():
+    tracker = FaceTracker()
+    first = tracker.update([_box(0, 0), _box(0, 300)], now=0)
+    second = tracker.update([_box(5, 310), _box(10, 10)], now=1)
+    assert second == [first[1], first[0]]
+    assert second[1].box == _box(10, 10)
+    assert len(tracker) == 2
+
+
+def test_a_face_that_moved_further_is_matched_by_centre_distance():
+    tracker = FaceTracker(max_centre_distance=0.5)
+    (track,) = tracker.update([_box(0, 0)], now=0)
+    # IoU 0.27, but the centre moved less than half the face size
+    assert tracker.update([_box(35, 35)], now=1) == [track]
+    # too far: a new face
+    (other,) = tracker.update([_box(0, 400)], now=2)
+    assert other is not track and other.id != track.id
+
+
+def test_a_track_survives_max_missed_frames():
+    tracker = FaceTracker(max_missed=2)
+    (track,) = tracker.update([_box(0, 0)], now=0)
+    tracker.update([], now=1)
+    tracker.update([], now=2)
+    assert tracker.tracks == [track]
+    assert tracker.update([_box(0, 0)], now=3) == [track]
+    for now in (4, 5, 6):
+        tracker.update([], now=now)
+    assert len(tracker) == 0
+
+
+def test_new_tracks_need_identity_then_wait_for_reverification():
+    tracker = FaceTracker(reverify_s=5, unknown_retry_s=1)
+    (track,) = tracker.update([_box(0, 0)], now=0)
+    assert tracker.needs_identity(track, now=0)
+
+    tracker.identify(track, {"roll": "R1", "name": "A", "_id": "id1", "confidence": 90.0}, now=0)
+    assert track.roll == "R1" and track.student_id == "id1"
+    assert not tracker.needs_identity(track, now=4.9)
+    assert tracker.needs_identity(track, now=5)
+
+    (unknown,) = tracker.update([_box(0, 0), _box(0, 500)], now=5)[1:]
+    tracker.identify(unknown, {"roll": None}, now=5)
+    assert unknown.roll is None
+    assert not tracker.needs_identity(unknown, now=5.5)
+    assert tracker.needs_identity(unknown, now=6)
+    assert tracker.status(now=6)["encodes"] == 2
+
+
+def test_one_failed_check_keeps_a_known_identity():
+    tracker = FaceTracker()
+    (track,) = tracker.update([_box(0, 0)], now=0)
+    tracker.identify(track, {"roll": "R1", "name": "A"}, now=0)
+    tracker.identify(track, {"roll": None}, now=1)
+    assert track.roll == "R1"
+    tracker.identify(track, None, now=2)
+    assert track.roll is None and track.name is None
+
+
+def test_status_and_reset():
+    tracker = FaceTracker()
+    tracks = tracker.update([_box(0, 0), _box(0, 300)], now=0)
+    tracker.identify(tracks[0], {"roll": "R1", "name": "A", "confidence": 80.0}, now=0)
+    tracker.skipped(3)
+    status = tracker.status(now=2)
+    assert status["active_tracks"] == 2 and status["identified_tracks"] == 1
+    assert status["encodes_skipped"] == 3
+    assert status["tracks"][0] == {"track_id": tracks[0].id, "roll": "R1", "name": "A", "confidence": 80.0,
+                                   "age_s": 2.0, "verified_ago_s": 2.0}
+    tracker.reset()
+    assert len(tracker) == 0
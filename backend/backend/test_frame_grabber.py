@@ -0,0 +1,87 @@
+"""Unit tests for the latest-frame RTSP grabber."""
+import time
+
+import numpy as np
+
+from frame_grabber import FrameGrabber
+
+
+class FakeCapture:
+    """A cv2.VideoCapture stand-in that serves `count` numbered frames, then fails."""
+
+    def __init__(self, count, bad=()):
+        self.count = count
+        self.bad = set(bad)
+        self.grabbed = 0
+
+    def grab(self):
+        if self.grabbed >= self.count:
+            return False
+        self.grabbed += 1
+        return True
+
+    def retrieve(self):
+        if self.grabbed in self.bad:
+            return False, None
+        return True, np.full((4, 4, 3), self.grabbed, dtype=np.uint8)
+
+
+def _run(cap, **kwargs):
+    grabber = FrameGrabber(cap, retry_s=0.01, **kwargs)
+    grabber.start()
+    deadline = time.monotonic() + 5
+    while cap.grabbed < cap.count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    return grabber
+
+
+def test_read_returns_only_the_newest_frame():
+    grabber = _run(FakeCapture(5))
+    try:
+        frame, captured_at = grabber.read(timeout=1)
+        assert frame[0, 0, 0] == 5
+        assert 0 <= time.time() - captured_at < 5
+        # frames 1-4 were replaced before anyone read them
+        assert grabber.status()["frames_dropped"] == 4
+        assert grabber.status()["frames_decoded"] == 5
+        # nothing newer yet
+        assert grabber.read(timeout=0.1) == (None, None)
+    finally:
+        grabber.stop()
+
+
+def test_frame_skip_decodes_every_nth_frame():
+    grabber = _run(FakeCapture(6), frame_skip=2)
+    try:
+        frame, _ = grabber.read(timeout=1)
+        assert frame[0, 0, 0] == 6
+        status = grabber.status()
+        assert status["frames_grabbed"] == 6 and status["frames_decoded"] == 2
+        assert status["frames_dropped"] == 1
+    finally:
+        grabber.stop()
+
+
+def test_failed_reads_are_reported():
+    grabber = _run(FakeCapture(3, bad={3}))
+    try:
+        frame, _ = grabber.read(timeout=1)
+        assert frame[0, 0, 0] == 2
+        status = grabber.status()
+        assert status["frames_decoded"] == 2
+        # the stream ended: grab() keeps failing
+        assert status["capture_error"] == "Frame read failed"
+        assert status["capture_failures"] > 0
+        assert grabber.last_frame_at is not None
+    finally:
+        grabber.stop()
+
+
+def test_read_gives_up_when_stopped():
+    grabber = FrameGrabber(FakeCapture(0), retry_s=0.01)
+    grabber.start()
+    grabber.stop()
+    started = time.monotonic()
+    assert grabber.read(timeout=2) == (None, None)
+    assert time.monotonic() - started < 1
@@ -0,0 +1,169 @@
+"""Unit tests for publishing and mapping the on-disk gallery snapshot."""
+import os
+
+import numpy as np
+from bson import ObjectId
+
+import ann_index
+import gallery_snapshot
+from face_codec import pack_encoding
+from face_gallery import LOADABLE_ENCODING_QUERY, FaceGallery
+
+RNG = np.random.default_rng(3)
+ENCODINGS = RNG.normal(scale=0.1, size=(5, 128)).astype(np.float32)
+IDS = [ObjectId() for _ in ENCODINGS]
+
+
+def _student(i):
+    return {"_id": IDS[i], "roll": f"R{i}", "name": f"Student {i}", "section": "A",
+            "face_encoding": pack_encoding(ENCODINGS[i])}
+
+
+def _gallery(directory, ann_min_size=0):
+    # publishes are triggered by the tests, not by the background timer
+    return FaceGallery(snapshot_dir=str(directory), publish_delay_s=3600, refresh_check_s=0,
+                       ann_min_size=ann_min_size)
+
+
+def test_write_and_read(tmp_path):
+    ids = [IDS[0], "R1"]
+    version = gallery_snapshot.write_snapshot(
+        str(tmp_path), ENCODINGS[:2], ids, ["R0", "R1"], ["a", "b"], scopes=[{"section": "A"}, {}],
+        samples=ENCODINGS[:3], offsets=[0, 2, 3],
+    )
+    assert gallery_snapshot.current_version(str(tmp_path)) == version
+    snap = gallery_snapshot.read_snapshot(str(tmp_path))
+    assert snap["version"] == version
+    assert isinstance(snap["encodings"], np.memmap)
+    np.testing.assert_array_equal(snap["encodings"], ENCODINGS[:2])
+    np.testing.assert_array_equal(snap["samples"], ENCODINGS[:3])
+    assert snap["offsets"].tolist() == [0, 2, 3]
+    assert snap["ids"] == ids
+    assert snap["rolls"] == ["R0", "R1"] and snap["names"] == ["a", "b"]
+    assert snap["scopes"] == [{"section": "A"}, {}]
+    assert snap["centroids"] is None
+
+
+def test_centroids_are_stored(tmp_path):
+    centroids = ENCODINGS[:2] * 2
+    gallery_snapshot.write_snapshot(str(tmp_path), ENCODINGS, IDS, ["r"] * 5, ["n"] * 5, centroids=centroids)
+    np.testing.assert_array_equal(gallery_snapshot.read_snapshot(str(tmp_path))["centroids"], centroids)
+
+
+def test_single_sample_snapshot(tmp_path):
+    gallery_snapshot.write_snapshot(str(tmp_path), ENCODINGS, IDS, ["r"] * 5, ["n"] * 5)
+    snap = gallery_snapshot.read_snapshot(str(tmp_path))
+    np.testing.assert_array_equal(snap["samples"], ENCODINGS)
+    assert snap["offsets"].tolist() == list(range(6))
+
+
+def test_missing_snapshot(tmp_path):
+    assert gallery_snapshot.current_version(str(tmp_path)) is None
+    assert gallery_snapshot.read_snapshot(str(tmp_path)) is None
+    assert gallery_snapshot.read_snapshot(str(tmp_path), version="1-1") is None
+
+
+def test_old_versions_are_pruned(tmp_path):
+    versions = [gallery_snapshot.write_snapshot(str(tmp_path), ENCODINGS, IDS, ["r"] * 5, ["n"] * 5)
+                for _ in range(4)]
+    kept = {name.split(".")[0] for name in os.listdir(tmp_path) if name.startswith("gallery-")}
+    assert kept == {f"gallery-{v}" for v in versions[-gallery_snapshot.KEEP_SNAPSHOTS:]}
+    assert gallery_snapshot.read_snapshot(str(tmp_path), version=versions[-2]) is not None
+
+
+def test_published_gallery_is_mapped_read_only(tmp_path):
+    publisher = _gallery(tmp_path)
+    publisher.load([_student(i) for i in range(3)])
+    assert publisher.snapshot_version == gallery_snapshot.current_version(str(tmp_path))
+    assert not publisher.encodings.flags.owndata and not publisher.encodings.flags.writeable
+
+    reader = _gallery(tmp_path)
+    assert reader.load_snapshot()
+    assert reader.rolls == ["R0", "R1", "R2"]
+    assert reader.ids == IDS[:3]
+    assert reader.scopes[0] == {"section": "A"}
+    assert reader.match(ENCODINGS[1])[0]["roll"] == "R1"
+
+
+def test_refresh_maps_a_newer_snapshot(tmp_path):
+    publisher, reader = _gallery(tmp_path), _gallery(tmp_path)
+    publisher.load([_student(0)])
+    reader.load_snapshot()
+    assert not reader.refresh()
+
+    publisher.upsert(_student(1))
+    publisher.save_snapshot()
+    assert reader.refresh()
+    assert reader.rolls == ["R0", "R1"]
+    assert reader.match(ENCODINGS[1])[0]["roll"] == "R1"
+
+
+def test_concurrent_edits_from_two_processes_are_merged(tmp_path):
+    first, second = _gallery(tmp_path), _gallery(tmp_path)
+    first.load([_student(0), _student(1)])
+    second.load_snapshot()
+
+    first.upsert(_student(2))
+    second.upsert(_student(3))
+    second.remove(IDS[0])
+    first.save_snapshot()
+    second.save_snapshot()
+    # nothing left to publish in either process
+    assert not first._pending and not second._pending
+
+    merged = _gallery(tmp_path)
+    merged.load_snapshot()
+    assert sorted(merged.rolls) == ["R1", "R2", "R3"]
+    assert first.refresh()
+    assert sorted(first.rolls) == ["R1", "R2", "R3"]
+
+
+def test_unpublished_changes_survive_a_remap(tmp_path):
+    publisher, other = _gallery(tmp_path), _gallery(tmp_path)
+    publisher.load([_student(0)])
+    other.load_snapshot()
+    other.upsert(_student(4))
+
+    publisher.upsert(_student(1))
+    publisher.save_snapshot()
+    assert other.refresh()
+    assert sorted(other.rolls) == ["R0", "R1", "R4"]
+
+
+def test_mapping_reuses_the_published_inverted_lists(tmp_path, monkeypatch):
+    publisher = _gallery(tmp_path, ann_min_size=3)
+    publisher.load([_student(i) for i in range(5)])
+    snap = gallery_snapshot.read_snapshot(str(tmp_path))
+    assert snap["cells"].shape == (5,)
+
+    def no_assignment(vectors, centroids):
+        raise AssertionError("rows were reassigned")
+
+    monkeypatch.setattr(ann_index, "_assign", no_assignment)
+    reader = _gallery(tmp_path, ann_min_size=3)
+    assert reader.load_snapshot()
+    np.testing.assert_array_equal(reader.index.centroids, publisher.index.centroids)
+    assert reader.index.cell_labels == publisher.index.cell_labels
+    assert reader.match(ENCODINGS[2])[0]["roll"] == "R2"
+
+
+class FakeStudents:
+    def __init__(self, loadable):
+        self.loadable = loadable
+
+    def find_one(self, query, projection=None):
+        return None
+
+    def count_documents(self, query):
+        # the server filters out students whose encoding load() would skip
+        assert query == LOADABLE_ENCODING_QUERY
+        return self.loadable
+
+
+def test_snapshot_is_current_counts_loadable_encodings(tmp_path):
+    gallery = _gallery(tmp_path)
+    gallery.load([_student(i) for i in range(3)] + [dict(_student(3), face_encoding=b"broken")])
+    gallery.students_col = FakeStudents(loadable=3)
+    assert len(gallery) == 3 and gallery.snapshot_is_current()
+    gallery.students_col = FakeStudents(loadable=4)
+    assert not gallery.snapshot_is_current()
@@ -0,0 +1,133 @@
+"""Unit tests for keeping the gallery current by polling (no MongoDB)."""
+from datetime import datetime, timedelta
+
+import numpy as np
+from bson import ObjectId
+
+from face_codec import pack_encoding
+from face_gallery import FaceGallery
+from gallery_sync import GallerySync
+
+RNG = np.random.default_rng(11)
+T0 = datetime(2024, 5, 1, 9)
+
+
+def _student(roll, updated_at=None):
+    doc = {"_id": ObjectId(), "roll": roll, "name": roll,
+           "face_encoding": pack_encoding(RNG.normal(scale=0.1, size=128).astype(np.float32))}
+    if updated_at is not None:
+        doc["updated_at"] = updated_at
+    return doc
+
+
+def _matches(doc, query):
+    if "$or" in query:
+        return any(_matches(doc, clause) for clause in query["$or"])
+    for field, cond in query.items():
+        value = doc.get(field)
+        if "$exists" in cond and (field in doc) != cond["$exists"]:
+            return False
+        if "$gt" in cond and not (value is not None and value > cond["$gt"]):
+            return False
+    return True
+
+
+class FakeStudents:
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+
+    def find(self, query=None, projection=None):
+        return [dict(doc) for doc in self.docs if _matches(doc, query or {})]
+
+    def find_one(self, query=None, projection=None, sort=None):
+        docs = self.find(query)
+        if sort:
+            field, direction = sort[0]
+            docs.sort(key=lambda doc: doc[field], reverse=direction < 0)
+        return docs[0] if docs else None
+
+
+class ChangedDuringLoad(FakeStudents):
+    """The collection changes right after the full load has read it."""
+
+    def __init__(self, docs, change):
+        super().__init__(docs)
+        self.change = change
+
+    def find(self, query=None, projection=None):
+        docs = super().find(query, projection)
+        if self.change is not None and not query:
+            self.change, change = None, self.change
+            change()
+        return docs
+
+
+class Steps:
+    """Replaces the sync's stop event: each wait() runs the next step, then polls once."""
+
+    def __init__(self, *steps):
+        self.steps = list(steps)
+
+    def is_set(self):
+        return not self.steps
+
+    def wait(self, timeout=None):
+        if not self.steps:
+            return True
+        self.steps.pop(0)()
+        return False
+
+    def set(self):
+        self.steps.clear()
+
+
+def _poll(students, *steps, reconcile_every=12):
+    gallery = FaceGallery(snapshot_dir="")
+    sync = GallerySync(gallery, students, reconcile_every=reconcile_every)
+    sync.stop_event = Steps(*steps)
+    sync._poll()
+    return gallery, sync
+
+
+def test_poll_picks_up_inserts_and_updates():
+    students = FakeStudents([_student("R1", T0), _student("R2")])
+    replaced = _student("R1b", T0 + timedelta(minutes=1))
+
+    def insert():
+        students.docs.append(_student("R3"))
+
+    def update():
+        # R1 re-enrolled under a new roll
+        replaced["_id"] = students.docs[0]["_id"]
+        students.docs[0] = replaced
+
+    gallery, sync = _poll(students, insert, update)
+    assert sorted(gallery.rolls) == ["R1b", "R2", "R3"]
+    assert sync.mode == "polling" and sync.changes_applied == 2
+
+
+def test_unchanged_students_are_not_reapplied():
+    students = FakeStudents([_student("R1", T0), _student("R2")])
+    _, sync = _poll(students, lambda: None, lambda: None)
+    assert sync.changes_applied == 0
+
+
+def test_reconcile_removes_deleted_students():
+    students = FakeStudents([_student("R1"), _student("R2"), _student("R3")])
+
+    def delete():
+        del students.docs[1]
+
+    gallery, sync = _poll(students, delete, reconcile_every=1)
+    assert sorted(gallery.rolls) == ["R1", "R3"]
+    assert sync.changes_applied == 1
+
+
+def test_changes_made_during_the_full_load_are_polled():
+    def change():
+        students.docs[0] = dict(_student("R1b", T0 + timedelta(minutes=1)), _id=students.docs[0]["_id"])
+
+    students = ChangedDuringLoad([_student("R1", T0), _student("R2", T0)], change)
+    gallery, sync = _poll(students, lambda: None)
+    assert sorted(gallery.rolls) == ["R1b", "R2"]
+    assert sync.changes_applied == 1
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Test script to verify that the hot queries use indexes (IXSCAN, not COLLSCAN).
+
+Needs a local MongoDB. Works on a scratch database that is dropped afterwards.
+Run it directly, or through pytest (the `db` fixture in conftest.py skips
+these tests when MongoDB is not reachable).
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import MongoClient
+
+from indexes import INDEXES, ensure_indexes
+from attendance_store import hour_bucket
+
+MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017/")
+TEST_DB = "face_reco_index_test"
+
+
+def plan_stages(plan):
+    """All stage names in an explain() plan tree."""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(plan_stages(value))
+    return stages
+
+
+def seed(db):
+    """A few thousand documents so the planner has something to choose between."""
+    now = datetime.now()
+    students = [
+        {"roll": f"R{i:04d}", "name": f"Student {i}", "section": "A" if i % 2 else "B",
+         "updated_at": now - timedelta(minutes=i)}
+        for i in range(500)
+    ]
+    db["students"].insert_many(students)
+    attendance = []
+    # 25 students x 200 hours, one record each (the bucket index is unique)
+    for i in range(5000):
+        ts = hour_bucket(now) - timedelta(hours=i // 25) + timedelta(minutes=i % 60)
+        attendance.append({"roll": f"R{i % 25:04d}", "name": "x", "timestamp": ts, "hour_bucket": hour_bucket(ts)})
+    db["attendance"].insert_many(attendance, ordered=False)
+    db["staffs"].insert_many([{"email": f"staff{i}@example.com", "password": "x"} for i in range(200)])
+
+
+def hot_queries(db):
+    """(description, cursor) for every query that runs on a hot path."""
+    now = datetime.now()
+    hour_start = hour_bucket(now)
+    hour_end = hour_start + timedelta(hours=1)
+    return [
+        ("attendance by hour (/attendance_by_hour, clear_hour, marked cache seed)",
+         db["attendance"].find({"timestamp": {"$gte": hour_start, "$lt": hour_end}})),
+        ("attendance once-per-hour upsert filter",
+         db["attendance"].find({"roll": "R0001", "hour_bucket": hour_start})),
+        ("attendance of one student in a range",
+         db["attendance"].find({"roll": "R0001", "timestamp": {"$gte": hour_start, "$lt": hour_end}})),
+        ("students by roll (add_student)", db["students"].find({"roll": "R0001"})),
+        ("students by name (add_student)", db["students"].find({"name": "Student 1"})),
+        ("students newest updated_at (gallery polling)",
+         db["students"].find({"updated_at": {"$exists": True}}, {"updated_at": 1}).sort("updated_at", -1).limit(1)),
+        ("attendance page after a cursor (/attendance)",
+         db["attendance"].find({"$or": [{"timestamp": {"$lt": now}},
+                                        {"timestamp": now, "_id": {"$lt": ObjectId()}}]})
+         .sort([("timestamp", -1), ("_id", -1)]).limit(100)),
+        ("students of a section (/students_full, cohort filters)", db["students"].find({"section": "A"})),
+        ("staffs by email (signup, forgot/reset password)", db["staffs"].find({"email": "staff1@example.com"})),
+        ("staffs by email and password (login)",
+         db["staffs"].find({"email": "staff1@example.com", "password": "x"})),
+    ]
+
+
+def check_ensure_indexes_idempotent(db):
+    """Creating the indexes twice must not fail"""
+    expected = sum(len(models) for models in INDEXES.values())
+    for attempt in (1, 2):
+        ok, failed = ensure_indexes(db)
+        if failed or len(ok) != expected:
+            print(f"❌ ensure_indexes run {attempt}: {len(ok)} ok, failed: {failed}")
+            return False
+    print(f"✅ ensure_indexes is idempotent ({expected} indexes)")
+    return True
+
+
+def check_hot_queries_use_indexes(db):
+    """Every hot query's winning plan is an index scan"""
+    passed = True
+    for description, cursor in hot_queries(db):
+        stages = plan_stages(cursor.explain()["queryPlanner"]["winningPlan"])
+        if "COLLSCAN" in stages or "IXSCAN" not in stages:
+            print(f"❌ {description}: {' -> '.join(stages)}")
+            passed = False
+        else:
+            print(f"✅ {description}: {' -> '.join(stages)}")
+    return passed
+
+
+def test_ensure_indexes_idempotent(db):
+    assert check_ensure_indexes_idempotent(db)
+
+
+def test_hot_queries_use_indexes(db):
+    assert check_ensure_indexes_idempotent(db)
+    assert check_hot_queries_use_indexes(db)
+
+
+def main():
+    """Main test function"""
+    print("🔍 Testing MongoDB indexes and query plans...")
+    print("=" * 50)
+
+    try:
+        client = MongoClient(MONGODB_URL, serverSelectionTimeoutMS=3000)
+        client.admin.command('ping')
+    except Exception as e:
+        print(f"❌ MongoDB connection failed: {e}")
+        sys.exit(1)
+
+    client.drop_database(TEST_DB)
+    db = client[TEST_DB]
+    try:
+        seed(db)
+        ok = check_ensure_indexes_idempotent(db)
+        ok = check_hot_queries_use_indexes(db) and ok
+    finally:
+        client.drop_database(TEST_DB)
+        client.close()
+
+    print("=" * 50)
+    if not ok:
+        print("❌ Some queries are not backed by an index")
+        sys.exit(1)
+    print("✅ All hot queries use indexes.")
+
+
+if __name__ == "__main__":
+    main()
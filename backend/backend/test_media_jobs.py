@@ -0,0 +1,124 @@
+"""Unit tests for background media attendance jobs (no MongoDB, no compute pool)."""
+from concurrent.futures import Future
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("face_recognition")
+
+from media_jobs import MediaJobs, media_kind
+
+BASE_TIME = datetime(2024, 5, 1, 9, 15)
+
+
+class FakeJobs:
+    def __init__(self):
+        self.docs = {}
+
+    def insert_one(self, doc):
+        self.docs[doc["_id"]] = dict(doc)
+
+    def update_one(self, query, update):
+        self.docs.setdefault(query["_id"], {"_id": query["_id"]}).update(update["$set"])
+
+    def find_one(self, query, projection=None):
+        doc = self.docs.get(query["_id"])
+        return dict(doc) if doc else None
+
+
+class FakePool:
+    """Runs nothing: each photo's bytes name the students in it, e.g. b"R1,R2"."""
+
+    def __init__(self, stuck=False):
+        self.stuck = stuck
+        self.timed_out = 0
+        self.timeout_s = 30
+        self.futures = []
+
+    def submit(self, fn, data, **kwargs):
+        future = Future()
+        self.futures.append(future)
+        if not self.stuck:
+            rolls = [r for r in data.decode().split(",") if r]
+            future.set_result(([(0, 10, 10, 0)] * len(rolls), rolls))
+        return future
+
+    def abandon(self, future):
+        self.timed_out += 1
+        future.cancel()
+
+
+class FakeGallery:
+    def ensure_loaded(self):
+        pass
+
+    def __len__(self):
+        return 3
+
+    def assign(self, encodings, **kwargs):
+        return [{"roll": roll, "name": f"Student {roll}", "confidence": 90.0} for roll in encodings]
+
+
+class FakeMarked:
+    def __init__(self):
+        self.marked = []
+
+    def mark(self, roll, name, timestamp, **extra):
+        if any(r == roll for r, _, _ in self.marked):
+            return False
+        self.marked.append((roll, timestamp, extra))
+        return True
+
+
+def _photos(tmp_path, *contents):
+    files = []
+    for i, content in enumerate(contents):
+        path = tmp_path / f"{i}.jpg"
+        path.write_bytes(content)
+        files.append({"name": f"photo{i}.jpg", "kind": "image", "path": str(path)})
+    return files
+
+
+def _run(tmp_path, files, pool=None, marked=None, **kwargs):
+    jobs = MediaJobs(FakeJobs(), None, FakeGallery(), pool or FakePool(), marked_cache=marked or FakeMarked(),
+                     **kwargs)
+    jobs.jobs_col.insert_one({"_id": "job1", "processed": 0, "total": None})
+    jobs._run("job1", str(tmp_path / "work"), files, BASE_TIME, None, False, 2.0, 1.0, 1)
+    return jobs, jobs.get("job1")
+
+
+def test_media_kind():
+    assert media_kind("lecture.MP4") == "video"
+    assert media_kind("photos.zip") == "zip"
+    assert media_kind("upload", "image/jpeg") == "image"
+    assert media_kind("notes.txt", "text/plain") is None
+
+
+def test_sightings_are_deduplicated_per_roll_and_hour(tmp_path):
+    marked = FakeMarked()
+    _, job = _run(tmp_path, _photos(tmp_path, b"R1,R2", b"R1", b""), marked=marked)
+    assert job["status"] == "done"
+    assert job["total"] == 3 and job["processed"] == 3 and job["progress"] == 1.0
+    assert job["faces_detected"] == 3 and job["attendance_marked"] == 2
+    assert [(r["roll"], r["sightings"], r["marked"]) for r in job["recognized"]] == [("R1", 2, True), ("R2", 1, True)]
+    assert [roll for roll, _, _ in marked.marked] == ["R1", "R2"]
+    assert marked.marked[0][2] == {"confidence": 90.0, "face_detected": True, "source": "media_batch",
+                                   "job_id": "job1"}
+
+
+def test_rolls_already_marked_are_reported_but_not_counted(tmp_path):
+    marked = FakeMarked()
+    marked.mark("R2", "Student R2", BASE_TIME)
+    _, job = _run(tmp_path, _photos(tmp_path, b"R1,R2"), marked=marked)
+    assert job["attendance_marked"] == 1
+    assert [(r["roll"], r["marked"]) for r in job["recognized"]] == [("R1", True), ("R2", False)]
+
+
+def test_stuck_pool_job_fails_the_media_job(tmp_path):
+    pool = FakePool(stuck=True)
+    _, job = _run(tmp_path, _photos(tmp_path, b"R1", b"R2", b"R3"), pool=pool, concurrency=2, task_timeout_s=0.05)
+    assert job["status"] == "failed"
+    assert job["error"] == "Face processing timed out after 0.05s"
+    assert pool.timed_out == 1
+    # the stuck job is abandoned and the job's queued pool work is given back
+    assert len(pool.futures) == 2 and all(f.cancelled() for f in pool.futures)
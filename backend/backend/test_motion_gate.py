@@ -0,0 +1,66 @@
+"""Unit tests for skipping face detection on unchanged frames."""
+import numpy as np
+
+from motion_gate import MotionGate
+from roi import normalize_rois
+
+
+def _frame(value=100, patch=None):
+    """A flat 320x240 BGR frame, optionally with a white block at (y1, x1, y2, x2)."""
+    frame = np.full((240, 320, 3), value, dtype=np.uint8)
+    if patch is not None:
+        y1, x1, y2, x2 = patch
+        frame[y1:y2, x1:x2] = 255
+    return frame
+
+
+def test_first_frame_is_always_detected():
+    gate = MotionGate(threshold=0.01, keyframe_s=30)
+    assert gate.should_detect(_frame(), now=0)
+
+
+def test_static_scene_is_gated_until_a_keyframe_is_due():
+    gate = MotionGate(threshold=0.01, keyframe_s=30)
+    gate.should_detect(_frame(), now=0)
+    assert not gate.should_detect(_frame(), now=10)
+    assert not gate.should_detect(_frame(), now=29)
+    assert gate.should_detect(_frame(), now=30)
+    assert gate.status()["frames_gated"] == 2 and gate.status()["frames_detected"] == 2
+
+
+def test_movement_triggers_detection():
+    gate = MotionGate(threshold=0.01, keyframe_s=30)
+    gate.should_detect(_frame(), now=0)
+    assert gate.should_detect(_frame(patch=(80, 120, 160, 200)), now=1)
+    assert gate.last_change >= 0.01
+
+
+def test_small_noise_and_tiny_changes_are_ignored():
+    gate = MotionGate(threshold=0.05, pixel_delta=15, keyframe_s=30)
+    gate.should_detect(_frame(), now=0)
+    # brightness drift below pixel_delta
+    assert not gate.should_detect(_frame(value=110), now=1)
+    # a real change, but smaller than 5% of the picture
+    assert not gate.should_detect(_frame(patch=(0, 0, 20, 20)), now=2)
+
+
+def test_zero_threshold_disables_gating():
+    gate = MotionGate(threshold=0)
+    assert all(gate.should_detect(_frame(), now=t) for t in range(5))
+    assert gate.status()["frames_gated"] == 0
+
+
+def test_reset_forgets_the_background():
+    gate = MotionGate(threshold=0.01, keyframe_s=30)
+    gate.should_detect(_frame(), now=0)
+    gate.reset()
+    assert gate.should_detect(_frame(), now=1)
+
+
+def test_only_changes_inside_the_rois_count():
+    gate = MotionGate(threshold=0.05, keyframe_s=30, rois=normalize_rois([[0, 0, 0.5, 1]]))
+    gate.should_detect(_frame(), now=0)
+    # movement in the right half (outside the ROI) is ignored
+    assert not gate.should_detect(_frame(patch=(0, 200, 240, 320)), now=1)
+    # the same amount in the left half is plenty
+    assert gate.should_detect(_frame(patch=(0, 0, 240, 80)), now=2)
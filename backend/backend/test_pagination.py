@@ -0,0 +1,57 @@
+"""Unit tests for keyset cursors and field projections."""
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from pagination import after_id_cursor, before_timestamp_cursor, decode_cursor, encode_cursor, parse_fields
+
+
+def test_cursor_round_trip():
+    ts, oid = datetime(2024, 5, 1, 9, 30, 15, 123456), ObjectId()
+    cursor = encode_cursor(ts, oid)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, 2) == [ts.isoformat(), str(oid)]
+
+
+@pytest.mark.parametrize("value", ["a", "ab", "abc", "abcd"])
+def test_cursor_without_padding_decodes(value):
+    assert decode_cursor(encode_cursor(value), 1) == [value]
+
+
+def test_cursor_with_wrong_part_count_is_rejected():
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor("x", "y"), 1)
+
+
+@pytest.mark.parametrize("cursor", ["__4", "_w"])  # neither decodes to UTF-8
+def test_garbage_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, 1)
+
+
+def test_after_id_cursor():
+    oid = ObjectId()
+    assert after_id_cursor(encode_cursor(oid)) == {"_id": {"$gt": oid}}
+    with pytest.raises(ValueError):
+        after_id_cursor(encode_cursor("not-an-id"))
+
+
+def test_before_timestamp_cursor():
+    ts, oid = datetime(2024, 5, 1, 9, 30), ObjectId()
+    assert before_timestamp_cursor(encode_cursor(ts, oid)) == {
+        "$or": [{"timestamp": {"$lt": ts}}, {"timestamp": ts, "_id": {"$lt": oid}}]
+    }
+    with pytest.raises(ValueError):
+        before_timestamp_cursor(encode_cursor("yesterday", oid))
+    with pytest.raises(ValueError):
+        before_timestamp_cursor(encode_cursor(ts, "nope"))
+
+
+def test_parse_fields():
+    assert parse_fields("") is None
+    assert parse_fields("roll, name,") == {"_id": 1, "roll": 1, "name": 1}
+    assert parse_fields("scope.section") == {"_id": 1, "scope.section": 1}
+    for bad in ("$where", "name;drop", "a b"):
+        with pytest.raises(ValueError):
+            parse_fields(bad)
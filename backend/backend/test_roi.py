@@ -0,0 +1,63 @@
+"""Unit tests for camera regions of interest."""
+import numpy as np
+import pytest
+
+from roi import normalize_rois, roi_area, roi_mask, roi_regions
+
+
+def test_rectangles_become_polygons():
+    assert normalize_rois([[0.5, 0.6, 0.1, 0.2]]) == [[[0.1, 0.2], [0.5, 0.2], [0.5, 0.6], [0.1, 0.6]]]
+
+
+def test_polygons_are_kept():
+    triangle = [[0, 0], [1, 0], [0.5, 1]]
+    assert normalize_rois([triangle]) == [[[0.0, 0.0], [1.0, 0.0], [0.5, 1.0]]]
+
+
+@pytest.mark.parametrize("rois", [None, []])
+def test_empty_means_whole_frame(rois):
+    assert normalize_rois(rois) is None
+    assert roi_mask(rois, 10, 10) is None
+    assert roi_area(rois) == 1.0
+
+
+@pytest.mark.parametrize("rois", [
+    "0,0,1,1",
+    [[0, 0, 1]],
+    [[0, 0, 1.5, 1]],
+    [[0.2, 0.2, 0.2, 0.8]],
+    [[[0, 0], [1, 1]]],
+    [[[0, 0], [1, "x"], [0, 1]]],
+    [[]],
+])
+def test_bad_rois_are_rejected(rois):
+    with pytest.raises(ValueError):
+        normalize_rois(rois)
+
+
+def test_regions_are_pixel_crops():
+    rois = normalize_rois([[0.25, 0.5, 0.75, 1.0], [[0, 0], [0.5, 0], [0, 0.5]]])
+    (rect, triangle) = roi_regions(rois, 200, 100)
+    assert rect == (50, 50, 150, 100, None)
+    x1, y1, x2, y2, polygon = triangle
+    assert (x1, y1, x2, y2) == (0, 0, 100, 50)
+    # the polygon outline is relative to its crop, for masking
+    assert polygon.tolist() == [[0, 0], [100, 0], [0, 50]]
+
+
+def test_mask_and_area():
+    rois = normalize_rois([[0, 0, 0.5, 0.5]])
+    mask = roi_mask(rois, 100, 100)
+    assert mask.dtype == np.uint8
+    assert mask[10, 10] == 255 and mask[90, 90] == 0
+    assert roi_area(rois) == pytest.approx(0.25)
+    assert roi_area(normalize_rois([[0, 0, 1, 1], [0, 0, 1, 1]])) == 1.0
+
+
+def test_invalid_rtsp_rois_setting_is_ignored(monkeypatch):
+    import config
+    for raw in ("[[0, 0, 2, 2]]", "not json", '{"x": 1}'):
+        monkeypatch.setenv("RTSP_ROIS", raw)
+        assert config._rois_from_env() is None
+    monkeypatch.setenv("RTSP_ROIS", "[[0, 0, 0.5, 0.5]]")
+    assert config._rois_from_env() == [[[0.0, 0.0], [0.5, 0.0], [0.5, 0.5], [0.0, 0.5]]]
@@ -0,0 +1,121 @@
+"""Unit tests for RTSP reconnect backoff and the stall/freeze watchdog (no camera)."""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("face_recognition")
+
+import rtsp_worker
+from rtsp_worker import RtspAttendanceWorker
+
+
+class Waits:
+    """Stands in for the worker's stop event; set after `limit` waits."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.delays = []
+
+    def is_set(self):
+        return len(self.delays) >= self.limit
+
+    def wait(self, timeout=None):
+        self.delays.append(timeout)
+        return self.is_set()
+
+
+def _worker(**kwargs):
+    return RtspAttendanceWorker("rtsp://cam", {}, gallery=object(), gallery_sync=SimpleNamespace(),
+                                marked_cache=object(), **kwargs)
+
+
+def test_reconnect_backs_off_exponentially_up_to_the_cap(monkeypatch):
+    worker = _worker(backoff_max_s=10)
+    worker.stop_event = Waits(6)
+    monkeypatch.setattr(worker, "_open_stream", lambda: None)
+    monkeypatch.setattr(rtsp_worker.random, "uniform", lambda low, high: high)
+    assert not worker._connect()
+    assert worker.stop_event.delays == [1, 2, 4, 8, 10, 10]
+    assert worker.last_error == "Failed to open RTSP stream"
+    assert worker.next_retry_ts is not None
+
+
+def test_reconnect_delays_are_jittered(monkeypatch):
+    worker = _worker()
+    worker.stop_event = Waits(3)
+    monkeypatch.setattr(worker, "_open_stream", lambda: None)
+    monkeypatch.setattr(rtsp_worker.random, "uniform", lambda low, high: low)
+    worker._connect()
+    assert worker.stop_event.delays == [0.5, 1, 2]
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rtsp_worker.time, "time", clock)
+    return clock
+
+
+def _connected(clock, **kwargs):
+    worker = _worker(**kwargs)
+    worker.connected_since = clock.now
+    worker.grabber = SimpleNamespace(last_frame_at=None)
+    return worker
+
+
+def _frame(value):
+    return np.full((64, 64, 3), value, dtype=np.uint8)
+
+
+def test_watchdog_reports_a_stalled_stream(clock):
+    worker = _connected(clock, stall_s=15)
+    clock.now += 10
+    assert worker._watchdog(None) is None
+    clock.now += 6
+    assert worker._watchdog(None) == "no frame for 16s"
+
+    # measured from the last good frame once there is one
+    worker.grabber.last_frame_at = clock.now - 2
+    assert worker._watchdog(None) is None
+
+
+def test_watchdog_reports_a_frozen_picture(clock):
+    worker = _connected(clock, stall_s=15, freeze_s=60)
+    worker.grabber.last_frame_at = clock.now
+    assert worker._watchdog(_frame(1)) is None
+    for _ in range(7):
+        clock.now += 10
+        worker.grabber.last_frame_at = clock.now
+        reason = worker._watchdog(_frame(1))
+    assert reason == "frame frozen for 70s"
+    # any change restarts the clock
+    assert worker._watchdog(_frame(2)) is None
+
+
+def test_zero_freeze_s_disables_the_freeze_check(clock):
+    worker = _connected(clock, freeze_s=0)
+    for _ in range(10):
+        clock.now += 100
+        worker.grabber.last_frame_at = clock.now
+        assert worker._watchdog(_frame(1)) is None
+
+
+def test_disabled_scheduler_leaves_the_camera_settings_alone():
+    schedule = dict(min_interval_ms=500, max_interval_ms=8000, min_scale=0.3, max_scale=0.8)
+    worker = _worker(interval_ms=10000, detect_scale=1.0, schedule=schedule)
+    worker._frame_stats = {"detect_ms": 9000.0, "faces": 1}
+    worker._reschedule()
+    assert (worker.interval_ms, worker.detect_scale) == (10000, 1.0)
+
+    worker = _worker(interval_ms=10000, detect_scale=1.0, schedule=dict(schedule, enabled=True))
+    worker._reschedule()
+    assert worker.interval_ms <= 8000 and worker.detect_scale == 0.8
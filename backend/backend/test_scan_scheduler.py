@@ -0,0 +1,151 @@
+"""Unit tests for the adaptive per-camera scan scheduler."""
+import pytest
+
+from scan_scheduler import ScanScheduler, validate_schedule
+
+
+def _scheduler(**kwargs):
+    bounds = dict(enabled=True, min_interval_ms=500, max_interval_ms=8000, min_scale=0.3, max_scale=1.0,
+                  min_upsample=0, max_upsample=2, target_frame_age_ms=1500, cpu_budget=0.5)
+    bounds.update(kwargs)
+    return ScanScheduler(2000, 0.5, 1, **bounds)
+
+
+def _settings(scheduler):
+    return scheduler.interval_ms, scheduler.detect_scale, scheduler.detect_upsample
+
+
+class FakePool:
+    def __init__(self, workers=2):
+        self.workers = workers
+        self.in_flight = 0
+        self.rejected = 0
+
+
+def test_validate_schedule():
+    assert validate_schedule({"enabled": "yes", "min_interval_ms": "250", "cpu_budget": 0.4}) == {
+        "enabled": True, "min_interval_ms": 250, "cpu_budget": 0.4
+    }
+    for bad in ([], {"speed": 1}, {"min_interval_ms": "fast"}, {"min_scale": 0.8, "max_scale": 0.5},
+                {"max_scale": 1.5}, {"min_upsample": 2, "max_upsample": 1}):
+        with pytest.raises(ValueError):
+            validate_schedule(bad)
+
+
+def test_over_budget_cheapens_detection_before_scanning_less_often():
+    scheduler = _scheduler()
+    steps = []
+    for _ in range(6):
+        # 1.5 s of work per 2 s interval is far over a 50% budget
+        scheduler.record(detect_ms=1500, faces=1)
+        steps.append(_settings(scheduler))
+    assert steps == [
+        (2000, 0.5, 0),
+        (2000, 0.4, 0),
+        (2000, 0.3, 0),
+        (2500, 0.3, 0),
+        (3125, 0.3, 0),
+        # 1.5 s of work now fits the budget
+        (3125, 0.3, 0),
+    ]
+    assert scheduler.last_action == "back_off"
+
+
+def test_old_frames_count_as_over_budget():
+    scheduler = _scheduler()
+    scheduler.record(detect_ms=10, faces=1, frame_age_ms=5000)
+    assert _settings(scheduler) == (2000, 0.5, 0)
+
+
+def test_arrivals_scan_at_the_fastest_interval():
+    scheduler = _scheduler()
+    scheduler.record(detect_ms=300, faces=2, new_faces=2)
+    assert scheduler.interval_ms == 500
+    assert scheduler.last_action == "arrivals"
+
+
+def test_empty_scene_backs_off_to_the_slowest_interval():
+    scheduler = _scheduler()
+    intervals = []
+    for _ in range(10):
+        scheduler.record(detect_ms=300, faces=0)
+        intervals.append(scheduler.interval_ms)
+    # idle after IDLE_FRAMES empty frames, then x1.5 per frame up to the bound
+    assert intervals[:2] == [2000, 2000]
+    assert intervals[2:6] == [3000, 4500, 6750, 8000]
+    assert intervals[-1] == 8000
+
+
+def test_headroom_buys_quality_then_speed():
+    scheduler = _scheduler()
+    steps = []
+    for _ in range(9):
+        scheduler.record(detect_ms=10, faces=1, frame_age_ms=100)
+        steps.append(_settings(scheduler))
+    assert steps[:7] == [
+        (2000, 0.6, 1), (2000, 0.7, 1), (2000, 0.8, 1), (2000, 0.9, 1), (2000, 1.0, 1), (2000, 1.0, 2),
+        (1600, 1.0, 2),
+    ]
+    assert steps[-1] == (1024, 1.0, 2)
+
+
+def test_pool_rejections_and_backlog_back_off():
+    pool = FakePool(workers=2)
+    scheduler = _scheduler(pool=pool)
+    scheduler.record(detect_ms=10, faces=1, frame_age_ms=100)
+    assert scheduler.last_action == "headroom"
+
+    pool.rejected += 1
+    before = _settings(scheduler)
+    scheduler.record(detect_ms=10, faces=1, frame_age_ms=100)
+    assert scheduler.last_action == "back_off" and _settings(scheduler) != before
+
+    # rejections only count once; a backlog beyond the workers counts while it lasts
+    pool.in_flight = 3
+    scheduler.record(detect_ms=10, faces=1, frame_age_ms=100)
+    assert scheduler.last_action == "back_off"
+    pool.in_flight = 1
+    scheduler.record(detect_ms=10, faces=1, frame_age_ms=100)
+    assert scheduler.last_action == "headroom"
+
+
+def test_pool_busy_frame_backs_off():
+    scheduler = _scheduler()
+    scheduler.record(detect_ms=10, faces=1, frame_age_ms=100, pool_busy=True)
+    assert scheduler.last_action == "back_off"
+
+
+def test_disabled_scheduler_only_measures():
+    scheduler = _scheduler(enabled=False)
+    for _ in range(5):
+        scheduler.record(detect_ms=1500, faces=0, frame_age_ms=5000)
+    assert _settings(scheduler) == (2000, 0.5, 1)
+    status = scheduler.status()
+    assert status["detect_ms"] == 1500.0 and status["idle_frames"] == 5
+    assert status["adjustments"] == 0 and not status["enabled"]
+
+
+def test_disabled_scheduler_keeps_settings_outside_its_bounds():
+    for interval_ms, scale, upsample in ((10000, 1.0, 3), (300, 0.1, 0)):
+        scheduler = ScanScheduler(interval_ms, scale, upsample, min_interval_ms=500, max_interval_ms=8000,
+                                  min_scale=0.3, max_scale=0.8, min_upsample=1, max_upsample=2)
+        scheduler.configure(min_interval_ms=600)
+        scheduler.record(detect_ms=100, faces=1)
+        assert _settings(scheduler) == (interval_ms, scale, upsample)
+
+
+def test_adaptation_is_opt_in():
+    scheduler = ScanScheduler(2000, 0.5, 1)
+    scheduler.record(detect_ms=1500, faces=1)
+    assert not scheduler.enabled
+    assert _settings(scheduler) == (2000, 0.5, 1)
+
+
+def test_configure_clamps_current_settings():
+    scheduler = _scheduler()
+    scheduler.configure(max_interval_ms=1000, min_scale="0.6", cpu_budget="0.4")
+    assert _settings(scheduler) == (1000, 0.6, 1)
+    assert scheduler.cpu_budget == 0.4
+    assert scheduler.status()["bounds"]["max_interval_ms"] == 1000
+    with pytest.raises(ValueError):
+        scheduler.configure(nonsense=1)
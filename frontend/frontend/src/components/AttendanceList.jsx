@@ -35,6 +35,9 @@ function getMonthDates(dateStr) {
   });
 }
 
+// only what the cohort filter needs; photos and encodings stay on the server
+const COHORT_FIELDS = 'roll,specialization,department,section,batch';
+
 function AttendanceList() {
   const [date, setDate] = useState(() => new Date().toISOString().slice(0, 10));
   const [attendanceByHour, setAttendanceByHour] = useState({});
@@ -56,7 +59,7 @@ function AttendanceList() {
         let allowedRolls = null;
         if (staff) {
           try {
-            const studentsRes = await axios.get('http://localhost:8000/students_full');
+            const studentsRes = await axios.get('http://localhost:8000/students_full', { params: { fields: COHORT_FIELDS } });
             const cohort = studentsRes.data.filter(s => 
               s.specialization === staff.specialization &&
               s.department === staff.department &&
@@ -129,7 +132,7 @@ function AttendanceList() {
           if (staffRaw) {
             const staff = JSON.parse(staffRaw);
             try {
-              const studentsRes = await axios.get('http://localhost:8000/students_full');
+              const studentsRes = await axios.get('http://localhost:8000/students_full', { params: { fields: COHORT_FIELDS } });
               const cohort = studentsRes.data.filter(s => 
                 s.specialization === staff.specialization &&
                 s.department === staff.department &&
@@ -40,7 +40,9 @@ function Dashboard({ setIsLoggedIn, setCurrentPage }) {
       
       console.log(`Fetching dashboard data for ${today} at ${currentHour}`);
       
-      const studentsRes = await axios.get('http://localhost:8000/students_full');
+      const studentsRes = await axios.get('http://localhost:8000/students_full', {
+        params: { fields: 'name,roll,specialization,department,section,batch' }
+      });
       const staffRaw = localStorage.getItem('staff');
       let filteredStudents = studentsRes.data;
       if (staffRaw) {
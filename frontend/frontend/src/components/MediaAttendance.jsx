@@ -11,6 +11,7 @@ function MediaAttendance() {
   const [processing, setProcessing] = useState(false);
   const [results, setResults] = useState(null);
   const [error, setError] = useState('');
+  const [progress, setProgress] = useState(null);
   const videoRef = useRef(null);
   const canvasRef = useRef(null);
 
@@ -26,49 +27,32 @@ function MediaAttendance() {
         setFileType('image');
       } else if (file.type.startsWith('video/')) {
         setFileType('video');
+      } else if (file.name.toLowerCase().endsWith('.zip')) {
+        setFileType('zip');
       } else {
-        setError('Please select an image or video file.');
+        setError('Please select an image, video or zip file.');
         setSelectedFile(null);
       }
     }
   };
 
-  const extractFramesFromVideo = async (videoFile) => {
-    return new Promise((resolve) => {
-      const video = document.createElement('video');
-      const canvas = document.createElement('canvas');
-      const ctx = canvas.getContext('2d');
-      const frames = [];
-
-      video.preload = 'auto';
-      video.muted = true;
-      video.playsInline = true;
-
-      const startSeeking = () => {
-        // Kick off extraction
-        video.currentTime = 0;
-      };
-
-      video.onloadedmetadata = () => {
-        canvas.width = video.videoWidth;
-        canvas.height = video.videoHeight;
-        startSeeking();
-      };
-
-      video.onseeked = () => {
-        ctx.drawImage(video, 0, 0);
-        const frameData = canvas.toDataURL('image/jpeg', 0.8);
-        frames.push(frameData);
-
-        if (video.currentTime + 1 < video.duration) {
-          video.currentTime = Math.min(video.currentTime + 1, video.duration);
-        } else {
-          resolve(frames);
-        }
-      };
-
-      video.src = URL.createObjectURL(videoFile);
+  // Videos and zips go to a background job on the server; poll it until it finishes
+  const processBatch = async (file) => {
+    const formData = new FormData();
+    formData.append('files', file, file.name);
+    const res = await axios.post('http://localhost:8000/media_attendance/jobs', formData, {
+      params: { custom_time: customTime }
     });
+    const jobId = res.data.job_id;
+
+    while (true) {
+      await new Promise((r) => setTimeout(r, 1500));
+      const { data: job } = await axios.get(`http://localhost:8000/media_attendance/jobs/${jobId}`);
+      setProgress(job);
+      if (job.status === 'done' || job.status === 'failed') {
+        return job;
+      }
+    }
   };
 
   const processImage = async (imageData) => {
@@ -120,28 +104,20 @@ function MediaAttendance() {
         };
         reader.readAsDataURL(selectedFile);
       } else {
-      
-        const frames = await extractFramesFromVideo(selectedFile);
-        
-        for (let i = 0; i < frames.length; i++) {
-          const result = await processImage(frames[i]);
-          if (result.error) {
-            allErrors.push(`Frame ${i + 1}: ${result.error}`);
-          } else {
-            allRecognized = allRecognized.concat(result.recognized || []);
-          }
+        setProgress(null);
+        const job = await processBatch(selectedFile);
+        if (job.status === 'failed') {
+          allErrors.push(job.error || 'Processing failed');
         }
-        
-       
-        const uniqueRecognized = allRecognized.filter((student, index, self) => 
-          index === self.findIndex(s => s.roll === student.roll)
-        );
-        
-        setResults({ recognized: uniqueRecognized, errors: allErrors });
+        setResults({
+          recognized: job.recognized || [],
+          total_faces_detected: job.faces_detected,
+          errors: allErrors
+        });
         setProcessing(false);
       }
     } catch (err) {
-      setError('Failed to process media file.');
+      setError(err.response?.data?.error || 'Failed to process media file.');
       setProcessing(false);
     }
   };
@@ -176,11 +152,11 @@ function MediaAttendance() {
         {/* File Upload */}
         <div className="mb-4">
           <label className="block text-sm font-medium text-gray-700 mb-2">
-            Select Image or Video File
+            Select Image, Video or Zip of Photos
           </label>
           <input
             type="file"
-            accept="image/*,video/*"
+            accept="image/*,video/*,.zip"
             onChange={handleFileChange}
             className="block w-full text-sm text-gray-500 file:mr-4 file:py-2 file:px-4 file:rounded-full file:border-0 file:text-sm file:font-semibold file:bg-blue-50 file:text-blue-700 hover:file:bg-blue-100"
           />
@@ -217,7 +193,11 @@ function MediaAttendance() {
               : 'bg-blue-600 hover:bg-blue-700'
           }`}
         >
-          {processing ? 'Processing...' : 'Process Media & Mark Attendance'}
+          {processing
+            ? progress && progress.total
+              ? `Processing... ${Math.round(progress.progress * 100)}%`
+              : 'Processing...'
+            : 'Process Media & Mark Attendance'}
         </button>
 
         {error && (
@@ -287,7 +267,7 @@ function MediaAttendance() {
           <li>• <strong>Only registered students will be recognized</strong> - unregistered faces will be rejected</li>
           <li>• The system uses EXTREMELY strict matching (75%+ confidence required)</li>
           <li>• <strong>Only faces actually detected in the frame will be marked present</strong></li>
-          <li>• For videos, frames are extracted every second for processing</li>
+          <li>• Videos and zips are processed on the server; a frame is sampled every 2 seconds</li>
           <li>• Duplicate recognitions are automatically filtered</li>
           <li>• Unregistered faces will be treated as absent</li>
         </ul>
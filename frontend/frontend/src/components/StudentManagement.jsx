@@ -21,7 +21,10 @@ function StudentManagement() {
     setLoading(true);
     setError('');
     try {
-      const res = await axios.get('http://localhost:8000/students_full');
+      const res = await axios.get('http://localhost:8000/students_full', {
+        // encodings are large and unused here
+        params: { fields: 'name,roll,specialization,department,section,batch,phone,photo_b64' }
+      });
       const staffRaw = localStorage.getItem('staff');
       let filtered = res.data;
       if (staffRaw) {
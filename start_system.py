@@ -23,7 +23,10 @@ def run_backend():
     print("-" * 50)
     
     try:
-        subprocess.run([sys.executable, "app.py"], check=True)
+        # through uvicorn, not `python app.py`: compute pool workers are spawned and
+        # re-import the __main__ script, which must not be the module that builds the app
+        subprocess.run([sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", "8000"],
+                       check=True)
     except KeyboardInterrupt:
         print("\n🛑 Backend server stopped")
     except Exception as e: